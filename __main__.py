@@ -0,0 +1,8 @@
+if __package__:
+    from .models.cli import main
+else:
+    # Run as a directory (python AdvancedTokenCraft) rather than as a package
+    from models.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Compare two benchmarks/tokenizer_suite.py result files and flag regressions:
+# a drop in throughput or a rise in p99 latency or peak traced memory beyond
+# the threshold. Exits with status 1 when anything regressed.
+#
+#   python benchmarks/compare.py before.json after.json --threshold 0.1
+import argparse
+import json
+import sys
+
+# metric -> True when higher is better
+METRICS = {
+    'tokens_per_s': True,
+    'mb_per_s': True,
+    'latency_p50_us': False,
+    'latency_p99_us': False,
+    'traced_peak_bytes': False,
+}
+
+
+def compare(baseline, current, threshold=0.1, metrics=METRICS):
+    # Returns rows of (benchmark, metric, baseline, current, relative change, regressed)
+    rows = []
+    for name in sorted(set(baseline['results']) & set(current['results'])):
+        for metric, higher_is_better in metrics.items():
+            before = baseline['results'][name].get(metric)
+            after = current['results'][name].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            regressed = -change > threshold if higher_is_better else change > threshold
+            rows.append((name, metric, before, after, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two tokenizer benchmark results.')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change treated as a regression')
+    parser.add_argument('--metrics', nargs='+', choices=sorted(METRICS), default=sorted(METRICS))
+    parser.add_argument('--all', action='store_true', help='print every comparison, not only regressions')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+    if baseline['meta'].get('vocab') != current['meta'].get('vocab'):
+        print(f"warning: comparing {baseline['meta'].get('vocab')} vocabularies with {current['meta'].get('vocab')}", file=sys.stderr)
+
+    rows = compare(baseline, current, args.threshold, {metric: METRICS[metric] for metric in args.metrics})
+    regressions = [row for row in rows if row[5]]
+    for name, metric, before, after, change, regressed in rows if args.all else regressions:
+        print(f"{'REGRESSION' if regressed else 'ok':<10} {name:<50} {metric:<18} {before:>14,.2f} -> {after:>14,.2f} ({change:+.1%})")
+    print(f'{len(regressions)} regressions in {len(rows)} comparisons', file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# Peak memory and time of the aligned-pair similarity used by
+# models/tokenization_model.CustomTokenizer._combine_tokens: the old full N x M
+# matrix versus the row-wise diagonal, whole and chunked, on random embeddings
+# of the MiniLM width; then CustomTokenizer._aligned_similarities itself, whole
+# and chunked, embedding token texts with the offline HashingEmbedder.
+#
+#   python benchmarks/similarity_memory.py --tokens 4000 --chunk-size 512
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from benchmarks.stubs import HashingEmbedder
+from models.similarity import paired_cosine_similarity
+from models.tokenization_model import CustomTokenizer
+
+
+def full_matrix(gpt2_embeddings, bert_embeddings):
+    # The previous implementation, which only ever read similarities[i, i]
+    similarities = np.dot(gpt2_embeddings, bert_embeddings.T) / (np.linalg.norm(gpt2_embeddings, axis=1)[:, None] * np.linalg.norm(bert_embeddings, axis=1))
+    return np.diagonal(similarities).copy()
+
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark aligned-pair similarity memory use.")
+    parser.add_argument('--tokens', type=int, default=4000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--chunk-size', type=int, default=512)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    gpt2_embeddings = rng.standard_normal((args.tokens, args.dim), dtype=np.float32)
+    bert_embeddings = rng.standard_normal((args.tokens, args.dim), dtype=np.float32)
+
+    results = {}
+    reference = None
+    for name, fn, extra in (
+        ('full_matrix', full_matrix, ()),
+        ('diagonal', paired_cosine_similarity, ()),
+        ('diagonal_chunked', paired_cosine_similarity, (args.chunk_size,)),
+    ):
+        similarities, elapsed, peak = measure(fn, gpt2_embeddings, bert_embeddings, *extra)
+        if reference is None:
+            reference = similarities
+        results[name] = {
+            'seconds': round(elapsed, 6),
+            'peak_bytes': peak,
+            'max_abs_diff': float(np.max(np.abs(similarities - reference))),
+        }
+
+    # The code path itself: embedding included, which is what chunking bounds
+    gpt2_texts = [f'Ġtoken{i}' for i in range(args.tokens)]
+    bert_texts = [f'token{i}' for i in range(args.tokens)]
+    model_reference = None
+    for name, chunk_size in (('model_whole', None), ('model_chunked', args.chunk_size)):
+        tokenizer = CustomTokenizer(similarity_chunk_size=chunk_size)
+        tokenizer.embedding_model = HashingEmbedder(args.dim)
+        similarities, elapsed, peak = measure(tokenizer._aligned_similarities, gpt2_texts, bert_texts)
+        if model_reference is None:
+            model_reference = similarities
+        results[name] = {
+            'seconds': round(elapsed, 6),
+            'peak_bytes': peak,
+            'max_abs_diff': float(np.max(np.abs(similarities - model_reference))),
+        }
+    print(json.dumps({'tokens': args.tokens, 'dim': args.dim, 'chunk_size': args.chunk_size, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# Offline stand-ins for the pretrained vocabularies the benchmarks need. A small
+# byte-level BPE is trained on the benchmark corpora and written out in the
+# GPT-2 (vocab.json + merges.txt), BERT (vocab.txt) and tiktoken formats, so the
+# real tokenizer classes load from local directories without the HF hub.
+import base64
+import json
+import os
+import re
+import sys
+import zlib
+from collections import Counter
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models.similarity import normalize_rows
+
+GPT2_PATTERN = re.compile(r"'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d+| ?[^\s\w]+|\s+(?!\S)|\s+")
+BERT_SPECIAL_TOKENS = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+
+
+def bytes_to_unicode():
+    # GPT-2's reversible byte -> printable character table
+    printable = list(range(ord('!'), ord('~') + 1)) + list(range(ord('¡'), ord('¬') + 1)) + list(range(ord('®'), ord('ÿ') + 1))
+    chars = printable[:]
+    extra = 0
+    for b in range(256):
+        if b not in printable:
+            printable.append(b)
+            chars.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, chars)))
+
+
+def train_merges(texts, num_merges=256, max_words=2000):
+    # Plain BPE over the most frequent pre-tokens; returns merges as byte pairs
+    counts = Counter(piece.encode('utf-8') for text in texts for piece in GPT2_PATTERN.findall(text))
+    words = [([bytes([b]) for b in word], count) for word, count in counts.most_common(max_words)]
+    merges = []
+    for _ in range(num_merges):
+        pairs = Counter()
+        for parts, count in words:
+            for pair in zip(parts, parts[1:]):
+                pairs[pair] += count
+        if not pairs:
+            break
+        best = max(pairs, key=pairs.get)
+        merges.append(best)
+        merged = best[0] + best[1]
+        for parts, _ in words:
+            i = 0
+            while i < len(parts) - 1:
+                if parts[i] == best[0] and parts[i + 1] == best[1]:
+                    parts[i:i + 2] = [merged]
+                i += 1
+    return merges
+
+
+def write_gpt2_vocab(directory, merges):
+    os.makedirs(directory, exist_ok=True)
+    byte_encoder = bytes_to_unicode()
+    encode = lambda token: ''.join(byte_encoder[b] for b in token)
+    vocab = {byte_encoder[b]: i for i, b in enumerate(range(256))}
+    lines = ['#version: 0.2']
+    for left, right in merges:
+        vocab.setdefault(encode(left + right), len(vocab))
+        lines.append(f'{encode(left)} {encode(right)}')
+    vocab['<|endoftext|>'] = len(vocab)
+    with open(os.path.join(directory, 'vocab.json'), 'w') as file:
+        json.dump(vocab, file)
+    with open(os.path.join(directory, 'merges.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+    return directory
+
+
+def write_bert_vocab(directory, texts, max_words=2000):
+    os.makedirs(directory, exist_ok=True)
+    words = Counter(word for text in texts for word in re.findall(r'[^\W_]+', text.lower()))
+    chars = sorted({char for text in texts for char in text.lower() if not char.isspace()})
+    vocab = list(BERT_SPECIAL_TOKENS) + chars + ['##' + char for char in chars if char.isalnum()]
+    seen = set(vocab)
+    vocab += [word for word, _ in words.most_common(max_words) if word not in seen]
+    with open(os.path.join(directory, 'vocab.txt'), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(vocab) + '\n')
+    return directory
+
+
+def write_tiktoken_vocab(path, merges):
+    tokens = [bytes([b]) for b in range(256)]
+    seen = set(tokens)
+    for left, right in merges:
+        if left + right not in seen:
+            seen.add(left + right)
+            tokens.append(left + right)
+    with open(path, 'wb') as file:
+        for rank, token in enumerate(tokens):
+            file.write(base64.b64encode(token) + b' ' + str(rank).encode() + b'\n')
+    return path
+
+
+def write_stub_vocabularies(directory, texts, num_merges=256):
+    # Returns the paths to pass as gpt2/bert model names and as a vocab_file
+    merges = train_merges(texts, num_merges)
+    return {
+        'gpt2': write_gpt2_vocab(os.path.join(directory, 'gpt2'), merges),
+        'bert': write_bert_vocab(os.path.join(directory, 'bert'), texts),
+        'tiktoken': write_tiktoken_vocab(os.path.join(directory, 'tokenizer.model'), merges),
+    }
+
+
+class HashingEmbedder:
+    # Deterministic stand-in for the sentence embedding model: hashed character
+    # trigram counts, with the SentenceTransformer.encode signature
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            padded = f' {text} '.encode('utf-8')
+            for i in range(max(len(padded) - 2, 1)):
+                embeddings[row, zlib.crc32(padded[i:i + 3]) % self.dim] += 1
+        return normalize_rows(embeddings) if normalize_embeddings else embeddings
@@ -0,0 +1,372 @@
+# Throughput, latency and memory of the tokenizers over several corpora:
+#   split.<revision>          CustomTokenizer._split_whitespaces_or_nonwhitespaces
+#                             of every models/custom_tokenizer*.py revision
+#   bpe.encode                models/custom_tokenizer.CustomTokenizer.encode
+#   hybrid.encode / .decode   prototype_tokenization_model.HybridTokenizer
+#   model.encode / .decode    models/tokenization_model.CustomTokenizer
+# Without cached HF models (or with --vocab stub) the HF tokenizers load small
+# vocabularies trained on the corpora (benchmarks/stubs.py) and the embedding
+# model is a hashing stub, so the suite runs offline. Results are JSON; compare
+# two runs with benchmarks/compare.py.
+#
+#   python benchmarks/tokenizer_suite.py --output before.json
+#   python benchmarks/tokenizer_suite.py --targets split hybrid --corpora cjk code --docs 500
+import argparse
+import glob
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from benchmarks.stubs import HashingEmbedder, write_stub_vocabularies
+from models.corpus_pipeline import DEFAULT_TEXT_FIELD, detect_format
+
+SPLIT_REVISIONS = ['custom_tokenizer', 'custom_tokenizer_draft', 'custom_tokenizer_revision', 'custom_tokenizer_revision_v2', 'custom_tokenizer_revision_v3']
+TARGET_GROUPS = ['split', 'bpe', 'hybrid', 'model']
+
+WORDS = ('the of and to in is was for that with as on by at from this be are it an or which have not had '
+         'tokenizer model festival center performing schedule logistics considerations multiple language '
+         'vocabulary sentence encoding decoding throughput latency memory benchmark corpus whitespace').split()
+
+
+# Corpora: each is a list of documents
+
+def synthetic_english(rng, docs):
+    # Zipf-like word frequencies with punctuation and the odd number
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    texts = []
+    for _ in range(docs):
+        words = rng.choices(WORDS, weights, k=rng.randint(5, 120))
+        for i in range(0, len(words), rng.randint(6, 15)):
+            words[i] = words[i].capitalize()
+        text = ' '.join(words).replace(' the ', rng.choice([' the ', ', the ', ' 2024 the ']))
+        texts.append(text + rng.choice('.?!'))
+    return texts
+
+
+def cjk(rng, docs):
+    # Japanese, Chinese and Korean runs with CJK punctuation, as in robustness_test.py
+    scripts = [(0x3041, 0x3096), (0x4E00, 0x9FA5), (0xAC00, 0xD7A3), (0x30A1, 0x30FA)]
+    texts = []
+    for _ in range(docs):
+        parts = []
+        for _ in range(rng.randint(2, 30)):
+            low, high = rng.choice(scripts)
+            parts.append(''.join(chr(rng.randint(low, high)) for _ in range(rng.randint(1, 12))))
+            parts.append(rng.choice(['、', '。', '，', ', ', ' ', '']))
+        texts.append(''.join(parts))
+    return texts
+
+
+def code(rng, docs):
+    # Blocks of this repository's own Python sources
+    lines = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'models', '*.py'))):
+        with open(path, encoding='utf-8') as file:
+            lines.extend(file.read().splitlines())
+    texts = []
+    for _ in range(docs):
+        start = rng.randrange(len(lines))
+        texts.append('\n'.join(lines[start:start + rng.randint(5, 40)]))
+    return texts
+
+
+def whitespace(rng, docs):
+    runs = [' ', '  ', '    ', '\t', '\n', '\n\n', ' \t ', '\r\n', ' ' * 16]
+    return [''.join(rng.choice(WORDS) + rng.choice(runs) for _ in range(rng.randint(5, 80))) for _ in range(docs)]
+
+
+def long_words(rng, docs):
+    # URLs, base64 blobs and DNA-like strings far beyond max_len
+    alphabets = ['ACGT', 'abcdefghijklmnopqrstuvwxyz0123456789+/', 'abcdefghijklmnopqrstuvwxyz/.-_?=&']
+    texts = []
+    for _ in range(docs):
+        words = [''.join(rng.choices(rng.choice(alphabets), k=rng.randint(50, 2000))) for _ in range(rng.randint(1, 4))]
+        texts.append(' '.join(words))
+    return texts
+
+
+def english_docs(rng, docs):
+    # Paragraphs of the repository's own documentation
+    paragraphs = []
+    for path in [os.path.join(ROOT, 'README.md')] + sorted(glob.glob(os.path.join(ROOT, 'documentation', '*.md'))):
+        with open(path, encoding='utf-8') as file:
+            paragraphs.extend(p.strip() for p in file.read().split('\n\n') if p.strip())
+    return [rng.choice(paragraphs) for _ in range(docs)]
+
+
+CORPORA = {
+    'english': synthetic_english,
+    'english_docs': english_docs,
+    'cjk': cjk,
+    'code': code,
+    'whitespace': whitespace,
+    'long_words': long_words,
+}
+
+
+def load_corpus_file(path, docs):
+    texts = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if detect_format(path) == 'jsonl':
+                if line.strip():
+                    texts.append(json.loads(line).get(DEFAULT_TEXT_FIELD, ''))
+            elif line.strip():
+                texts.append(line.rstrip('\r\n'))
+            if len(texts) >= docs:
+                break
+    return texts
+
+
+# Targets: setup(texts) returns a callable run on each document (or prepared
+# input) and reporting the number of tokens it produced or consumed
+
+def split_target(revision, max_len):
+    def setup(texts, env):
+        module = importlib.import_module(f'models.{revision}')
+        # Splitting needs no vocabulary, so skip the constructors that expect one
+        tokenizer = module.CustomTokenizer.__new__(module.CustomTokenizer)
+        split = tokenizer._split_whitespaces_or_nonwhitespaces
+        return texts, lambda text: len(split(text, max_len))
+    return setup
+
+
+def bpe_encode(texts, env):
+    from models.custom_tokenizer import CustomTokenizer
+    tokenizer = CustomTokenizer(env['vocabularies']['tiktoken'])
+    return texts, lambda text: len(tokenizer.encode(text, bos=False, eos=False))
+
+
+def hybrid_tokenizer(env):
+    if 'hybrid' not in env:
+        from prototype_tokenization_model import HybridTokenizer
+        env['hybrid'] = HybridTokenizer(env['vocabularies']['gpt2'], env['vocabularies']['bert'])
+    return env['hybrid']
+
+
+def hybrid_encode(texts, env):
+    tokenizer = hybrid_tokenizer(env)
+    return texts, lambda text: len(tokenizer.encode(text))
+
+
+def hybrid_decode(texts, env):
+    tokenizer = hybrid_tokenizer(env)
+    ids_list = [tokenizer.encode(text) for text in texts]
+
+    def decode(token_ids):
+        tokenizer.decode(token_ids)
+        return len(token_ids)
+    return ids_list, decode
+
+
+def model_tokenizer(env):
+    if 'model' not in env:
+        from models.tokenization_model import CustomTokenizer
+        tokenizer = CustomTokenizer(env['vocabularies']['gpt2'], env['vocabularies']['bert'])
+        if env['stub_embeddings']:
+            tokenizer.embedding_model = HashingEmbedder()
+        env['model'] = tokenizer
+    return env['model']
+
+
+def model_encode(texts, env):
+    tokenizer = model_tokenizer(env)
+    return texts, lambda text: len(tokenizer.encode(text))
+
+
+def model_decode(texts, env):
+    tokenizer = model_tokenizer(env)
+    ids_list = [tokenizer.encode(text) for text in texts]
+
+    def decode(token_ids):
+        tokenizer.decode(token_ids)
+        return len(token_ids)
+    return ids_list, decode
+
+
+def build_targets(groups, max_len):
+    targets = {}
+    if 'split' in groups:
+        for revision in SPLIT_REVISIONS:
+            targets[f'split.{revision}'] = split_target(revision, max_len)
+    if 'bpe' in groups:
+        targets['bpe.encode'] = bpe_encode
+    if 'hybrid' in groups:
+        targets['hybrid.encode'] = hybrid_encode
+        targets['hybrid.decode'] = hybrid_decode
+    if 'model' in groups:
+        targets['model.encode'] = model_encode
+        targets['model.decode'] = model_decode
+    return targets
+
+
+# Measurement
+
+def reset_peak_rss():
+    # Linux resets VmHWM when "5" is written to clear_refs; elsewhere the peak
+    # stays process-wide
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_bytes():
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def measure(fn, inputs, texts, repeat, warmup):
+    for item in inputs[:warmup]:
+        fn(item)
+
+    per_call_resettable = reset_peak_rss()
+    latencies = np.empty((repeat, len(inputs)), dtype=np.int64)
+    run_seconds = []
+    tokens = 0
+    clock = time.perf_counter_ns
+    for run in range(repeat):
+        tokens = 0
+        run_latencies = latencies[run]
+        start = clock()
+        for i, item in enumerate(inputs):
+            call_start = clock()
+            tokens += fn(item)
+            run_latencies[i] = clock() - call_start
+        run_seconds.append((clock() - start) / 1e9)
+    peak_rss = peak_rss_bytes()
+
+    # Allocations are traced in a separate pass, since tracing slows every call
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    for item in inputs:
+        fn(item)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_blocks = sys.getallocatedblocks() - blocks_before
+
+    seconds = float(np.median(run_seconds))
+    text_bytes = sum(len(text.encode('utf-8')) for text in texts)
+    p50, p99 = np.percentile(latencies, [50, 99]) / 1e3
+    return {
+        'documents': len(inputs),
+        'tokens': tokens,
+        'bytes': text_bytes,
+        'seconds': round(seconds, 6),
+        'tokens_per_s': round(tokens / seconds, 1) if seconds else None,
+        'mb_per_s': round(text_bytes / 1e6 / seconds, 3) if seconds else None,
+        'latency_p50_us': round(float(p50), 2),
+        'latency_p99_us': round(float(p99), 2),
+        'peak_rss_bytes': peak_rss,
+        'peak_rss_scope': 'benchmark' if per_call_resettable else 'process',
+        'traced_peak_bytes': traced_peak,
+        'retained_blocks': retained_blocks,
+    }
+
+
+def resolve_vocabularies(mode, gpt2_model_name, bert_model_name, texts, directory):
+    # Pretrained vocabularies from the local HF cache (or the hub with
+    # --vocab hub), else stubs trained on the corpora
+    if mode != 'stub':
+        try:
+            from huggingface_hub import snapshot_download
+            local_only = mode == 'auto'
+            return {
+                'source': 'hf',
+                'gpt2': snapshot_download(gpt2_model_name, local_files_only=local_only),
+                'bert': snapshot_download(bert_model_name, local_files_only=local_only),
+                'tiktoken': write_stub_vocabularies(directory, texts)['tiktoken'],
+            }
+        except Exception:
+            if mode == 'hub':
+                raise
+    vocabularies = write_stub_vocabularies(directory, texts)
+    vocabularies['source'] = 'stub'
+    return vocabularies
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark tokenizer throughput, latency and memory.')
+    parser.add_argument('--targets', nargs='+', choices=TARGET_GROUPS, default=TARGET_GROUPS)
+    parser.add_argument('--corpora', nargs='+', choices=sorted(CORPORA), default=sorted(CORPORA))
+    parser.add_argument('--corpus-file', action='append', default=[], help='extra JSONL or plain-text corpus')
+    parser.add_argument('--docs', type=int, default=1000, help='documents per corpus')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--warmup', type=int, default=50, help='documents run before timing')
+    parser.add_argument('--max-len', type=int, default=10)
+    parser.add_argument('--vocab', choices=['auto', 'stub', 'hub'], default='auto')
+    parser.add_argument('--gpt2-model-name', default='gpt2')
+    parser.add_argument('--bert-model-name', default='bert-base-uncased')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON results here as well as to stdout')
+    args = parser.parse_args(argv)
+
+    corpora = {name: CORPORA[name](random.Random(args.seed), args.docs) for name in args.corpora}
+    for path in args.corpus_file:
+        corpora[os.path.splitext(os.path.basename(path))[0]] = load_corpus_file(path, args.docs)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        env = {}
+        if set(args.targets) - {'split'}:
+            all_texts = [text for texts in corpora.values() for text in texts]
+            env['vocabularies'] = resolve_vocabularies(args.vocab, args.gpt2_model_name, args.bert_model_name, all_texts, directory)
+            try:
+                import sentence_transformers  # noqa: F401
+                env['stub_embeddings'] = env['vocabularies']['source'] == 'stub'
+            except ImportError:
+                env['stub_embeddings'] = True
+        for target, setup in build_targets(args.targets, args.max_len).items():
+            for corpus, texts in corpora.items():
+                inputs, fn = setup(texts, env)
+                results[f'{target}/{corpus}'] = measure(fn, inputs, texts, args.repeat, args.warmup)
+                print(f'{target}/{corpus}: {results[f"{target}/{corpus}"]["tokens_per_s"]:,.0f} tokens/s', file=sys.stderr)
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'vocab': env.get('vocabularies', {}).get('source'),
+            'stub_embeddings': env.get('stub_embeddings'),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,21 @@
-from transformers import GPT2Tokenizer, BertTokenizer, AutoModel, AutoTokenizer
-import torch
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from transformers import GPT2TokenizerFast, BertTokenizerFast, AutoModel, AutoTokenizer
+import itertools
+import os
+
+from models.alignment import align_offsets, is_shared, segment_pairs
+from models.batching import batch_encode, prepare_batch
+from models.embedding_service import EmbeddingService
+from models.parallel import map_batch
 
 class CustomTokenizer:
-    def __init__(self):
-        self.gpt2_tokenizer = GPT2Tokenizer.from_pretrained('gpt2')
-        self.bert_tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+    def __init__(self, embedding_cache_size=100000, embedding_cache_file=None):
+        self.gpt2_tokenizer = GPT2TokenizerFast.from_pretrained('gpt2')
+        self.bert_tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased')
         self.embedding_model = AutoModel.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
         self.embedding_tokenizer = AutoTokenizer.from_pretrained('sentence-transformers/all-MiniLM-L6-v2')
+        self.embedding_service = EmbeddingService(self.embedding_model, self.embedding_tokenizer, max_entries=embedding_cache_size)
+        if embedding_cache_file is not None and os.path.exists(embedding_cache_file):
+            self.embedding_service.load(embedding_cache_file)
         self.special_tokens = {
             'pad_token': '[PAD]',
             'cls_token': '[CLS]',
@@ -22,64 +29,73 @@ class CustomTokenizer:
         self.bert_tokenizer.add_special_tokens(self.special_tokens)
 
     def tokenize(self, text):
-        gpt2_tokens = self.gpt2_tokenizer.tokenize(text)
-        bert_tokens = self.bert_tokenizer.tokenize(text)
-        combined_tokens = self._combine_tokens(gpt2_tokens, bert_tokens)
+        gpt2_encoding, = batch_encode(self.gpt2_tokenizer, [text])
+        bert_encoding, = batch_encode(self.bert_tokenizer, [text])
+        segments = align_offsets(gpt2_encoding.offsets, bert_encoding.offsets)
+        combined_tokens = self._combine_tokens(gpt2_encoding.tokens, bert_encoding.tokens, segments)
         return combined_tokens
 
-    def _combine_tokens(self, gpt2_tokens, bert_tokens):
+    def _combine_tokens(self, gpt2_tokens, bert_tokens, segments):
         # New strategy to combine GPT-2 and BERT tokens based on semantic similarity and context
-        combined_tokens = []
-        gpt2_index, bert_index = 0, 0
-        while gpt2_index < len(gpt2_tokens) and bert_index < len(bert_tokens):
-            gpt2_embedding = self._get_embedding(gpt2_tokens[gpt2_index])
-            bert_embedding = self._get_embedding(bert_tokens[bert_index])
-            similarity = cosine_similarity([gpt2_embedding], [bert_embedding])[0][0]
-            if similarity > 0.5:  # Threshold for combining tokens
-                combined_tokens.append(gpt2_tokens[gpt2_index])
-                combined_tokens.append(bert_tokens[bert_index])
-            gpt2_index += 1
-            bert_index += 1
-        combined_tokens.extend(gpt2_tokens[gpt2_index:])
-        combined_tokens.extend(bert_tokens[bert_index:])
-        return combined_tokens
+        return self._combine_by_similarity(gpt2_tokens, bert_tokens, gpt2_tokens, bert_tokens, segments,
+                                           self.gpt2_tokenizer.pad_token, self.bert_tokenizer.pad_token)
+
+    def _combine_by_similarity(self, gpt2_items, bert_items, gpt2_texts, bert_texts, segments, gpt2_pad, bert_pad):
+        # Interleaved (gpt2, bert) pairs in text order. The spans both tokenizers
+        # cover (segments from align_offsets) are kept if their token texts are
+        # similar, zipped and padded to the longer side; tokens only one side has
+        # are paired with the other side's pad. Only the shared spans are
+        # embedded, in one batched call.
+        combined = []
+        gpt2_joined, bert_joined = segment_pairs(segments, gpt2_texts, bert_texts)
+        similarities = iter(self.embedding_service.paired_cosine(gpt2_joined, bert_joined))
+        for segment in segments:
+            left_start, left_stop, right_start, right_stop = segment
+            if is_shared(segment) and not next(similarities) > 0.5:  # Threshold for combining tokens
+                continue
+            for gpt2_item, bert_item in itertools.zip_longest(gpt2_items[left_start:left_stop], bert_items[right_start:right_stop]):
+                combined.append(gpt2_pad if gpt2_item is None else gpt2_item)
+                combined.append(bert_pad if bert_item is None else bert_item)
+        return combined
 
     def _get_embedding(self, token):
-        inputs = self.embedding_tokenizer(token, return_tensors='pt')
-        outputs = self.embedding_model(**inputs)
-        return outputs.last_hidden_state.mean(dim=1).detach().numpy().flatten()
+        return self.embedding_service.embed([token])[0]
+
+    def save_embedding_cache(self, path):
+        self.embedding_service.save(path)
 
     def encode(self, text):
-        gpt2_encoded = self.gpt2_tokenizer.encode(text, add_special_tokens=True)
-        bert_encoded = self.bert_tokenizer.encode(text, add_special_tokens=True)
-        combined_encoded = self._combine_encoded(gpt2_encoded, bert_encoded)
+        gpt2_encoding, = batch_encode(self.gpt2_tokenizer, [text], add_special_tokens=True)
+        bert_encoding, = batch_encode(self.bert_tokenizer, [text], add_special_tokens=True)
+        segments = align_offsets(gpt2_encoding.offsets, bert_encoding.offsets)
+        combined_encoded = self._combine_encoded(gpt2_encoding.ids, bert_encoding.ids, segments)
         return combined_encoded
 
-    def _combine_encoded(self, gpt2_encoded, bert_encoded):
+    def _combine_encoded(self, gpt2_encoded, bert_encoded, segments):
         # Improved logic to combine GPT-2 and BERT encoded tokens
-        combined_encoded = []
-        gpt2_index, bert_index = 0, 0
-        while gpt2_index < len(gpt2_encoded) and bert_index < len(bert_encoded):
-            gpt2_embedding = self._get_embedding(self.gpt2_tokenizer.decode([gpt2_encoded[gpt2_index]]))
-            bert_embedding = self._get_embedding(self.bert_tokenizer.decode([bert_encoded[bert_index]]))
-            similarity = cosine_similarity([gpt2_embedding], [bert_embedding])[0][0]
-            if similarity > 0.5:  # Threshold for combining tokens
-                combined_encoded.append(gpt2_encoded[gpt2_index])
-                combined_encoded.append(bert_encoded[bert_index])
-            gpt2_index += 1
-            bert_index += 1
-        combined_encoded.extend(gpt2_encoded[gpt2_index:])
-        combined_encoded.extend(bert_encoded[bert_index:])
-        return combined_encoded
+        gpt2_texts = self.gpt2_tokenizer.batch_decode([[gpt2_id] for gpt2_id in gpt2_encoded])
+        bert_texts = self.bert_tokenizer.batch_decode([[bert_id] for bert_id in bert_encoded])
+        return self._combine_by_similarity(gpt2_encoded, bert_encoded, gpt2_texts, bert_texts, segments,
+                                           self.gpt2_tokenizer.pad_token_id, self.bert_tokenizer.pad_token_id)
 
     def decode(self, token_ids):
-        # Improved decoding logic for combined tokens
-        gpt2_token_ids = token_ids[::2]
-        bert_token_ids = token_ids[1::2]
+        # Improved decoding logic for combined tokens; pads only fill the pairs
+        gpt2_token_ids = [token for token in token_ids[::2] if token != self.gpt2_tokenizer.pad_token_id]
+        bert_token_ids = [token for token in token_ids[1::2] if token != self.bert_tokenizer.pad_token_id]
         gpt2_decoded = self.gpt2_tokenizer.decode(gpt2_token_ids)
         bert_decoded = self.bert_tokenizer.decode(bert_token_ids)
         return gpt2_decoded + bert_decoded
 
+    def encode_batch(self, texts, num_workers=None):
+        return map_batch(self, 'encode', texts, num_workers)
+
+    def decode_batch(self, ids_list, num_workers=None):
+        return map_batch(self, 'decode', ids_list, num_workers)
+
+    def prepare_batch(self, ids_list, max_length=None, padding='longest', truncation=False):
+        # Padded int32 input_ids, attention_mask and token_type_ids for a batch of encodings
+        return prepare_batch(ids_list, max_length, padding, truncation, pad_token_id=self.bert_tokenizer.pad_token_id, sep_token_id=self.bert_tokenizer.sep_token_id)
+
     def create_attention_mask(self, token_ids):
         # Improved attention mask for combined tokens
         gpt2_token_ids = token_ids[::2]
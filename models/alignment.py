@@ -0,0 +1,85 @@
+from typing import List, Sequence, Tuple
+
+# Alignment of two tokenizations of the same text (GPT-2 and BERT) by the
+# character offsets of their tokens. A segment is a pair of token index ranges
+# (left_start, left_stop, right_start, right_stop). Segments with tokens on
+# both sides are the smallest groups of tokens whose spans overlap and end
+# together, so they cover the same characters. Tokens that overlap nothing on
+# the other side, like BERT's zero-width [CLS]/[SEP] or a GPT-2 token for a
+# stray space, form one-sided segments.
+
+Offsets = Sequence[Tuple[int, int]]
+Segment = Tuple[int, int, int, int]
+
+
+def align_offsets(left: Offsets, right: Offsets) -> List[Segment]:
+    # Merge-join of both streams in one linear pass, segments in text order
+    segments: List[Segment] = []
+    n, m = len(left), len(right)
+    i = j = 0
+    while i < n and j < m:
+        left_start, left_end = left[i]
+        right_start, right_end = right[j]
+        if left_start < right_end and right_start < left_end:
+            segment_start = min(left_start, right_start)
+            end = max(left_end, right_end)
+            first_left, first_right = i, j
+            i += 1
+            j += 1
+            # Grow the segment until neither side has a token reaching into it
+            while True:
+                if i < n and left[i][0] < end and left[i][1] > segment_start:
+                    end = max(end, left[i][1])
+                    i += 1
+                elif j < m and right[j][0] < end and right[j][1] > segment_start:
+                    end = max(end, right[j][1])
+                    j += 1
+                else:
+                    break
+            segments.append((first_left, i, first_right, j))
+        elif left_end <= right_end:
+            segments.append((i, i + 1, j, j))
+            i += 1
+        else:
+            segments.append((i, i, j, j + 1))
+            j += 1
+    segments.extend((k, k + 1, m, m) for k in range(i, n))
+    segments.extend((n, n, k, k + 1) for k in range(j, m))
+    return segments
+
+
+def is_shared(segment: Segment) -> bool:
+    return segment[0] < segment[1] and segment[2] < segment[3]
+
+
+def segment_pairs(segments: Sequence[Segment], left_texts: Sequence[str],
+                  right_texts: Sequence[str]) -> Tuple[List[str], List[str]]:
+    # Joined texts of both sides of every shared segment, the only spans worth comparing
+    left_joined, right_joined = [], []
+    for segment in segments:
+        if is_shared(segment):
+            left_start, left_stop, right_start, right_stop = segment
+            left_joined.append("".join(left_texts[left_start:left_stop]))
+            right_joined.append("".join(right_texts[right_start:right_stop]))
+    return left_joined, right_joined
+
+
+def select_segments(segments: Sequence[Segment], left_items: Sequence, right_items: Sequence,
+                    similarities: Sequence[float], threshold: float = 0.5) -> list:
+    # Left items of the shared segments more similar than threshold, right items
+    # of the others, in text order; one-sided segments keep their own items
+    combined = []
+    shared = 0
+    for segment in segments:
+        left_start, left_stop, right_start, right_stop = segment
+        if is_shared(segment):
+            keep_left = similarities[shared] > threshold
+            shared += 1
+            if keep_left:
+                combined.extend(left_items[left_start:left_stop])
+            else:
+                combined.extend(right_items[right_start:right_stop])
+        else:
+            combined.extend(left_items[left_start:left_stop])
+            combined.extend(right_items[right_start:right_stop])
+    return combined
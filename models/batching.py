@@ -0,0 +1,74 @@
+from itertools import chain
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+PADDING_STRATEGIES = ("longest", "max_length")
+
+
+def batch_tokenize(tokenizer, texts: Sequence[str]) -> List[List[str]]:
+    # tokenizer.tokenize(text) for every text, in one call to the Rust backend
+    # of a Hugging Face tokenizer when it has one
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return [tokenizer.tokenize(text) for text in texts]
+    return [encoding.tokens for encoding in backend.encode_batch(list(texts), add_special_tokens=False)]
+
+
+def batch_encode(tokenizer, texts: Sequence[str], add_special_tokens: bool = False) -> list:
+    # Encodings (tokens, ids and character offsets) of every text, in one call
+    # to the Rust backend of a Hugging Face tokenizer
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        raise ValueError("Character offsets need a fast tokenizer with a Rust backend.")
+    return backend.encode_batch(list(texts), add_special_tokens=add_special_tokens)
+
+
+def prepare_batch(
+    ids_list: Sequence[Sequence[int]],
+    max_length: Optional[int] = None,
+    padding: str = "longest",
+    truncation: bool = False,
+    *,
+    pad_token_id: int = 0,
+    sep_token_id: Optional[int] = None,
+) -> Dict[str, np.ndarray]:
+    # Pad a batch of id sequences into contiguous int32 arrays ready for a model
+    # server: input_ids, attention_mask (1 on real tokens) and token_type_ids
+    # (flipping after every SEP, as create_token_type_ids does per sequence).
+    if padding not in PADDING_STRATEGIES:
+        raise ValueError(f"padding must be one of {PADDING_STRATEGIES}, got {padding!r}.")
+    if max_length is not None and max_length <= 0:
+        raise ValueError("max_length must be a positive integer.")
+    if (padding == "max_length" or truncation) and max_length is None:
+        raise ValueError("max_length is required for max_length padding and for truncation.")
+
+    lengths = np.fromiter((len(ids) for ids in ids_list), dtype=np.int64, count=len(ids_list))
+    if truncation:
+        np.minimum(lengths, max_length, out=lengths)
+    longest = int(lengths.max()) if len(lengths) else 0
+    width = max_length if padding == "max_length" else longest
+    if longest > width:
+        raise ValueError(f"Sequence of length {longest} exceeds max_length {width}; pass truncation=True.")
+
+    attention_mask = np.arange(width) < lengths[:, None]
+    input_ids = np.full((len(lengths), width), pad_token_id, dtype=np.int32)
+    if truncation:
+        tokens = chain.from_iterable(ids[:length] for ids, length in zip(ids_list, lengths.tolist()))
+    else:
+        tokens = chain.from_iterable(ids_list)
+    input_ids[attention_mask] = np.fromiter(tokens, dtype=np.int32, count=int(lengths.sum()))
+
+    if sep_token_id is None:
+        token_type_ids = np.zeros_like(input_ids)
+    else:
+        # A token's type is the parity of the SEPs strictly before it
+        is_sep = (input_ids == sep_token_id) & attention_mask
+        seps_before = np.cumsum(is_sep, axis=1, dtype=np.int32) - is_sep
+        token_type_ids = (seps_before & 1) * attention_mask
+
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask.astype(np.int32),
+        "token_type_ids": np.ascontiguousarray(token_type_ids, dtype=np.int32),
+    }
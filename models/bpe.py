@@ -0,0 +1,66 @@
+import base64
+import heapq
+from typing import Dict, List
+
+
+def load_mergeable_ranks(vocab_file: str) -> Dict[bytes, int]:
+    # tiktoken / Llama 3 format: one "<base64 token> <rank>" pair per line
+    mergeable_ranks = {}
+    with open(vocab_file, "rb") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            token, rank = line.split()
+            mergeable_ranks[base64.b64decode(token)] = int(rank)
+    return mergeable_ranks
+
+
+def byte_pair_encode(piece: bytes, ranks: Dict[bytes, int]) -> List[int]:
+    # Most pieces are already a single token
+    rank = ranks.get(piece)
+    if rank is not None:
+        return [rank]
+
+    n = len(piece)
+    # Parts form a doubly linked list over byte offsets: the part starting at
+    # `i` covers piece[i:nxt[i]]. A heap holds candidate merges as
+    # (rank, left_start, right_start, right_end); entries whose parts have
+    # changed since they were pushed are skipped when popped.
+    nxt = list(range(1, n + 1))
+    prv = list(range(-1, n - 1))
+    alive = [True] * n
+    heap = []
+    for i in range(n - 1):
+        rank = ranks.get(piece[i:i + 2])
+        if rank is not None:
+            heap.append((rank, i, i + 1, i + 2))
+    heapq.heapify(heap)
+
+    while heap:
+        rank, left, right, right_end = heapq.heappop(heap)
+        if not alive[left] or nxt[left] != right or not alive[right] or nxt[right] != right_end:
+            continue
+
+        # Merge the right part into the left one
+        alive[right] = False
+        nxt[left] = right_end
+        if right_end < n:
+            prv[right_end] = left
+
+        before = prv[left]
+        if before >= 0:
+            rank = ranks.get(piece[before:right_end])
+            if rank is not None:
+                heapq.heappush(heap, (rank, before, left, right_end))
+        if right_end < n:
+            after_end = nxt[right_end]
+            rank = ranks.get(piece[left:after_end])
+            if rank is not None:
+                heapq.heappush(heap, (rank, left, right_end, after_end))
+
+    tokens = []
+    i = 0
+    while i < n:
+        tokens.append(ranks[piece[i:nxt[i]]])
+        i = nxt[i]
+    return tokens
@@ -0,0 +1,84 @@
+from typing import Dict, List, Literal, Sequence, Tuple, TypedDict
+
+from .bpe import byte_pair_encode
+from .custom_tokenizer import CustomTokenizer
+from .lru_cache import CacheInfo, LRUCache
+
+Role = Literal["system", "user", "assistant"]
+
+
+class Message(TypedDict):
+    role: Role
+    content: str
+
+
+Dialog = Sequence[Message]
+
+HEADER_SEPARATOR = b"\n\n"
+
+
+class ChatFormat:
+    # Llama-style chat prompts:
+    #   <|begin_of_text|> then, per message,
+    #   <|start_header_id|>role<|end_header_id|>\n\n content <|eot_id|>
+    #   and a final assistant header for the model to complete.
+    # The "\n\n" after the header is byte-pair encoded directly: encode() turns
+    # whitespace-only text into nothing.
+    # Every part is encoded on its own, so a message's ids do not depend on the
+    # messages around it. Headers are memoized per role and whole messages in
+    # an LRU cache keyed by (role, content): re-encoding a conversation with
+    # one new turn only encodes that turn, the system prompt and earlier turns
+    # are cache hits.
+
+    def __init__(self, tokenizer: CustomTokenizer, max_len: int = 10, cache_size: int = 4096):
+        self.tokenizer = tokenizer
+        self.max_len = max_len
+        self._headers: Dict[str, Tuple[int, ...]] = {}
+        self.message_cache: LRUCache[Tuple[int, ...]] = LRUCache(cache_size)
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, bos=False, eos=False, max_len=self.max_len)
+
+    def encode_header(self, message: Message) -> List[int]:
+        return list(self._header(message["role"]))
+
+    def _header(self, role: str) -> Tuple[int, ...]:
+        header = self._headers.get(role)
+        if header is None:
+            self.tokenizer._ensure_vocab()
+            special_tokens = self.tokenizer.special_tokens
+            header = tuple(
+                [special_tokens["<|start_header_id|>"]]
+                + self._encode(role)
+                + [special_tokens["<|end_header_id|>"]]
+                + byte_pair_encode(HEADER_SEPARATOR, self.tokenizer.mergeable_ranks)
+            )
+            self._headers[role] = header
+        return header
+
+    def encode_message(self, message: Message) -> List[int]:
+        return list(self._message(message))
+
+    def _message(self, message: Message) -> Tuple[int, ...]:
+        key = (message["role"], message["content"])
+        tokens = self.message_cache.get(key)
+        if tokens is None:
+            tokens = (
+                self._header(message["role"])
+                + tuple(self._encode(message["content"].strip()))
+                + (self.tokenizer.special_tokens["<|eot_id|>"],)
+            )
+            self.message_cache.put(key, tokens)
+        return tokens
+
+    def encode_dialog_prompt(self, dialog: Dialog) -> List[int]:
+        self.tokenizer._ensure_vocab()
+        tokens = [self.tokenizer.bos_id]
+        for message in dialog:
+            tokens.extend(self._message(message))
+        # Add the start of an assistant message for the model to complete
+        tokens.extend(self._header("assistant"))
+        return tokens
+
+    def cache_info(self) -> CacheInfo:
+        return self.message_cache.info()
@@ -0,0 +1,119 @@
+import argparse
+import json
+
+from .corpus_pipeline import (
+    CHECKPOINT_INTERVAL,
+    CHUNK_BYTES,
+    CHUNK_DOCUMENTS,
+    DEFAULT_TEXT_FIELD,
+    SHARD_TOKENS,
+    tokenize_corpus,
+)
+from .custom_tokenizer import CustomTokenizer
+from .vocab_builder import SPILL_ENTRIES, build_vocab_file
+
+
+def _tokenize(args) -> None:
+    tokenizer = CustomTokenizer(args.vocab)
+    summary = tokenize_corpus(
+        tokenizer,
+        args.input,
+        args.output_dir,
+        text_format=args.format,
+        text_field=args.field,
+        bos=args.bos,
+        eos=args.eos,
+        max_len=args.max_len,
+        num_workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        chunk_documents=args.chunk_documents,
+        chunk_bytes=args.chunk_bytes,
+        shard_tokens=args.shard_tokens,
+        checkpoint_interval=args.checkpoint_interval,
+        resume=args.resume,
+        report_interval=None if args.quiet else args.report_interval,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+def _hybrid_tokenizer_class():
+    # prototype_tokenization_model sits next to the models package: a sibling
+    # module when the repository is installed or run as a package, a top-level
+    # module when the repository root is on sys.path
+    if __package__ and "." in __package__:
+        from ..prototype_tokenization_model import HybridTokenizer
+    else:
+        from prototype_tokenization_model import HybridTokenizer
+    return HybridTokenizer
+
+
+def _build_vocab(args) -> None:
+    HybridTokenizer = _hybrid_tokenizer_class()
+    tokenizer = HybridTokenizer(args.gpt2_model, args.bert_model)
+    vocab = build_vocab_file(
+        tokenizer,
+        args.input,
+        args.output,
+        args.size,
+        tokenizer.reserved_tokens(),
+        text_format=args.format,
+        text_field=args.field,
+        num_workers=args.workers,
+        max_in_flight=args.max_in_flight,
+        chunk_documents=args.chunk_documents,
+        chunk_bytes=args.chunk_bytes,
+        max_entries=args.max_entries,
+        tmpdir=args.tmpdir,
+    )
+    print(json.dumps({"output": args.output, "vocab_size": len(vocab)}, indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="advancedtokencraft")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tokenize = commands.add_parser("tokenize", help="Tokenize a JSONL or plain-text corpus into sharded token files.")
+    tokenize.add_argument("input", help="JSONL file (one record per line) or plain text (one document per line)")
+    tokenize.add_argument("output_dir")
+    tokenize.add_argument("--vocab", required=True, help="tiktoken-style or binary vocabulary file")
+    tokenize.add_argument("--format", choices=["auto", "jsonl", "text"], default="auto")
+    tokenize.add_argument("--field", default=DEFAULT_TEXT_FIELD, help="JSONL field holding the text")
+    tokenize.add_argument("--bos", action="store_true", help="prepend <|begin_of_text|> to every document")
+    tokenize.add_argument("--eos", action="store_true", help="append <|end_of_text|> to every document")
+    tokenize.add_argument("--max-len", type=int, default=10)
+    tokenize.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    tokenize.add_argument("--max-in-flight", type=int, default=None, help="chunks queued ahead of the writer")
+    tokenize.add_argument("--chunk-documents", type=int, default=CHUNK_DOCUMENTS)
+    tokenize.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES)
+    tokenize.add_argument("--shard-tokens", type=int, default=SHARD_TOKENS)
+    tokenize.add_argument("--checkpoint-interval", type=int, default=CHECKPOINT_INTERVAL, help="chunks between checkpoints")
+    tokenize.add_argument("--resume", action="store_true", help="continue from the checkpoint in output_dir")
+    tokenize.add_argument("--report-interval", type=float, default=10.0, help="seconds between progress lines")
+    tokenize.add_argument("--quiet", action="store_true")
+    tokenize.set_defaults(func=_tokenize)
+
+    build_vocab = commands.add_parser("build-vocab", help="Build the HybridTokenizer vocabulary from corpus frequencies.")
+    build_vocab.add_argument("input", help="JSONL file (one record per line) or plain text (one document per line)")
+    build_vocab.add_argument("output", help="binary vocabulary file, loaded with HybridTokenizer(vocab_file=...)")
+    build_vocab.add_argument("--size", type=int, default=40000, help="tokens to keep, special tokens included")
+    build_vocab.add_argument("--gpt2-model", default="gpt2")
+    build_vocab.add_argument("--bert-model", default="bert-base-uncased")
+    build_vocab.add_argument("--format", choices=["auto", "jsonl", "text"], default="auto")
+    build_vocab.add_argument("--field", default=DEFAULT_TEXT_FIELD, help="JSONL field holding the text")
+    build_vocab.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    build_vocab.add_argument("--max-in-flight", type=int, default=None, help="chunks queued ahead of the counter")
+    build_vocab.add_argument("--chunk-documents", type=int, default=CHUNK_DOCUMENTS)
+    build_vocab.add_argument("--chunk-bytes", type=int, default=CHUNK_BYTES)
+    build_vocab.add_argument("--max-entries", type=int, default=SPILL_ENTRIES, help="distinct tokens held in memory before spilling to disk")
+    build_vocab.add_argument("--tmpdir", default=None, help="directory for spilled counts")
+    build_vocab.set_defaults(func=_build_vocab)
+    return parser
+
+
+def main(argv=None) -> None:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+import json
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from .parallel import imap_chunks
+
+# Corpus records carry their text in the same field dataset_tokenizer_test.py reads
+DEFAULT_TEXT_FIELD = "synthesized text"
+READ_BUFFER_SIZE = 1 << 22
+CHUNK_DOCUMENTS = 1024
+CHUNK_BYTES = 1 << 22
+SHARD_TOKENS = 1 << 28
+CHECKPOINT_INTERVAL = 64
+
+CHECKPOINT_FILE = "checkpoint.json"
+META_FILE = "meta.json"
+TOKEN_DTYPES = {"H": "uint16", "I": "uint32"}
+
+# Output layout, per shard:
+#   shard_NNNNN.bin  token ids, native-endian uint16 (vocabularies up to 65536
+#                    ids) or uint32, documents back to back
+#   shard_NNNNN.idx  uint64 token offsets, one more than the shard's documents;
+#                    document i is bin[idx[i]:idx[i + 1]]
+# checkpoint.json records how far the input has been consumed and how much of
+# the current shard is valid, so an interrupted run can resume from it.
+
+
+def token_typecode(vocab_size: int) -> str:
+    if vocab_size <= 1 << 16:
+        return "H"
+    if vocab_size <= 1 << 32:
+        return "I"
+    raise ValueError(f"Vocabulary of {vocab_size} ids does not fit in uint32 token files.")
+
+
+def detect_format(path: str) -> str:
+    return "jsonl" if path.endswith((".jsonl", ".json")) else "text"
+
+
+def shard_paths(output_dir: str, index: int) -> Tuple[str, str]:
+    stem = os.path.join(output_dir, f"shard_{index:05d}")
+    return stem + ".bin", stem + ".idx"
+
+
+def _write_json_atomic(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(data, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def document_text(line: bytes, text_format: str, text_field: str = DEFAULT_TEXT_FIELD) -> Optional[str]:
+    # The document on one input line, or None for a blank line
+    if text_format == "text":
+        text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+        return text or None
+    if not line.strip():
+        return None
+    return json.loads(line).get(text_field, "")
+
+
+class ChunkEncoder:
+    # Runs in the worker processes: parses a chunk of raw input lines and
+    # returns its tokens packed in one array, so results cross the process
+    # boundary as a single buffer rather than as lists of Python ints.
+
+    def __init__(self, tokenizer, typecode: str, text_format: str = "jsonl", text_field: str = DEFAULT_TEXT_FIELD,
+                 bos: bool = False, eos: bool = False, max_len: int = 10):
+        if text_format not in ("jsonl", "text"):
+            raise ValueError(f"text_format must be 'jsonl' or 'text', got {text_format!r}.")
+        self.tokenizer = tokenizer
+        self.typecode = typecode
+        self.text_format = text_format
+        self.text_field = text_field
+        self.bos = bos
+        self.eos = eos
+        self.max_len = max_len
+
+    def encode_chunk(self, lines: List[bytes]) -> Tuple[array, List[int]]:
+        tokens = array(self.typecode)
+        lengths = []
+        for line in lines:
+            text = document_text(line, self.text_format, self.text_field)
+            if text is None:
+                continue
+            ids = self.tokenizer.encode(text, bos=self.bos, eos=self.eos, max_len=self.max_len)
+            tokens.extend(ids)
+            lengths.append(len(ids))
+        return tokens, lengths
+
+
+class ShardedTokenWriter:
+    # Appends documents to the current shard and rolls over to a new one once
+    # it holds shard_tokens tokens; documents never straddle two shards. The
+    # offsets index is written as it grows, so a shard can be truncated back to
+    # any checkpointed state.
+
+    def __init__(self, output_dir: str, typecode: str, shard_tokens: int = SHARD_TOKENS,
+                 shard: int = 0, shard_documents: int = 0, shard_token_count: int = 0):
+        if shard_tokens <= 0:
+            raise ValueError("shard_tokens must be a positive integer.")
+        self.output_dir = output_dir
+        self.typecode = typecode
+        self.itemsize = array(typecode).itemsize
+        self.shard_tokens = shard_tokens
+        self.shard = shard
+        self.shard_documents = shard_documents
+        self.shard_token_count = shard_token_count
+        self._bin = None
+        self._idx = None
+
+    def _open(self) -> None:
+        bin_path, idx_path = shard_paths(self.output_dir, self.shard)
+        if self.shard_documents:
+            # Resuming inside a shard: drop whatever was written after the checkpoint
+            self._bin = open(bin_path, "r+b")
+            self._idx = open(idx_path, "r+b")
+            self._bin.truncate(self.shard_token_count * self.itemsize)
+            self._idx.truncate((self.shard_documents + 1) * 8)
+            self._bin.seek(0, os.SEEK_END)
+            self._idx.seek(0, os.SEEK_END)
+        else:
+            self._bin = open(bin_path, "wb")
+            self._idx = open(idx_path, "wb")
+            array("Q", [0]).tofile(self._idx)
+
+    def write(self, tokens: array, lengths: List[int]) -> bool:
+        # Returns True when this write completed a shard
+        if not lengths:
+            return False
+        if self._bin is None:
+            self._open()
+        tokens.tofile(self._bin)
+        offsets = array("Q")
+        position = self.shard_token_count
+        for length in lengths:
+            position += length
+            offsets.append(position)
+        offsets.tofile(self._idx)
+        self.shard_token_count = position
+        self.shard_documents += len(lengths)
+        if position >= self.shard_tokens:
+            self._close_files()
+            self.shard += 1
+            self.shard_documents = 0
+            self.shard_token_count = 0
+            return True
+        return False
+
+    def flush(self) -> None:
+        for file in (self._bin, self._idx):
+            if file is not None:
+                file.flush()
+                os.fsync(file.fileno())
+
+    def _close_files(self) -> None:
+        self.flush()
+        for file in (self._bin, self._idx):
+            if file is not None:
+                file.close()
+        self._bin = None
+        self._idx = None
+
+    def close(self) -> None:
+        self._close_files()
+
+    @property
+    def num_shards(self) -> int:
+        return self.shard + (1 if self.shard_documents else 0)
+
+    def state(self) -> Dict[str, int]:
+        return {
+            "shard": self.shard,
+            "shard_documents": self.shard_documents,
+            "shard_tokens": self.shard_token_count,
+        }
+
+
+class ProgressReporter:
+    def __init__(self, total_bytes: Optional[int] = None, interval: float = 10.0, stream: Optional[TextIO] = None):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stream = sys.stderr if stream is None else stream
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        # Rates cover this run only, not work done before a resume
+        self.start_documents = self.start_tokens = self.start_bytes = None
+
+    def update(self, documents: int, tokens: int, bytes_read: int, force: bool = False) -> None:
+        if self.start_documents is None:
+            self.start_documents, self.start_tokens, self.start_bytes = documents, tokens, bytes_read
+        now = time.perf_counter()
+        if self.interval is None or (not force and now - self.last_report < self.interval):
+            return
+        self.last_report = now
+        elapsed = max(now - self.start, 1e-9)
+        message = (
+            f"{documents:,} docs, {tokens:,} tokens, {bytes_read / 1e6:,.1f} MB"
+            f" | {(tokens - self.start_tokens) / elapsed:,.0f} tokens/s,"
+            f" {(bytes_read - self.start_bytes) / 1e6 / elapsed:,.2f} MB/s"
+        )
+        if self.total_bytes:
+            message += f" | {100.0 * bytes_read / self.total_bytes:.1f}%"
+        print(message, file=self.stream, flush=True)
+
+
+def _read_chunks(path: str, offset: int, chunk_documents: int, chunk_bytes: int,
+                 boundaries: deque) -> Iterator[List[bytes]]:
+    # Yield lists of raw lines, recording the input offset after each chunk
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as file:
+        file.seek(offset)
+        chunk = []
+        size = 0
+        for line in file:
+            chunk.append(line)
+            size += len(line)
+            if len(chunk) >= chunk_documents or size >= chunk_bytes:
+                offset += size
+                boundaries.append(offset)
+                yield chunk
+                chunk = []
+                size = 0
+        if chunk:
+            boundaries.append(offset + size)
+            yield chunk
+
+
+def tokenize_corpus(
+    tokenizer,
+    input_path: str,
+    output_dir: str,
+    *,
+    text_format: str = "auto",
+    text_field: str = DEFAULT_TEXT_FIELD,
+    bos: bool = False,
+    eos: bool = False,
+    max_len: int = 10,
+    num_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    chunk_documents: int = CHUNK_DOCUMENTS,
+    chunk_bytes: int = CHUNK_BYTES,
+    shard_tokens: int = SHARD_TOKENS,
+    checkpoint_interval: int = CHECKPOINT_INTERVAL,
+    resume: bool = False,
+    report_interval: Optional[float] = 10.0,
+    stream: Optional[TextIO] = None,
+) -> Dict[str, Any]:
+    # Tokenize a JSONL or plain-text corpus (one document per line) into sharded
+    # token files under output_dir. Input is streamed and at most max_in_flight
+    # chunks are tokenized ahead of the writer, so memory does not grow with
+    # the corpus. With resume=True, continue from output_dir's checkpoint.
+    if text_format == "auto":
+        text_format = detect_format(input_path)
+    if chunk_documents <= 0 or chunk_bytes <= 0:
+        raise ValueError("chunk_documents and chunk_bytes must be positive integers.")
+    typecode = token_typecode(tokenizer.vocab_size)
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+
+    checkpoint = _read_json(checkpoint_path) if resume else None
+    if checkpoint is not None:
+        if checkpoint["dtype"] != TOKEN_DTYPES[typecode]:
+            raise ValueError(f"Checkpoint was written with {checkpoint['dtype']} tokens, "
+                             f"but this tokenizer needs {TOKEN_DTYPES[typecode]}.")
+        if checkpoint.get("complete"):
+            return _summary(checkpoint)
+    else:
+        checkpoint = {
+            "input": os.path.abspath(input_path),
+            "dtype": TOKEN_DTYPES[typecode],
+            "vocab_size": tokenizer.vocab_size,
+            "input_offset": 0,
+            "documents": 0,
+            "tokens": 0,
+            "shard": 0,
+            "shard_documents": 0,
+            "shard_tokens": 0,
+            "complete": False,
+        }
+
+    writer = ShardedTokenWriter(output_dir, typecode, shard_tokens, checkpoint["shard"],
+                                checkpoint["shard_documents"], checkpoint["shard_tokens"])
+    encoder = ChunkEncoder(tokenizer, typecode, text_format, text_field, bos, eos, max_len)
+    reporter = ProgressReporter(os.path.getsize(input_path), report_interval, stream)
+
+    def save(complete: bool = False) -> None:
+        writer.flush()
+        checkpoint.update(writer.state(), input_offset=offset, documents=documents, tokens=tokens, complete=complete)
+        _write_json_atomic(checkpoint_path, checkpoint)
+
+    offset = checkpoint["input_offset"]
+    documents = checkpoint["documents"]
+    tokens = checkpoint["tokens"]
+    boundaries = deque()
+    chunks = _read_chunks(input_path, offset, chunk_documents, chunk_bytes, boundaries)
+    since_checkpoint = 0
+    try:
+        for chunk_tokens, lengths in imap_chunks(encoder, "encode_chunk", chunks, num_workers, max_in_flight):
+            shard_done = writer.write(chunk_tokens, lengths)
+            offset = boundaries.popleft()
+            documents += len(lengths)
+            tokens += len(chunk_tokens)
+            since_checkpoint += 1
+            if shard_done or since_checkpoint >= checkpoint_interval:
+                save()
+                since_checkpoint = 0
+            reporter.update(documents, tokens, offset)
+        save(complete=True)
+    finally:
+        writer.close()
+    reporter.update(documents, tokens, offset, force=True)
+
+    meta = _summary(checkpoint)
+    meta["num_shards"] = writer.num_shards
+    _write_json_atomic(os.path.join(output_dir, META_FILE), meta)
+    return meta
+
+
+def _summary(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    num_shards = checkpoint["shard"] + (1 if checkpoint["shard_documents"] else 0)
+    return {
+        "input": checkpoint["input"],
+        "dtype": checkpoint["dtype"],
+        "vocab_size": checkpoint["vocab_size"],
+        "documents": checkpoint["documents"],
+        "tokens": checkpoint["tokens"],
+        "num_shards": num_shards,
+    }
+
+
+def read_shard(output_dir: str, index: int, dtype: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    # Memory-map one shard: returns (tokens, offsets)
+    if dtype is None:
+        dtype = _read_json(os.path.join(output_dir, META_FILE))["dtype"]
+    bin_path, idx_path = shard_paths(output_dir, index)
+    offsets = np.fromfile(idx_path, dtype=np.uint64)
+    if offsets[-1] == 0:
+        return np.zeros(0, dtype=dtype), offsets
+    return np.memmap(bin_path, dtype=dtype, mode="r"), offsets
+
+
+def iter_documents(output_dir: str) -> Iterator[np.ndarray]:
+    meta = _read_json(os.path.join(output_dir, META_FILE))
+    for index in range(meta["num_shards"]):
+        tokens, offsets = read_shard(output_dir, index, meta["dtype"])
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            yield tokens[start:end]
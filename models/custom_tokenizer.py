@@ -1,19 +1,91 @@
-import re
-from typing import Dict, List, Union, Literal, AbstractSet, Collection
+from array import array
+from collections import ChainMap
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple, Union, Literal, AbstractSet, Collection
+
+import numpy as np
+
+from .bpe import byte_pair_encode, load_mergeable_ranks
+from .lru_cache import CacheInfo, LRUCache
+from .parallel import map_batch
+from .pre_tokenizer import SPACE, SPACE_TOKEN, PreTokenizer, piece_text
+from .profiling import profiler
+from .special_tokens import SpecialTokenScanner
+from .streaming_decoder import StreamingDecoder
+from .token_spans import KIND_SPACE, TokenSpans
+from .vocab_file import MmapVocab, is_vocab_file
+from .windows import DocumentWindows
 
 class CustomTokenizer:
     special_tokens: Dict[str, int]
     num_reserved_special_tokens = 256
     pat_str = r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|\w+|\d+|[^\s\w\d]|<\|space\|>|\s+"
+    _pre_tokenizer = PreTokenizer(pat_str)
+
+    def __init__(self, vocab_file: str, cache_size: int = 65536):
+        # The vocabulary is loaded on first encode/decode so that the
+        # pre-tokenizer can be used without a vocabulary file
+        self.vocab_file = vocab_file
+        self.mergeable_ranks: Optional[Mapping[bytes, int]] = None
+        # Pre-token string -> BPE token ids; cache_size=0 disables it
+        self.encode_cache: LRUCache[Tuple[int, ...]] = LRUCache(cache_size)
+        # (allowed, disallowed) special-token sets -> SpecialTokenScanner
+        self.special_scanners: LRUCache[SpecialTokenScanner] = LRUCache(64)
+
+    def _load_vocab(self, vocab_file: str) -> Mapping[bytes, int]:
+        # Load the byte-level BPE merge ranks from the given file, either a
+        # binary vocabulary (memory-mapped) or a tiktoken-style text file
+        if is_vocab_file(vocab_file):
+            return MmapVocab(vocab_file)
+        return load_mergeable_ranks(vocab_file)
+
+    def _ensure_vocab(self) -> None:
+        if self.mergeable_ranks is not None:
+            return
+        mergeable_ranks = self._load_vocab(self.vocab_file)
+        num_base_tokens = len(mergeable_ranks)
+        special_tokens = [
+            "<|begin_of_text|>",
+            "<|end_of_text|>",
+            SPACE_TOKEN,
+            "<|reserved_special_token_0|>",
+            "<|reserved_special_token_1|>",
+            "<|start_header_id|>",
+            "<|end_header_id|>",
+            "<|reserved_special_token_2|>",
+            "<|eot_id|>",  # end of turn
+        ] + [
+            f"<|reserved_special_token_{i}|>"
+            for i in range(3, self.num_reserved_special_tokens - 6)
+        ]
+        self.special_tokens = {token: num_base_tokens + i for i, token in enumerate(special_tokens)}
+        self.n_words = num_base_tokens + len(special_tokens)
+        self.bos_id = self.special_tokens["<|begin_of_text|>"]
+        self.eos_id = self.special_tokens["<|end_of_text|>"]
+        self.space_id = self.special_tokens[SPACE_TOKEN]
 
-    def __init__(self, vocab_file: str):
-        # Load vocabulary from file
-        self.special_tokens = self._load_vocab(vocab_file)
+        special_decoder = {token_id: token.encode("utf-8") for token, token_id in self.special_tokens.items()}
+        # The space marker stands for a collapsed whitespace run
+        special_decoder[self.space_id] = b" "
+        if isinstance(mergeable_ranks, MmapVocab):
+            self.decoder: Mapping[int, bytes] = ChainMap(special_decoder, mergeable_ranks.decoder)
+        else:
+            self.decoder = {rank: token for token, rank in mergeable_ranks.items()}
+            self.decoder.update(special_decoder)
+        self.mergeable_ranks = mergeable_ranks
 
-    def _load_vocab(self, vocab_file: str) -> Dict[str, int]:
-        # Load vocabulary from the given file
-        # ...
-        pass
+    @property
+    def vocab_size(self) -> int:
+        self._ensure_vocab()
+        return self.n_words
+
+    def _special_scanner(self, allowed_special: AbstractSet[str], disallowed_special: Collection[str]) -> SpecialTokenScanner:
+        # One scanner per (allowed, disallowed) configuration, built on first use
+        key = (frozenset(allowed_special), frozenset(disallowed_special))
+        scanner = self.special_scanners.get(key)
+        if scanner is None:
+            scanner = SpecialTokenScanner(key[0], key[1] - key[0])
+            self.special_scanners.put(key, scanner)
+        return scanner
 
     def encode(
         self,
@@ -25,73 +97,176 @@ class CustomTokenizer:
         allowed_special: Union[Literal["all"], AbstractSet[str]] = set(),
         disallowed_special: Union[Literal["all"], Collection[str]] = (),
     ) -> List[int]:
-        # ...
-        pass
+        self._ensure_vocab()
+        t: List[int] = []
+        if bos:
+            t.append(self.bos_id)
+        with profiler.stage("custom.encode", text=s):
+            start = 0
+            for match_start, token in self._special_matches(s, allowed_special, disallowed_special):
+                self._encode_ordinary(s[start:match_start], max_len, t)
+                t.append(self.special_tokens[token])
+                start = match_start + len(token)
+            self._encode_ordinary(s[start:], max_len, t)
+        if eos:
+            t.append(self.eos_id)
+        return t
+
+    def _special_matches(
+        self,
+        s: str,
+        allowed_special: Union[Literal["all"], AbstractSet[str]],
+        disallowed_special: Union[Literal["all"], Collection[str]],
+    ) -> Iterator[Tuple[int, str]]:
+        # (start, token) of each allowed special token in s, in one pass;
+        # raises ValueError on disallowed ones
+        if allowed_special == "all":
+            allowed_special = self.special_tokens.keys()
+        if disallowed_special == "all":
+            disallowed_special = self.special_tokens.keys() - set(allowed_special)
+        if not (allowed_special or disallowed_special):
+            return iter(())
+        return self._special_scanner(allowed_special, disallowed_special).finditer(s)
+
+    def encode_with_offsets(
+        self,
+        s: str,
+        *,
+        max_len: int = 10,
+        allowed_special: Union[Literal["all"], AbstractSet[str]] = set(),
+        disallowed_special: Union[Literal["all"], Collection[str]] = (),
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # The ids of encode(s, bos=False, eos=False, ...) as a uint32 array, and
+        # the character offsets (starts, ends) of the pre-token or special token
+        # each id came from
+        self._ensure_vocab()
+        ids, starts, ends = [], [], []
+
+        def add_text(begin: int, end: int) -> None:
+            spans = self.split_spans(s[begin:end], max_len)
+            span_ids, counts = self.encode_spans(spans)
+            offsets = spans.as_numpy()
+            counts = np.frombuffer(counts, dtype=np.uint32)
+            ids.append(np.frombuffer(span_ids, dtype=np.uint32))
+            starts.append(np.repeat(offsets["starts"], counts) + np.uint32(begin))
+            ends.append(np.repeat(offsets["ends"], counts) + np.uint32(begin))
+
+        start = 0
+        for match_start, token in self._special_matches(s, allowed_special, disallowed_special):
+            add_text(start, match_start)
+            start = match_start + len(token)
+            ids.append(np.array([self.special_tokens[token]], dtype=np.uint32))
+            starts.append(np.array([match_start], dtype=np.uint32))
+            ends.append(np.array([start], dtype=np.uint32))
+        add_text(start, len(s))
+        return np.concatenate(ids), np.concatenate(starts), np.concatenate(ends)
+
+    def encode_windows(
+        self,
+        s: str,
+        window: int = 512,
+        stride: int = 128,
+        *,
+        bos: bool = True,
+        eos: bool = True,
+        max_len: int = 10,
+        allowed_special: Union[Literal["all"], AbstractSet[str]] = set(),
+        disallowed_special: Union[Literal["all"], Collection[str]] = (),
+    ) -> DocumentWindows:
+        # Encode a long document once and cut it into windows of at most window
+        # tokens that overlap by stride tokens. Windows are views into the one id
+        # buffer, each framed by bos/eos and carrying its character offsets.
+        ids, starts, ends = self.encode_with_offsets(
+            s, max_len=max_len, allowed_special=allowed_special, disallowed_special=disallowed_special)
+        return DocumentWindows(s, ids, starts, ends, window, stride,
+                               (self.bos_id,) if bos else (), (self.eos_id,) if eos else ())
+
+    def _encode_ordinary(self, s: str, max_len: int, out: List[int]) -> None:
+        ranks = self.mergeable_ranks
+        space_id = self.space_id
+        cache = self.encode_cache
+        with profiler.stage("custom.pre_tokenize"):
+            pieces = self._pre_tokenizer.pieces(s, max_len)
+        with profiler.stage("custom.bpe", cache=cache):
+            for piece in pieces:
+                if piece is SPACE:
+                    out.append(space_id)
+                    continue
+                text = piece_text(s, piece)
+                tokens = cache.get(text)
+                if tokens is None:
+                    tokens = tuple(byte_pair_encode(text.encode("utf-8"), ranks))
+                    cache.put(text, tokens)
+                out.extend(tokens)
+
+    def encode_spans(self, spans: TokenSpans) -> Tuple[array, array]:
+        # BPE ids of pre-tokenized spans (as encode(text, bos=False, eos=False)
+        # gives for spans of text), and the number of ids each span produced
+        self._ensure_vocab()
+        ranks = self.mergeable_ranks
+        cache = self.encode_cache
+        ids, counts = array("I"), array("I")
+        for i in range(len(spans)):
+            if spans.kinds[i] == KIND_SPACE:
+                ids.append(self.space_id)
+                counts.append(1)
+                continue
+            text = spans.token(i)
+            tokens = cache.get(text)
+            if tokens is None:
+                tokens = tuple(byte_pair_encode(text.encode("utf-8"), ranks))
+                cache.put(text, tokens)
+            ids.extend(tokens)
+            counts.append(len(tokens))
+        return ids, counts
+
+    def encode_batch(
+        self,
+        texts: Sequence[str],
+        *,
+        bos: bool,
+        eos: bool,
+        max_len: int = 10,
+        allowed_special: Union[Literal["all"], AbstractSet[str]] = set(),
+        disallowed_special: Union[Literal["all"], Collection[str]] = (),
+        num_workers: Optional[int] = None,
+    ) -> List[List[int]]:
+        # Load the vocabulary before any worker is forked so that all of them share it
+        self._ensure_vocab()
+        return map_batch(
+            self, "encode", texts, num_workers,
+            bos=bos, eos=eos, max_len=max_len,
+            allowed_special=allowed_special, disallowed_special=disallowed_special,
+        )
+
+    def cache_info(self) -> CacheInfo:
+        return self.encode_cache.info()
+
+    def decode(self, t: Sequence[int], skip_special_tokens: bool = False) -> str:
+        self._ensure_vocab()
+        decoder = self.decoder
+        if skip_special_tokens:
+            skip_ids = self._skipped_special_ids()
+            t = [token for token in t if token not in skip_ids]
+        return b"".join(decoder[token] for token in t).decode("utf-8", errors="replace")
+
+    def _skipped_special_ids(self) -> AbstractSet[int]:
+        # Special tokens dropped by skip_special_tokens; the space marker is text
+        return frozenset(self.special_tokens.values()) - {self.space_id}
+
+    def streaming_decoder(self, skip_special_tokens: bool = False) -> StreamingDecoder:
+        # Incremental decode of generated ids, see models/streaming_decoder.py
+        self._ensure_vocab()
+        return StreamingDecoder(self.decoder, self._skipped_special_ids() if skip_special_tokens else ())
+
+    def decode_batch(self, ids_list: Sequence[Sequence[int]], num_workers: Optional[int] = None) -> List[str]:
+        self._ensure_vocab()
+        return map_batch(self, "decode", ids_list, num_workers)
 
     def _split_whitespaces_or_nonwhitespaces(self, s: str, max_len: int) -> List[str]:
-        if not isinstance(max_len, int) or max_len <= 0:
-            raise ValueError("max_len must be a positive integer.")
-
-        tokens = []
-        current_token = ""
-        space_encountered = False
-
-        for match in re.finditer(self.pat_str, s):
-            token = match.group()
-            if token.isspace():
-                if not space_encountered:
-                    if current_token:
-                        tokens.append(current_token)
-                        current_token = ""
-                    tokens.append("<|space|>")
-                space_encountered = True
-            else:
-                space_encountered = False
-                if len(token) > max_len:
-                    start = 0
-                    while start < len(token):
-                        end = min(start + max_len, len(token))
-                        tokens.append(token[start:end])
-                        start = end
-                else:
-                    if current_token:
-                        if len(current_token) + len(token) > max_len:  # Do not consider space when merging
-                            tokens.append(current_token)
-                            current_token = token
-                        else:
-                            current_token += token  # Do not add space when merging
-                    else:
-                        current_token = token
-
-        if current_token:
-            tokens.append(current_token)
-
-        # Merge tokens to respect max_len
-        merged_tokens = []
-        current_token = ""
-        for token in tokens:
-            if token == "<|space|>":
-                if current_token:
-                    merged_tokens.append(current_token)
-                    current_token = ""
-                if not merged_tokens or merged_tokens[-1] != "<|space|>":
-                    merged_tokens.append(token)
-            else:
-                if len(current_token) + len(token) > max_len:
-                    if current_token:
-                        merged_tokens.append(current_token)
-                    current_token = token
-                else:
-                    if current_token:
-                        current_token += token  # Do not add space when merging in this step
-                    else:
-                        current_token = token
-
-        if current_token:
-            merged_tokens.append(current_token)
-
-        # Remove leading <|space|> tokens
-        while merged_tokens and merged_tokens[0] == "<|space|>":
-            merged_tokens.pop(0)
-
-        return merged_tokens
+        with profiler.stage("custom.split", text=s):
+            return self._pre_tokenizer.split(s, max_len)
+
+    def split_spans(self, s: str, max_len: int) -> TokenSpans:
+        # The same tokens as (start, end, kind) offset arrays, materialised lazily
+        return self._pre_tokenizer.spans(s, max_len)
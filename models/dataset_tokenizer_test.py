@@ -3,7 +3,7 @@ import sys
 import os
 import re
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from custom_tokenizer_revision_v3 import CustomTokenizer
+from models.custom_tokenizer_revision_v3 import CustomTokenizer
 
 def load_dataset(file_path):
     with open(file_path, 'r') as file:
@@ -20,6 +20,9 @@ def test_tokenizer_on_dataset(tokenizer, dataset_path, max_len=10, subset_size=1
         print(f"Tokens: {tokens}")
         print()
 
+# A script helper, not a test: keep pytest from collecting it
+test_tokenizer_on_dataset.__test__ = False
+
 if __name__ == "__main__":
     tokenizer = CustomTokenizer()
     dataset_path = "instruction.jsonl"
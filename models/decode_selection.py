@@ -0,0 +1,85 @@
+from abc import ABC, abstractmethod
+from typing import List, Sequence, Tuple
+
+# Strategies for picking between the GPT-2 and BERT decodes of the same ids in
+# models/tokenization_model.CustomTokenizer. select_batch receives the owning
+# tokenizer, the id sequences and one (gpt2_decoded, bert_decoded) pair per
+# sequence, and returns the chosen strings. As before, BERT wins ties.
+
+REPLACEMENT_CHAR = '\ufffd'
+
+
+class DecodeSelector(ABC):
+    @abstractmethod
+    def select_batch(self, tokenizer, ids_list: Sequence[Sequence[int]], candidates: Sequence[Tuple[str, str]]) -> List[str]:
+        ...
+
+    def select(self, tokenizer, token_ids: Sequence[int], gpt2_decoded: str, bert_decoded: str) -> str:
+        return self.select_batch(tokenizer, [token_ids], [(gpt2_decoded, bert_decoded)])[0]
+
+
+class CoverageSelector(DecodeSelector):
+    # Default: no model calls. Identical decodes are returned as is; otherwise
+    # each side scores the fraction of ids inside its vocabulary, minus the rate
+    # of replacement characters (broken UTF-8) and unknown tokens in its text.
+
+    def select_batch(self, tokenizer, ids_list, candidates):
+        gpt2_tokenizer = tokenizer.gpt2_tokenizer
+        bert_tokenizer = tokenizer.bert_tokenizer
+        selected = []
+        for token_ids, (gpt2_decoded, bert_decoded) in zip(ids_list, candidates):
+            if gpt2_decoded == bert_decoded:
+                selected.append(gpt2_decoded)
+                continue
+            gpt2_score = coverage_score(gpt2_tokenizer, token_ids, gpt2_decoded)
+            bert_score = coverage_score(bert_tokenizer, token_ids, bert_decoded)
+            selected.append(gpt2_decoded if gpt2_score > bert_score else bert_decoded)
+        return selected
+
+
+def coverage_score(tokenizer, token_ids: Sequence[int], text: str) -> float:
+    if not token_ids:
+        return 1.0
+    vocab_size = len(tokenizer)
+    known = sum(1 for token_id in token_ids if 0 <= token_id < vocab_size)
+    broken = text.count(REPLACEMENT_CHAR)
+    if tokenizer.unk_token:
+        broken += text.count(tokenizer.unk_token)
+    return (known - broken) / len(token_ids)
+
+
+class CoherenceSelector(DecodeSelector):
+    # Opt-in: score every candidate with the coherence classifier. All the
+    # candidates of a batch go through the pipeline in one call, and pairs that
+    # decode identically are not scored at all.
+
+    def __init__(self, batch_size: int = 32):
+        self.batch_size = batch_size
+
+    def select_batch(self, tokenizer, ids_list, candidates):
+        texts = [text for gpt2_decoded, bert_decoded in candidates if gpt2_decoded != bert_decoded for text in (gpt2_decoded, bert_decoded)]
+        scores = iter(tokenizer._evaluate_texts(texts, batch_size=self.batch_size)) if texts else iter(())
+        selected = []
+        for gpt2_decoded, bert_decoded in candidates:
+            if gpt2_decoded == bert_decoded:
+                selected.append(gpt2_decoded)
+                continue
+            gpt2_score = next(scores)
+            bert_score = next(scores)
+            selected.append(gpt2_decoded if gpt2_score > bert_score else bert_decoded)
+        return selected
+
+
+DECODE_SELECTORS = {
+    'coverage': CoverageSelector,
+    'coherence': CoherenceSelector,
+}
+
+
+def get_decode_selector(strategy) -> DecodeSelector:
+    if isinstance(strategy, DecodeSelector):
+        return strategy
+    try:
+        return DECODE_SELECTORS[strategy]()
+    except KeyError:
+        raise ValueError(f"Unknown decode strategy {strategy!r}; expected one of {sorted(DECODE_SELECTORS)}.") from None
@@ -0,0 +1,87 @@
+import json
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .lru_cache import LRUCache
+from .similarity import paired_cosine_similarity
+
+
+class EmbeddingService:
+    # Mean-pooled token embeddings with a bounded token -> embedding cache
+    # (max_entries rows of the model's hidden size). Each call deduplicates its
+    # tokens and embeds the cache misses in padded batches, so a sentence costs
+    # one forward pass instead of one per token.
+
+    def __init__(self, model, tokenizer, max_entries: int = 100000, batch_size: int = 256):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.cache: LRUCache[np.ndarray] = LRUCache(max_entries)
+        self.forward_calls = 0
+
+    def _forward(self, tokens: List[str]) -> np.ndarray:
+        import torch
+
+        self.forward_calls += 1
+        inputs = self.tokenizer(tokens, padding=True, return_tensors='pt')
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        # Average over real positions only, which matches the unpadded single-token mean
+        mask = inputs['attention_mask'].unsqueeze(-1).to(outputs.last_hidden_state.dtype)
+        summed = (outputs.last_hidden_state * mask).sum(dim=1)
+        return (summed / mask.sum(dim=1)).numpy().astype(np.float32)
+
+    def embed(self, tokens: Sequence[str]) -> np.ndarray:
+        found: Dict[str, np.ndarray] = {}
+        missing = []
+        for token in dict.fromkeys(tokens):
+            embedding = self.cache.get(token)
+            if embedding is None:
+                missing.append(token)
+            else:
+                found[token] = embedding
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for token, embedding in zip(batch, self._forward(batch)):
+                self.cache.put(token, embedding)
+                found[token] = embedding
+
+        if not tokens:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([found[token] for token in tokens])
+
+    def paired_cosine(self, left: Sequence[str], right: Sequence[str]) -> np.ndarray:
+        # Cosine similarity of left[i] with right[i], from a single embed call
+        if len(left) != len(right):
+            raise ValueError("left and right must have the same length.")
+        if not left:
+            return np.zeros(0, dtype=np.float32)
+        embeddings = self.embed(list(left) + list(right))
+        return paired_cosine_similarity(embeddings[:len(left)], embeddings[len(left):])
+
+    def save(self, path: str) -> None:
+        # Embeddings go to `path` as a float16 .npy, tokens to a JSON sidecar
+        entries = self.cache.items()
+        tokens = [token for token, _ in entries]
+        if entries:
+            matrix = np.stack([embedding for _, embedding in entries]).astype(np.float16)
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float16)
+        np.save(path, matrix)
+        with open(_tokens_path(path), 'w') as file:
+            json.dump(tokens, file)
+
+    def load(self, path: str) -> None:
+        matrix = np.load(path if path.endswith('.npy') else path + '.npy')
+        with open(_tokens_path(path)) as file:
+            tokens = json.load(file)
+        for token, embedding in zip(tokens, matrix.astype(np.float32)):
+            self.cache.put(token, embedding)
+
+
+def _tokens_path(path: str) -> str:
+    if path.endswith('.npy'):
+        path = path[:-len('.npy')]
+    return path + '.tokens.json'
@@ -0,0 +1,40 @@
+import numpy as np
+
+from .token_spans import TokenSpans
+
+
+class IncrementalEncoding:
+    # A document's pre-token spans and BPE ids, kept equal to
+    # tokenizer.split_spans(text, max_len) and
+    # tokenizer.encode(text, bos=False, eos=False, max_len=max_len) across edits.
+    # Each edit re-tokenizes and re-encodes only the runs it touches (see
+    # PreTokenizer.edit_window) and splices the result into both streams.
+
+    def __init__(self, tokenizer, text: str, max_len: int = 10):
+        self.tokenizer = tokenizer
+        self.max_len = max_len
+        self.spans: TokenSpans = tokenizer.split_spans(text, max_len)
+        # ids of every span, and how many ids each span produced
+        self.ids, self.counts = tokenizer.encode_spans(self.spans)
+
+    @property
+    def text(self) -> str:
+        return self.spans.text
+
+    def edit(self, offset: int, deleted: int, inserted: str) -> None:
+        # Replace text[offset:offset + deleted] with inserted
+        pre_tokenizer = self.tokenizer._pre_tokenizer
+        first, last, window, delta = pre_tokenizer.edit_window(self.spans, offset, deleted, inserted, self.max_len)
+        window_ids, window_counts = self.tokenizer.encode_spans(window)
+
+        counts = np.frombuffer(self.counts, dtype=np.uint32)
+        ids_first = int(counts[:first].sum(dtype=np.int64))
+        ids_last = ids_first + int(counts[first:last].sum(dtype=np.int64))
+        del counts
+        self.ids[ids_first:ids_last] = window_ids
+        self.counts[first:last] = window_counts
+        self.spans.splice(first, last, window, delta)
+
+    def tolist(self) -> list:
+        return self.ids.tolist()
+
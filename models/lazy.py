@@ -0,0 +1,46 @@
+import threading
+
+
+class lazy_component:
+    # Builds an expensive attribute (a model, a tokenizer) on first access.
+    # The value is stored in the instance __dict__, so later accesses skip the
+    # descriptor entirely; construction happens once even when several threads
+    # race for it. The owning instance needs no setup: the lock is created on
+    # demand under a class-wide lock.
+
+    _init_lock = threading.Lock()
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        with _instance_lock(obj):
+            try:
+                return obj.__dict__[self.name]
+            except KeyError:
+                value = self.factory(obj)
+                obj.__dict__[self.name] = value
+                return value
+
+
+def _instance_lock(obj):
+    lock = obj.__dict__.get('_component_lock')
+    if lock is None:
+        with lazy_component._init_lock:
+            lock = obj.__dict__.setdefault('_component_lock', threading.RLock())
+    return lock
+
+
+def is_loaded(obj, name):
+    return name in obj.__dict__
+
+
+def lazy_components(cls):
+    return [name for name in dir(cls) if isinstance(getattr(cls, name, None), lazy_component)]
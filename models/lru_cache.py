@@ -0,0 +1,56 @@
+from collections import OrderedDict, namedtuple
+from typing import Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+
+class LRUCache(Generic[V]):
+    # Bounded least-recently-used map with hit/miss counters. A max_entries of 0
+    # disables caching entirely, so lookups always miss and nothing is stored.
+
+    def __init__(self, max_entries: int = 65536):
+        if not isinstance(max_entries, int) or max_entries < 0:
+            raise ValueError("max_entries must be a non-negative integer.")
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, V]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: V) -> None:
+        if not self.max_entries:
+            return
+        data = self._data
+        data[key] = value
+        data.move_to_end(key)
+        if len(data) > self.max_entries:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def items(self):
+        # Entries from least to most recently used, without touching the counters
+        return list(self._data.items())
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, self.max_entries, len(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
@@ -0,0 +1,143 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Batches smaller than this per worker are cheaper to run in-process
+MIN_ITEMS_PER_WORKER = 64
+# Chunks per worker, so that uneven chunks still balance across the pool
+CHUNKS_PER_WORKER = 4
+
+_worker_target: Any = None
+
+# The pool of the last target map_batch sharded a batch for, kept so that later
+# batches skip starting the workers (and, with fork, copying the target). The
+# workers keep the target as it was when the pool started, which suits
+# tokenizers: only their caches change afterwards. A batch for another target
+# or worker count replaces the pool; close_pool() shuts it down.
+_pool_lock = threading.Lock()
+_pool: Any = None
+# (pid, id(target), num_workers) of _pool; the pool holds the target, so the id stays valid
+_pool_owner: Optional[Tuple[int, int, int]] = None
+
+
+def _init_worker(target: Any) -> None:
+    global _worker_target
+    _worker_target = target
+
+
+def _run_items(task):
+    method_name, chunk, kwargs = task
+    method = getattr(_worker_target, method_name)
+    return [method(item, **kwargs) for item in chunk]
+
+
+def _run_call(task):
+    method_name, chunk, kwargs = task
+    return getattr(_worker_target, method_name)(chunk, **kwargs)
+
+
+def _context():
+    # With fork, workers inherit the target (a tokenizer and its vocabulary)
+    # copy-on-write, since Process arguments are not pickled; otherwise it is
+    # pickled once per worker, never per task
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def default_num_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _shared_pool(target: Any, num_workers: int):
+    # Called with _pool_lock held
+    global _pool, _pool_owner
+    owner = (os.getpid(), id(target), num_workers)
+    if _pool_owner != owner:
+        _close_pool()
+        _pool = _context().Pool(num_workers, initializer=_init_worker, initargs=(target,))
+        _pool_owner = owner
+    return _pool
+
+
+def _close_pool() -> None:
+    global _pool, _pool_owner
+    # A forked child inherits the parent's pool object but not its workers
+    if _pool is not None and _pool_owner[0] == os.getpid():
+        _pool.terminate()
+    _pool = _pool_owner = None
+
+
+def close_pool() -> None:
+    with _pool_lock:
+        _close_pool()
+
+
+atexit.register(close_pool)
+
+
+def map_batch(
+    target: Any,
+    method_name: str,
+    items: Sequence[Any],
+    num_workers: Optional[int] = None,
+    **kwargs: Any,
+) -> List[Any]:
+    # Call target.<method_name>(item, **kwargs) for every item, sharding large
+    # batches across a process pool that is reused by later batches for the
+    # same target. Results are returned in input order.
+    if num_workers is None:
+        num_workers = default_num_workers()
+    # The pool is sized by the requested workers, so batches of different
+    # lengths share it; small batches just use fewer of its workers
+    pool_workers = num_workers
+    num_workers = min(num_workers, len(items) // MIN_ITEMS_PER_WORKER)
+    if num_workers <= 1:
+        method = getattr(target, method_name)
+        return [method(item, **kwargs) for item in items]
+
+    chunk_size = -(-len(items) // (num_workers * CHUNKS_PER_WORKER))
+    tasks = [(method_name, items[i:i + chunk_size], kwargs) for i in range(0, len(items), chunk_size)]
+    with _pool_lock:
+        try:
+            results = _shared_pool(target, pool_workers).map(_run_items, tasks)
+        except BaseException:
+            # Start afresh next time rather than reuse a pool left mid-batch
+            _close_pool()
+            raise
+    return [result for chunk in results for result in chunk]
+
+
+def imap_chunks(
+    target: Any,
+    method_name: str,
+    chunks: Iterable[Any],
+    num_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    **kwargs: Any,
+) -> Iterator[Any]:
+    # Yield target.<method_name>(chunk, **kwargs) for each chunk, in order. At
+    # most max_in_flight chunks are submitted ahead of the consumer, so memory
+    # stays bounded however long the input iterator is.
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if num_workers <= 1:
+        method = getattr(target, method_name)
+        for chunk in chunks:
+            yield method(chunk, **kwargs)
+        return
+
+    if max_in_flight is None:
+        max_in_flight = 2 * num_workers
+    with ProcessPoolExecutor(num_workers, mp_context=_context(), initializer=_init_worker, initargs=(target,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_run_call, (method_name, chunk, kwargs)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,304 @@
+import re
+from array import array
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+from .profiling import profiler
+from .token_spans import KIND_SPACE, KIND_SPLIT, KIND_TEXT, SPACE_TOKEN, TokenSpans
+
+# Marker used in piece lists for a collapsed run of whitespace
+SPACE = None
+
+# A piece is either SPACE or a flat sequence of offsets (start0, end0, start1, end1, ...)
+# into the original string. Almost every piece is a single contiguous span; more
+# than one span only happens when an over-long word is chunked while a shorter
+# token is still pending, which the original two-pass algorithm emitted out of order.
+Piece = Optional[Sequence[int]]
+
+# Character class of every ASCII code point under the Unicode-aware patterns,
+# derived from re itself: \s also covers \x1c-\x1f, which re.ASCII would not
+ASCII_SPACE, ASCII_WORD, ASCII_OTHER = 0, 1, 2
+ASCII_CLASSES = bytes(
+    ASCII_SPACE if re.match(r"\s", chr(c)) else ASCII_WORD if re.match(r"\w", chr(c)) else ASCII_OTHER
+    for c in range(128)
+)
+
+
+def _ascii_class_set(cls: int) -> str:
+    return "[" + "".join(re.escape(chr(c)) for c in range(128) if ASCII_CLASSES[c] == cls) + "]"
+
+
+# Inside a whitespace-free ASCII run the Llama-style patterns reduce to a
+# contraction, a run of word characters or a single other character: \d+ is
+# shadowed by \w+, <|space|> starts with "<", and the whitespace alternatives
+# never match. Every character is covered, so the matches tile the run.
+ASCII_TOKEN_PATTERN = re.compile(
+    "'(?:[sS]|[tT]|[rR][eE]|[vV][eE]|[mM]|[lL][lL]|[dD])|"
+    + _ascii_class_set(ASCII_WORD) + "+|"
+    + _ascii_class_set(ASCII_OTHER)
+)
+LLAMA_PAT_STR = r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|\w+|\d+|[^\s\w\d]|<\|space\|>|\s+"
+ASCII_PAT_STRS = frozenset((LLAMA_PAT_STR, LLAMA_PAT_STR + r"|\n|\t"))
+
+
+def _extend(segs: List[int], other: List[int]) -> None:
+    # Append the spans of `other` to `segs`, coalescing adjacent spans
+    if segs[-1] == other[0]:
+        segs[-1] = other[1]
+        segs.extend(other[2:])
+    else:
+        segs.extend(other)
+
+
+def piece_text(s: str, piece: Piece) -> str:
+    if piece is SPACE:
+        return SPACE_TOKEN
+    if len(piece) == 2:
+        return s[piece[0]:piece[1]]
+    return "".join(s[piece[i]:piece[i + 1]] for i in range(0, len(piece), 2))
+
+
+class _PieceMerger:
+    # Second merge stage: greedily packs consecutive non-space pieces up to max_len
+    __slots__ = ("max_len", "pieces", "cur", "cur_len")
+
+    def __init__(self, max_len: int, pieces: List[Piece]):
+        self.max_len = max_len
+        self.pieces = pieces
+        self.cur: Piece = None
+        self.cur_len = 0
+
+    def push(self, segs: List[int], length: int) -> None:
+        if self.cur is None:
+            self.cur = segs
+            self.cur_len = length
+        elif self.cur_len + length > self.max_len:
+            self.pieces.append(self.cur)
+            self.cur = segs
+            self.cur_len = length
+        else:
+            _extend(self.cur, segs)
+            self.cur_len += length
+
+    def finish(self) -> None:
+        if self.cur is not None:
+            self.pieces.append(self.cur)
+            self.cur = None
+
+
+class PreTokenizer:
+    # Single-pass replacement for the two-pass `_split_whitespaces_or_nonwhitespaces`.
+    # Pieces are kept as (start, end) offsets and strings are only materialised for
+    # the final output, so the cost stays linear in len(s) even for megabytes of
+    # whitespace or one unbroken word.
+    #
+    # pat_str must tile the input: whitespace is only matched by whitespace-only
+    # alternatives and every other character by some non-whitespace alternative,
+    # which holds for all the Llama-style patterns in this repo.
+
+    _run_pattern = re.compile(r"\S+")
+
+    def __init__(self, pat_str: str, strip_trailing_space: bool = False):
+        self.pat_str = pat_str
+        self.pattern = re.compile(pat_str)
+        self.strip_trailing_space = strip_trailing_space
+        # Pure-ASCII input skips the Unicode pattern when it is one we know the
+        # ASCII token grammar of
+        self.ascii_fast_path = pat_str in ASCII_PAT_STRS
+
+    def _run_splitter(self, s: str):
+        # isascii() is O(1) on CPython's compact strings
+        if self.ascii_fast_path and s.isascii():
+            return self._split_ascii_run
+        return self._split_run
+
+    def pieces(self, s: str, max_len: int) -> List[Piece]:
+        if not isinstance(max_len, int) or max_len <= 0:
+            raise ValueError("max_len must be a positive integer.")
+
+        pieces: List[Piece] = []
+        append = pieces.append
+        split_run = self._run_splitter(s)
+        last_end = 0
+        for run in self._run_pattern.finditer(s):
+            span = run.span()
+            start, end = span
+            # A whitespace gap becomes one marker; leading whitespace is dropped
+            if start > last_end and pieces:
+                append(SPACE)
+            last_end = end
+            if end - start <= max_len:
+                # Every match in the run merges into a single piece
+                append(span)
+            else:
+                # The run is only sliced to count its UTF-8 bytes when profiling is on
+                with profiler.stage("pre_tokenize.merge", text=s[start:end] if profiler.enabled else None):
+                    split_run(s, start, end, max_len, pieces)
+
+        if last_end < len(s) and pieces and not self.strip_trailing_space:
+            append(SPACE)
+        return pieces
+
+    def _split_run(self, s: str, start: int, end: int, max_len: int, pieces: List[Piece]) -> None:
+        # Replays both merge passes of the original algorithm over one
+        # whitespace-free run that is longer than max_len
+        merger = _PieceMerger(max_len, pieces)
+        push = merger.push
+        cur: Piece = None
+        cur_len = 0
+
+        for match in self.pattern.finditer(s, start, end):
+            match_start, match_end = match.span()
+            length = match_end - match_start
+            if length > max_len:
+                # Chunks bypass the pending token, as in the original first pass
+                for chunk_start in range(match_start, match_end, max_len):
+                    chunk_end = min(chunk_start + max_len, match_end)
+                    push([chunk_start, chunk_end], chunk_end - chunk_start)
+            elif cur is None:
+                cur = [match_start, match_end]
+                cur_len = length
+            elif cur_len + length > max_len:  # Do not consider space when merging
+                push(cur, cur_len)
+                cur = [match_start, match_end]
+                cur_len = length
+            else:
+                _extend(cur, [match_start, match_end])
+                cur_len += length
+
+        if cur is not None:
+            push(cur, cur_len)
+        merger.finish()
+
+    def _split_ascii_run(self, s: str, start: int, end: int, max_len: int, pieces: List[Piece]) -> None:
+        # _split_run for ASCII text: the matches tile the run, so offsets follow
+        # from the match lengths and findall() spares the match objects
+        merger = _PieceMerger(max_len, pieces)
+        push = merger.push
+        cur: Piece = None
+        cur_len = 0
+
+        match_end = start
+        for token in ASCII_TOKEN_PATTERN.findall(s, start, end):
+            length = len(token)
+            match_start = match_end
+            match_end += length
+            if length > max_len:
+                for chunk_start in range(match_start, match_end, max_len):
+                    chunk_end = min(chunk_start + max_len, match_end)
+                    push([chunk_start, chunk_end], chunk_end - chunk_start)
+            elif cur is None:
+                cur = [match_start, match_end]
+                cur_len = length
+            elif cur_len + length > max_len:
+                push(cur, cur_len)
+                cur = [match_start, match_end]
+                cur_len = length
+            else:
+                _extend(cur, [match_start, match_end])
+                cur_len += length
+
+        if cur is not None:
+            push(cur, cur_len)
+        merger.finish()
+
+    def spans(self, s: str, max_len: int, pos: int = 0, endpos: Optional[int] = None) -> TokenSpans:
+        # Same tokens as pieces()/split(), as offset arrays; space tokens carry
+        # the offsets of the whitespace run they replace. With pos/endpos, only
+        # the tokens of s lying in s[pos:endpos] are produced; both must be
+        # boundaries between whitespace and non-whitespace (or the ends of s).
+        if not isinstance(max_len, int) or max_len <= 0:
+            raise ValueError("max_len must be a positive integer.")
+        if endpos is None:
+            endpos = len(s)
+
+        starts, ends, kinds = array("I"), array("I"), array("B")
+        segments = {}
+        split_run = self._run_splitter(s)
+        # Whether any token precedes the current position, here or before pos
+        seen = pos > 0 and self._run_pattern.search(s, 0, pos) is not None
+        last_end = pos
+        for run in self._run_pattern.finditer(s, pos, endpos):
+            start, end = run.span()
+            if start > last_end and seen:
+                starts.append(last_end)
+                ends.append(start)
+                kinds.append(KIND_SPACE)
+            seen = True
+            last_end = end
+            if end - start <= max_len:
+                starts.append(start)
+                ends.append(end)
+                kinds.append(KIND_TEXT)
+                continue
+            pieces: List[Piece] = []
+            split_run(s, start, end, max_len, pieces)
+            for piece in pieces:
+                if len(piece) == 2:
+                    starts.append(piece[0])
+                    ends.append(piece[1])
+                    kinds.append(KIND_TEXT)
+                else:
+                    segments[len(kinds)] = tuple(piece)
+                    starts.append(min(piece[0::2]))
+                    ends.append(max(piece[1::2]))
+                    kinds.append(KIND_SPLIT)
+
+        if last_end < endpos and seen:
+            # Whitespace before more text is a gap; at the very end it is trailing
+            followed = endpos < len(s) and self._run_pattern.search(s, endpos) is not None
+            if followed or not self.strip_trailing_space:
+                starts.append(last_end)
+                ends.append(endpos)
+                kinds.append(KIND_SPACE)
+        return TokenSpans(s, starts, ends, kinds, segments)
+
+    def retokenize(self, spans: TokenSpans, offset: int, deleted: int, inserted: str, max_len: int) -> TokenSpans:
+        # Spans of the text after replacing spans.text[offset:offset + deleted]
+        # with inserted, equal to spans(new_text, max_len). spans must have been
+        # produced with the same max_len; it is updated in place and returned.
+        first, last, window, delta = self.edit_window(spans, offset, deleted, inserted, max_len)
+        return spans.splice(first, last, window, delta)
+
+    def edit_window(self, spans: TokenSpans, offset: int, deleted: int, inserted: str,
+                    max_len: int) -> Tuple[int, int, TokenSpans, int]:
+        # Re-tokenizes only the edited runs: the window is widened to the start
+        # of the whitespace gap before the edit and to the start of the run
+        # after the gap that follows it. Merges never cross a whitespace
+        # character the edit leaves alone, so tokens outside the window stay
+        # valid, shifted by the change in length. Returns the old token range
+        # [first, last), its replacement and that change in length.
+        s = spans.text
+        if offset < 0 or deleted < 0 or offset + deleted > len(s):
+            raise ValueError("Edit is out of range of the text.")
+        edit_end = offset + deleted
+        text = s[:offset] + inserted + s[edit_end:]
+        delta = len(inserted) - deleted
+
+        # Start of the gap before the run at the edit, or 0
+        pos = offset
+        while pos > 0 and not s[pos - 1].isspace():
+            pos -= 1
+        while pos > 0 and s[pos - 1].isspace():
+            pos -= 1
+        # Start of the run after the gap that follows the edit, or len(s)
+        endpos = edit_end
+        while endpos < len(s) and not s[endpos].isspace():
+            endpos += 1
+        while endpos < len(s) and s[endpos].isspace():
+            endpos += 1
+
+        window = self.spans(text, max_len, pos, endpos + delta)
+        # Token starts are not sorted within a run, but runs are, so "start < pos"
+        # is monotone over the tokens and bisection finds the cut points
+        first = bisect_left(spans.starts, pos)
+        last = bisect_left(spans.starts, endpos, first)
+        return first, last, window, delta
+
+    def split(self, s: str, max_len: int) -> List[str]:
+        return [
+            SPACE_TOKEN if piece is SPACE
+            else s[piece[0]:piece[1]] if len(piece) == 2
+            else piece_text(s, piece)
+            for piece in self.pieces(s, max_len)
+        ]
@@ -0,0 +1,226 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+# Per-stage instrumentation of the tokenization pipeline. Off by default:
+# profiler.stage() then returns a shared no-op context manager, so an
+# instrumented call costs one method call and one attribute check. Enable it
+# with profiler.enable() or by setting ADVANCEDTOKENCRAFT_PROFILE=1 (and
+# ADVANCEDTOKENCRAFT_PROFILE_SAMPLE to a rate for cProfile sampling).
+#
+# Stage times are wall time and inclusive of nested stages. Statistics are
+# per process: work done in map_batch/imap_chunks workers is not included.
+
+PROMETHEUS_PREFIX = "advancedtokencraft"
+
+
+class StageStats:
+    __slots__ = ("calls", "seconds", "max_seconds", "bytes", "cache_hits", "cache_misses")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "mean_seconds": self.seconds / self.calls if self.calls else 0.0,
+            "max_seconds": self.max_seconds,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullStage":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "nbytes", "cache", "start", "hits", "misses", "sampled")
+
+    def __init__(self, profiler: "Profiler", name: str, nbytes: int, cache):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+        self.cache = cache
+        self.sampled = False
+
+    def __enter__(self) -> "_Stage":
+        self.sampled = self.profiler._enter()
+        if self.cache is not None:
+            self.hits = self.cache.hits
+            self.misses = self.cache.misses
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        elapsed = time.perf_counter() - self.start
+        hits = misses = 0
+        if self.cache is not None:
+            # Deltas of the cache's own counters, so lookups pay nothing extra.
+            # With several threads sharing a cache they include the others' lookups.
+            hits = self.cache.hits - self.hits
+            misses = self.cache.misses - self.misses
+        self.profiler._record(self.name, elapsed, self.nbytes, hits, misses, self.sampled)
+        return False
+
+
+class Profiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[str, int] = {}
+        self._local = threading.local()
+        self._cprofile: Optional[cProfile.Profile] = None
+        # cProfile runs for one sampled call at a time
+        self._sampling = threading.Lock()
+
+    def enable(self, sample_rate: float = 0.0) -> "Profiler":
+        # sample_rate: fraction of outermost stages run under cProfile
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}.")
+        self.sample_rate = sample_rate
+        if sample_rate and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+        self.enabled = True
+        return self
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages = {}
+            self._counters = {}
+            self.samples = 0
+            self._cprofile = cProfile.Profile() if self.sample_rate else None
+
+    def stage(self, name: str, text: Optional[str] = None, texts: Optional[Sequence[str]] = None,
+              nbytes: int = 0, cache=None):
+        # Context manager timing one stage. text or texts (counted as UTF-8
+        # bytes) or nbytes is the input it processes; cache is an LRUCache whose
+        # hits and misses during the stage are attributed to it.
+        if not self.enabled:
+            return _NULL_STAGE
+        if text is not None:
+            nbytes += _utf8_length(text)
+        if texts is not None:
+            nbytes += sum(map(_utf8_length, texts))
+        return _Stage(self, name, nbytes, cache)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + value
+
+    def _enter(self) -> bool:
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        local.depth = depth + 1
+        if depth or not self.sample_rate or random.random() >= self.sample_rate:
+            return False
+        if not self._sampling.acquire(blocking=False):
+            return False
+        self._cprofile.enable()
+        return True
+
+    def _record(self, name: str, elapsed: float, nbytes: int, hits: int, misses: int, sampled: bool) -> None:
+        if sampled:
+            self._cprofile.disable()
+            self._sampling.release()
+        self._local.depth -= 1
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.calls += 1
+            stats.seconds += elapsed
+            if elapsed > stats.max_seconds:
+                stats.max_seconds = elapsed
+            stats.bytes += nbytes
+            stats.cache_hits += hits
+            stats.cache_misses += misses
+            if sampled:
+                self.samples += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "stages": {name: stats.as_dict() for name, stats in sorted(self._stages.items())},
+                "counters": dict(sorted(self._counters.items())),
+                "samples": self.samples,
+            }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.stats(), indent=indent)
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        # Prometheus text exposition format, one labelled series per stage
+        stats = self.stats()
+        metrics = [
+            ("stage_calls_total", "calls", "Calls of each tokenization stage."),
+            ("stage_seconds_total", "seconds", "Wall time spent in each tokenization stage."),
+            ("stage_bytes_total", "bytes", "Input bytes processed by each tokenization stage."),
+            ("stage_cache_hits_total", "cache_hits", "Cache hits during each tokenization stage."),
+            ("stage_cache_misses_total", "cache_misses", "Cache misses during each tokenization stage."),
+        ]
+        lines = []
+        for metric, key, help_text in metrics:
+            lines.append(f"# HELP {prefix}_{metric} {help_text}")
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for name, stage in stats["stages"].items():
+                lines.append(f'{prefix}_{metric}{{stage="{_label(name)}"}} {stage[key]}')
+        lines.append(f"# HELP {prefix}_events_total Events counted by the tokenization pipeline.")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in stats["counters"].items():
+            lines.append(f'{prefix}_events_total{{name="{_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def profile_stats(self) -> pstats.Stats:
+        # Aggregated cProfile data of the sampled calls
+        if not self.samples:
+            raise ValueError("No calls were sampled; enable the profiler with a sample_rate above 0.")
+        return pstats.Stats(self._cprofile)
+
+    def dump_profile(self, path: str) -> None:
+        # pstats-compatible file, for python -m pstats, snakeviz and the like
+        self.profile_stats().dump_stats(path)
+
+
+def _utf8_length(text: str) -> int:
+    return len(text.encode("utf-8", errors="surrogatepass"))
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+profiler = Profiler()
+
+if os.environ.get("ADVANCEDTOKENCRAFT_PROFILE"):
+    profiler.enable(float(os.environ.get("ADVANCEDTOKENCRAFT_PROFILE_SAMPLE", "0")))
@@ -0,0 +1,25 @@
+from typing import Optional
+
+import numpy as np
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    # Unit-length rows; zero rows stay zero, as in sklearn's cosine_similarity
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return embeddings / norms
+
+
+def paired_cosine_similarity(left: np.ndarray, right: np.ndarray, chunk_size: Optional[int] = None) -> np.ndarray:
+    # Cosine similarity of left[i] with right[i] for the aligned prefix of both,
+    # i.e. the diagonal of the full similarity matrix without building it.
+    # With chunk_size, rows are normalised chunk by chunk to bound temporaries.
+    n = min(len(left), len(right))
+    if chunk_size is None:
+        chunk_size = max(n, 1)
+    out = np.empty(n, dtype=np.float32)
+    for start in range(0, n, chunk_size):
+        end = min(start + chunk_size, n)
+        out[start:end] = np.einsum('ij,ij->i', normalize_rows(left[start:end]), normalize_rows(right[start:end]))
+    return out
@@ -0,0 +1,95 @@
+import os
+import re
+from typing import AbstractSet, Dict, Iterator, List, Optional, Tuple
+
+# Marks a trie node where a special token ends
+_END = None
+
+
+class SpecialTokenScanner:
+    # Finds special tokens in text in a single left-to-right pass. Candidate
+    # positions are located at C speed, with str.find on the prefix every token
+    # shares (all of ours start with "<|") or else a character class of first
+    # characters, and a trie walk from each candidate picks the longest token
+    # starting there. The cost is O(len(text) + matches * longest token),
+    # independent of how many special tokens there are, where a regex
+    # alternation retries every token at each candidate.
+
+    def __init__(self, tokens: AbstractSet[str], disallowed: AbstractSet[str] = frozenset()):
+        # tokens: every token to find; those also in disallowed raise when found
+        tokens = frozenset(tokens) | frozenset(disallowed)
+        if "" in tokens:
+            raise ValueError("Special tokens must be non-empty strings.")
+        self.tokens = tokens
+        self.disallowed = frozenset(disallowed)
+        self._trie: Dict = {}
+        for token in tokens:
+            node = self._trie
+            for char in token:
+                node = node.setdefault(char, {})
+            node[_END] = token
+        self._prefix = os.path.commonprefix(list(tokens)) if tokens else ""
+        self._first_chars = re.compile("[" + "".join(re.escape(char) for char in sorted(self._trie)) + "]") if tokens else None
+        self._max_len = max(map(len, tokens), default=0)
+        # Delimited tokens ("<|...|>"): when every token ends at the first
+        # occurrence of the common suffix after the common prefix, the only
+        # token that can start at a candidate is the text up to that suffix,
+        # so one find and one set lookup replace the trie walk
+        suffix = os.path.commonprefix([token[::-1] for token in tokens])[::-1] if tokens else ""
+        self._suffix = suffix if suffix and all(
+            token.find(suffix, len(self._prefix)) == len(token) - len(suffix) for token in tokens
+        ) else ""
+
+    def _candidate(self, s: str, pos: int) -> int:
+        if self._prefix:
+            return s.find(self._prefix, pos)
+        match = self._first_chars.search(s, pos)
+        return match.start() if match else -1
+
+    def _match_at(self, s: str, start: int) -> Optional[str]:
+        # Longest token beginning at s[start]
+        if self._suffix:
+            end = s.find(self._suffix, start + len(self._prefix), start + self._max_len)
+            if end < 0:
+                return None
+            candidate = s[start:end + len(self._suffix)]
+            return candidate if candidate in self.tokens else None
+        node = self._trie
+        found = None
+        for i in range(start, len(s)):
+            node = node.get(s[i])
+            if node is None:
+                break
+            token = node.get(_END)
+            if token is not None:
+                found = token
+        return found
+
+    def finditer(self, s: str) -> Iterator[Tuple[int, str]]:
+        # (start, token) of each leftmost-longest, non-overlapping occurrence;
+        # raises ValueError at the first disallowed one
+        if not self.tokens:
+            return
+        pos = 0
+        while True:
+            start = self._candidate(s, pos)
+            if start < 0:
+                return
+            token = self._match_at(s, start)
+            if token is None:
+                pos = start + 1
+                continue
+            if token in self.disallowed:
+                raise ValueError(f"Encountered text corresponding to disallowed special token {token!r}.")
+            yield start, token
+            pos = start + len(token)
+
+    def split(self, s: str) -> List[Tuple[str, Optional[str]]]:
+        # [(ordinary text, special token that follows it or None), ...]
+        segments = []
+        pos = 0
+        for start, token in self.finditer(s):
+            segments.append((s[pos:start], token))
+            pos = start + len(token)
+        segments.append((s[pos:], None))
+        return segments
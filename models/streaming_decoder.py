@@ -0,0 +1,66 @@
+import codecs
+from typing import Callable, Iterable, Mapping, Sequence
+
+# Decoding generated ids one at a time. Calling decode on the growing prefix
+# costs O(n) per step; these keep the state needed to emit only the text each
+# new id completes, in O(1) amortised per id. For any id sequence, the
+# concatenated output of push()/push_many() followed by flush() equals
+# decode(ids) of the owning tokenizer.
+
+
+class StreamingDecoder:
+    # For byte-level BPE (models/custom_tokenizer.CustomTokenizer): ids map to
+    # bytes, and a UTF-8 character split across ids is held back until its last
+    # byte arrives instead of surfacing as replacement characters.
+
+    def __init__(self, decoder: Mapping[int, bytes], skip_ids: Iterable[int] = ()):
+        self.decoder = decoder
+        self.skip_ids = frozenset(skip_ids)
+        self._utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def push(self, token_id: int) -> str:
+        if token_id in self.skip_ids:
+            return ""
+        return self._utf8.decode(self.decoder[token_id])
+
+    def push_many(self, token_ids: Sequence[int]) -> str:
+        decoder = self.decoder
+        skip_ids = self.skip_ids
+        return self._utf8.decode(b"".join(decoder[token_id] for token_id in token_ids if token_id not in skip_ids))
+
+    def flush(self) -> str:
+        # End of stream: an unfinished character becomes a replacement character
+        return self._utf8.decode(b"", final=True)
+
+    def reset(self) -> None:
+        self._utf8.reset()
+
+    @property
+    def pending_bytes(self) -> bytes:
+        return self._utf8.getstate()[0]
+
+
+class TextStreamingDecoder:
+    # For tokenizers whose decode joins per-id texts with a separator
+    # (prototype_tokenization_model.HybridTokenizer)
+
+    def __init__(self, id_to_text: Callable[[int], str], separator: str = " "):
+        self.id_to_text = id_to_text
+        self.separator = separator
+        self._started = False
+
+    def push(self, token_id: int) -> str:
+        text = self.id_to_text(token_id)
+        if self._started:
+            return self.separator + text
+        self._started = True
+        return text
+
+    def push_many(self, token_ids: Sequence[int]) -> str:
+        return "".join(map(self.push, token_ids))
+
+    def flush(self) -> str:
+        return ""
+
+    def reset(self) -> None:
+        self._started = False
@@ -0,0 +1,117 @@
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Values of TokenSpans.kinds
+KIND_TEXT = 0
+KIND_SPACE = 1
+# A token made of several non-adjacent segments of the text (an over-long word
+# chunked while a shorter token was pending, see pre_tokenizer.Piece). Its
+# start/end are the hull of the segments; the segments themselves are kept in
+# TokenSpans.segments.
+KIND_SPLIT = 2
+
+SPACE_TOKEN = "<|space|>"
+
+
+class TokenSpans:
+    # Compact pre-tokenizer output: parallel arrays of start offset, end offset
+    # and kind into the original string, so no per-token string is created
+    # until one is asked for. A space token spans the whitespace run it stands
+    # for and materialises as SPACE_TOKEN.
+
+    __slots__ = ("text", "starts", "ends", "kinds", "segments")
+
+    def __init__(self, text: str, starts: array, ends: array, kinds: array,
+                 segments: Optional[Dict[int, Tuple[int, ...]]] = None):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.kinds = kinds
+        self.segments = {} if segments is None else segments
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def token(self, i: int) -> str:
+        kind = self.kinds[i]
+        if kind == KIND_TEXT:
+            return self.text[self.starts[i]:self.ends[i]]
+        if kind == KIND_SPACE:
+            return SPACE_TOKEN
+        segments = self.segments[i]
+        return "".join(self.text[segments[j]:segments[j + 1]] for j in range(0, len(segments), 2))
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(index, slice):
+            return [self.token(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self.token(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return map(self.token, range(len(self)))
+
+    def tolist(self) -> List[str]:
+        # Same result as PreTokenizer.split
+        return list(self)
+
+    def span(self, i: int) -> Tuple[int, int, int]:
+        return self.starts[i], self.ends[i], self.kinds[i]
+
+    def offset_mapping(self) -> List[Tuple[int, int]]:
+        # Hugging Face style (start, end) character offsets, one pair per token
+        return list(zip(self.starts, self.ends))
+
+    def as_numpy(self) -> Dict[str, np.ndarray]:
+        # Zero-copy uint32/uint8 views over the arrays; splice replaces the
+        # arrays, so the views stay valid but do not follow later edits
+        return {
+            "starts": np.frombuffer(self.starts, dtype=np.uint32),
+            "ends": np.frombuffer(self.ends, dtype=np.uint32),
+            "kinds": np.frombuffer(self.kinds, dtype=np.uint8),
+        }
+
+    def splice(self, first: int, last: int, window: "TokenSpans", delta: int) -> "TokenSpans":
+        # Replace tokens [first, last) with window, whose text is the edited
+        # text, and shift the later tokens by delta characters. Updates self
+        # with new arrays rather than resizing the old ones, which would fail
+        # while an as_numpy() view exports them; earlier views keep the old spans.
+        moved = first + len(window) - last
+        if self.segments or window.segments:
+            segments = {i: offsets for i, offsets in self.segments.items() if i < first}
+            segments.update((first + i, offsets) for i, offsets in window.segments.items())
+            segments.update((i + moved, tuple(offset + delta for offset in offsets))
+                            for i, offsets in self.segments.items() if i >= last)
+            self.segments = segments
+        tail = first + len(window)
+        self.starts = _spliced(self.starts, first, last, window.starts)
+        self.ends = _spliced(self.ends, first, last, window.ends)
+        self.kinds = _spliced(self.kinds, first, last, window.kinds)
+        _shift(self.starts, tail, delta)
+        _shift(self.ends, tail, delta)
+        self.text = window.text
+        return self
+
+    def __repr__(self) -> str:
+        return f"TokenSpans({len(self)} tokens over {len(self.text)} characters)"
+
+
+def _spliced(values: array, first: int, last: int, window: array) -> array:
+    spliced = values[:first]
+    spliced.extend(window)
+    spliced.extend(values[last:])
+    return spliced
+
+
+def _shift(offsets: array, start: int, delta: int) -> None:
+    if not delta or start >= len(offsets):
+        return
+    view = np.frombuffer(offsets, dtype=np.uint32)[start:]
+    # uint32 arithmetic wraps, so a negative delta is added as its complement
+    view += np.uint32(delta % (1 << 32))
+    # Release the buffer so that the array can be resized again
+    del view
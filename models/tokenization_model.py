@@ -1,13 +1,28 @@
-from transformers import GPT2Tokenizer, BertTokenizer, pipeline
-from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from .alignment import align_offsets, segment_pairs, select_segments
+from .batching import batch_encode, prepare_batch
+from .decode_selection import get_decode_selector
+from .lazy import is_loaded, lazy_component, lazy_components
+from .parallel import map_batch
+from .profiling import profiler
+from .similarity import paired_cosine_similarity
+
+# transformers and sentence_transformers are imported by the component loaders,
+# so importing this module stays cheap
+
 class CustomTokenizer:
-    def __init__(self, gpt2_model_name='gpt2', bert_model_name='bert-base-uncased', embedding_model_name='sentence-transformers/all-MiniLM-L6-v2'):
-        self.gpt2_tokenizer = GPT2Tokenizer.from_pretrained(gpt2_model_name)
-        self.bert_tokenizer = BertTokenizer.from_pretrained(bert_model_name)
-        self.embedding_model = SentenceTransformer(embedding_model_name)
-        self.coherence_model = pipeline('text-classification', model='distilbert-base-uncased-finetuned-sst-2-english')
+    def __init__(self, gpt2_model_name='gpt2', bert_model_name='bert-base-uncased', embedding_model_name='sentence-transformers/all-MiniLM-L6-v2', similarity_chunk_size=None, coherence_model_name='distilbert-base-uncased-finetuned-sst-2-english', decode_strategy='coverage'):
+        # Models are loaded on first use (see the lazy components below) or by warmup()
+        self.gpt2_model_name = gpt2_model_name
+        self.bert_model_name = bert_model_name
+        self.embedding_model_name = embedding_model_name
+        self.coherence_model_name = coherence_model_name
+        # Embed and compare overlapping spans this many at a time; None does it in one go
+        self.similarity_chunk_size = similarity_chunk_size
+        # How decode picks between the GPT-2 and BERT decodes: 'coverage' (no model
+        # calls), 'coherence' (sentiment classifier) or a DecodeSelector instance
+        self.decode_selector = get_decode_selector(decode_strategy)
 
         self.special_tokens = {
             'pad_token': '[PAD]',
@@ -16,26 +31,104 @@ class CustomTokenizer:
             'mask_token': '[MASK]'
         }
 
-        self.gpt2_tokenizer.add_special_tokens(self.special_tokens)
-        self.bert_tokenizer.add_special_tokens(self.special_tokens)
+    @lazy_component
+    def gpt2_tokenizer(self):
+        from transformers import GPT2TokenizerFast
+        tokenizer = GPT2TokenizerFast.from_pretrained(self.gpt2_model_name)
+        tokenizer.add_special_tokens(self.special_tokens)
+        return tokenizer
+
+    @lazy_component
+    def bert_tokenizer(self):
+        from transformers import BertTokenizerFast
+        tokenizer = BertTokenizerFast.from_pretrained(self.bert_model_name)
+        tokenizer.add_special_tokens(self.special_tokens)
+        return tokenizer
+
+    @lazy_component
+    def embedding_model(self):
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.embedding_model_name)
+
+    @lazy_component
+    def coherence_model(self):
+        from transformers import pipeline
+        return pipeline('text-classification', model=self.coherence_model_name)
+
+    def warmup(self, components=None):
+        # Load the given components (all of them by default) ahead of the first request
+        for name in components or lazy_components(type(self)):
+            getattr(self, name)
+        return self
+
+    def loaded_components(self):
+        return [name for name in lazy_components(type(self)) if is_loaded(self, name)]
+
+    def __getstate__(self):
+        # Locks cannot be pickled; a fresh one is created on demand after unpickling
+        state = self.__dict__.copy()
+        state.pop('_component_lock', None)
+        return state
 
     def tokenize(self, text):
-        gpt2_tokens = self.gpt2_tokenizer.tokenize(text)
-        bert_tokens = self.bert_tokenizer.tokenize(text)
-        return self._combine_tokens(gpt2_tokens, bert_tokens)
+        return self.tokenize_many([text])[0]
 
     def encode(self, text):
-        gpt2_encoded = self.gpt2_tokenizer.encode(text, add_special_tokens=True)
-        bert_encoded = self.bert_tokenizer.encode(text, add_special_tokens=True)
-        return self._combine_encoded(gpt2_encoded, bert_encoded)
+        return self.encode_many([text])[0]
 
     def decode(self, token_ids):
-        gpt2_decoded = self.gpt2_tokenizer.decode(token_ids, skip_special_tokens=True)
-        bert_decoded = self.bert_tokenizer.decode(token_ids, skip_special_tokens=True)
-        # Use a more sophisticated selection approach
-        gpt2_score = self._evaluate_text(gpt2_decoded)
-        bert_score = self._evaluate_text(bert_decoded)
-        return gpt2_decoded if gpt2_score > bert_score else bert_decoded
+        gpt2_decoded, bert_decoded = self._decode_candidates(token_ids)
+        return self.decode_selector.select(self, token_ids, gpt2_decoded, bert_decoded)
+
+    def _decode_candidates(self, token_ids):
+        with profiler.stage('model.backend.decode'):
+            gpt2_decoded = self.gpt2_tokenizer.decode(token_ids, skip_special_tokens=True)
+            bert_decoded = self.bert_tokenizer.decode(token_ids, skip_special_tokens=True)
+        return gpt2_decoded, bert_decoded
+
+    def tokenize_many(self, texts):
+        # tokenize() for every text, with one batched call per HF tokenizer and
+        # one embedding pass over the overlapping spans of all texts
+        texts = list(texts)
+        gpt2_batch, bert_batch, alignments = self._aligned_encodings(texts, add_special_tokens=False)
+        similarities = self._batched_similarities(
+            segment_pairs(segments, gpt2_encoding.tokens, bert_encoding.tokens)
+            for gpt2_encoding, bert_encoding, segments in zip(gpt2_batch, bert_batch, alignments))
+        return [self._combine_tokens(gpt2_encoding.tokens, bert_encoding.tokens, segments, similarity)
+                for gpt2_encoding, bert_encoding, segments, similarity in zip(gpt2_batch, bert_batch, alignments, similarities)]
+
+    def encode_many(self, texts):
+        # encode() for every text, batched like tokenize_many
+        texts = list(texts)
+        gpt2_batch, bert_batch, alignments = self._aligned_encodings(texts, add_special_tokens=True)
+        similarities = self._batched_similarities(
+            self._encoded_pairs(gpt2_encoding.ids, bert_encoding.ids, segments)
+            for gpt2_encoding, bert_encoding, segments in zip(gpt2_batch, bert_batch, alignments))
+        return [self._combine_encoded(gpt2_encoding.ids, bert_encoding.ids, segments, similarity)
+                for gpt2_encoding, bert_encoding, segments, similarity in zip(gpt2_batch, bert_batch, alignments, similarities)]
+
+    def _aligned_encodings(self, texts, add_special_tokens):
+        # Backend encodings of both tokenizers and their offset alignment per text
+        with profiler.stage('model.backend.gpt2', texts=texts):
+            gpt2_batch = batch_encode(self.gpt2_tokenizer, texts, add_special_tokens)
+        with profiler.stage('model.backend.bert'):
+            bert_batch = batch_encode(self.bert_tokenizer, texts, add_special_tokens)
+        alignments = [align_offsets(gpt2_encoding.offsets, bert_encoding.offsets)
+                      for gpt2_encoding, bert_encoding in zip(gpt2_batch, bert_batch)]
+        return gpt2_batch, bert_batch, alignments
+
+    def encode_batch(self, texts, num_workers=None):
+        return map_batch(self, 'encode', texts, num_workers)
+
+    def decode_batch(self, ids_list, num_workers=None):
+        # Candidates are decoded in parallel, then selected together so that the
+        # coherence strategy scores the whole batch in one pipeline call
+        candidates = map_batch(self, '_decode_candidates', ids_list, num_workers)
+        return self.decode_selector.select_batch(self, ids_list, candidates)
+
+    def prepare_batch(self, ids_list, max_length=None, padding='longest', truncation=False):
+        # Padded int32 input_ids, attention_mask and token_type_ids for a batch of encodings
+        return prepare_batch(ids_list, max_length, padding, truncation, pad_token_id=self.gpt2_tokenizer.pad_token_id, sep_token_id=self.gpt2_tokenizer.sep_token_id)
 
     def create_attention_mask(self, token_ids):
         return [1 if token != self.gpt2_tokenizer.pad_token_id else 0 for token in token_ids]
@@ -50,29 +143,67 @@ class CustomTokenizer:
                 current_type = 1 - current_type
         return token_type_ids
 
-    def _combine_tokens(self, gpt2_tokens, bert_tokens):
-        combined_tokens = []
-        gpt2_embeddings = self.embedding_model.encode(gpt2_tokens, convert_to_tensor=True)
-        bert_embeddings = self.embedding_model.encode(bert_tokens, convert_to_tensor=True)
-        similarities = np.dot(gpt2_embeddings, bert_embeddings.T) / (np.linalg.norm(gpt2_embeddings, axis=1)[:, None] * np.linalg.norm(bert_embeddings, axis=1))
-        for i, (gpt2_token, bert_token) in enumerate(zip(gpt2_tokens, bert_tokens)):
-            similarity = similarities[i, i]
-            combined_tokens.append(gpt2_token if similarity > 0.5 else bert_token)
-        return combined_tokens
-
-    def _combine_encoded(self, gpt2_encoded, bert_encoded):
-        combined_encoded = []
-        gpt2_decoded = [self.gpt2_tokenizer.decode([gpt2_id]) for gpt2_id in gpt2_encoded]
-        bert_decoded = [self.bert_tokenizer.decode([bert_id]) for bert_id in bert_encoded]
-        gpt2_embeddings = self.embedding_model.encode(gpt2_decoded, convert_to_tensor=True)
-        bert_embeddings = self.embedding_model.encode(bert_decoded, convert_to_tensor=True)
-        similarities = np.dot(gpt2_embeddings, bert_embeddings.T) / (np.linalg.norm(gpt2_embeddings, axis=1)[:, None] * np.linalg.norm(bert_embeddings, axis=1))
-        for i, (gpt2_id, bert_id) in enumerate(zip(gpt2_encoded, bert_encoded)):
-            similarity = similarities[i, i]
-            combined_encoded.append(gpt2_id if similarity > 0.5 else bert_id)
-        return combined_encoded
+    def _combine_tokens(self, gpt2_tokens, bert_tokens, segments, similarities=None):
+        # segments: align_offsets of both tokenizations. Every span the two
+        # tokenizers share is taken from GPT-2 if its tokens are similar to
+        # BERT's and from BERT otherwise.
+        if similarities is None:
+            similarities = self._aligned_similarities(*segment_pairs(segments, gpt2_tokens, bert_tokens))
+        return select_segments(segments, gpt2_tokens, bert_tokens, similarities)
+
+    def _combine_encoded(self, gpt2_encoded, bert_encoded, segments, similarities=None):
+        if similarities is None:
+            similarities = self._aligned_similarities(*self._encoded_pairs(gpt2_encoded, bert_encoded, segments))
+        return select_segments(segments, gpt2_encoded, bert_encoded, similarities)
+
+    def _encoded_pairs(self, gpt2_encoded, bert_encoded, segments):
+        # Texts of the shared spans, from the decoded text of every id
+        gpt2_texts = self._decode_each(self.gpt2_tokenizer, gpt2_encoded)
+        bert_texts = self._decode_each(self.bert_tokenizer, bert_encoded)
+        return segment_pairs(segments, gpt2_texts, bert_texts)
+
+    @staticmethod
+    def _decode_each(tokenizer, token_ids):
+        # Text of every id on its own, as tokenizer.decode([token_id]) gives
+        return tokenizer.batch_decode([[token_id] for token_id in token_ids])
+
+    def _batched_similarities(self, pairs):
+        # _aligned_similarities for several (gpt2_texts, bert_texts) pairs from a
+        # single call, split back per pair
+        gpt2_texts, bert_texts, bounds = [], [], [0]
+        for gpt2_side, bert_side in pairs:
+            aligned = min(len(gpt2_side), len(bert_side))
+            gpt2_texts.extend(gpt2_side[:aligned])
+            bert_texts.extend(bert_side[:aligned])
+            bounds.append(bounds[-1] + aligned)
+        similarities = self._aligned_similarities(gpt2_texts, bert_texts)
+        return [similarities[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    def _aligned_similarities(self, gpt2_texts, bert_texts):
+        # Only the diagonal of the similarity matrix is ever read, so compare the
+        # aligned pairs row by row with paired_cosine_similarity. In chunked mode
+        # embeddings are computed one chunk at a time, which bounds peak memory
+        # on very long inputs.
+        aligned = min(len(gpt2_texts), len(bert_texts))
+        chunk_size = self.similarity_chunk_size or max(aligned, 1)
+        similarities = np.empty(aligned, dtype=np.float32)
+        profiler.count('model.embedding.pairs', aligned)
+        for start in range(0, aligned, chunk_size):
+            end = min(start + chunk_size, aligned)
+            with profiler.stage('model.embedding'):
+                gpt2_embeddings = self.embedding_model.encode(gpt2_texts[start:end])
+                bert_embeddings = self.embedding_model.encode(bert_texts[start:end])
+            similarities[start:end] = paired_cosine_similarity(gpt2_embeddings, bert_embeddings)
+        return similarities
 
     def _evaluate_text(self, text):
         # Use a language model to score the coherence of the text
-        result = self.coherence_model(text)
+        with profiler.stage('model.coherence', text=text):
+            result = self.coherence_model(text)
         return result[0]['score']
+
+    def _evaluate_texts(self, texts, batch_size=32):
+        texts = list(texts)
+        with profiler.stage('model.coherence', texts=texts):
+            results = self.coherence_model(texts, batch_size=batch_size)
+        return [result['score'] for result in results]
@@ -0,0 +1,204 @@
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Generic, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Defaults: wait up to 5 ms for a batch of up to 32 requests, queue at most 1024
+MAX_BATCH_SIZE = 32
+MAX_WAIT = 0.005
+MAX_PENDING = 1024
+
+
+class MicroBatcher(Generic[T, R]):
+    # Collects requests made one at a time by concurrent callers and runs them
+    # through handler(items) -> results as one batch in an executor, resolving
+    # each caller's future with its own result.
+    #
+    # max_wait is the latency/throughput knob: a batch is dispatched once it
+    # holds max_batch_size items or max_wait seconds after its first item
+    # arrived. max_wait=0 only batches requests that are already queued.
+    # Backpressure: at most max_pending requests wait to be batched (submit()
+    # blocks beyond that, try_submit() raises asyncio.QueueFull), and at most
+    # max_concurrent_batches batches run at once.
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Sequence[R]],
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = MAX_WAIT,
+        max_pending: int = MAX_PENDING,
+        max_concurrent_batches: int = 1,
+        executor: Optional[Executor] = None,
+    ):
+        if max_batch_size <= 0 or max_pending <= 0 or max_concurrent_batches <= 0:
+            raise ValueError("max_batch_size, max_pending and max_concurrent_batches must be positive integers.")
+        if max_wait < 0:
+            raise ValueError("max_wait must be non-negative.")
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.max_concurrent_batches = max_concurrent_batches
+        # A thread by default: the HF tokenizers and the embedding forward pass
+        # release the GIL. A ProcessPoolExecutor needs a picklable handler.
+        self._own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_concurrent_batches, thread_name_prefix="tokenization-batch")
+        self.batches = 0
+        self.items = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._running: set = set()
+
+    @property
+    def started(self) -> bool:
+        return self._collector is not None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self) -> "MicroBatcher[T, R]":
+        if self._collector is None:
+            self._queue = asyncio.Queue(self.max_pending)
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+        return self
+
+    async def close(self) -> None:
+        # Finish everything already submitted, then stop
+        if self._collector is None:
+            return
+        await self._queue.join()
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        if self._running:
+            await asyncio.gather(*self._running)
+        self._collector = None
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self) -> "MicroBatcher[T, R]":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _check_started(self) -> None:
+        if self._collector is None:
+            raise RuntimeError("MicroBatcher is not running; use 'async with' or await start() first.")
+
+    async def submit(self, item: T) -> R:
+        self._check_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def try_submit(self, item: T) -> R:
+        # Like submit(), but fails fast with asyncio.QueueFull when max_pending
+        # requests are already waiting
+        self._check_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not queue.empty():
+                    batch.append(queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()
+            task = loop.create_task(self._dispatch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _dispatch(self, batch: List[Any]) -> None:
+        try:
+            # Callers that gave up while queued are dropped from the batch
+            live = [(item, future) for item, future in batch if not future.done()]
+            if live:
+                self.batches += 1
+                self.items += len(live)
+                try:
+                    results = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, self.handler, [item for item, _ in live])
+                    if len(results) != len(live):
+                        raise ValueError(f"Batch handler returned {len(results)} results for {len(live)} items.")
+                except Exception as error:
+                    for _, future in live:
+                        if not future.done():
+                            future.set_exception(error)
+                else:
+                    for (_, future), result in zip(live, results):
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            self._slots.release()
+            for _ in batch:
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "pending": self.pending,
+        }
+
+
+class TokenizationService:
+    # Asyncio front end for models/tokenization_model.CustomTokenizer: each
+    # encode()/tokenize() request joins a micro-batch that runs through the
+    # tokenizer's encode_many()/tokenize_many() in one call. An in-process
+    # client is just `await service.encode(text)` inside the service's loop.
+
+    def __init__(self, tokenizer, max_batch_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT,
+                 max_pending: int = MAX_PENDING, max_concurrent_batches: int = 1, executor: Optional[Executor] = None):
+        self.tokenizer = tokenizer
+        options = dict(max_batch_size=max_batch_size, max_wait=max_wait, max_pending=max_pending,
+                       max_concurrent_batches=max_concurrent_batches, executor=executor)
+        self.batchers: Dict[str, MicroBatcher] = {
+            "encode": MicroBatcher(tokenizer.encode_many, **options),
+            "tokenize": MicroBatcher(tokenizer.tokenize_many, **options),
+        }
+
+    async def start(self) -> "TokenizationService":
+        for batcher in self.batchers.values():
+            await batcher.start()
+        return self
+
+    async def close(self) -> None:
+        for batcher in self.batchers.values():
+            await batcher.close()
+
+    async def __aenter__(self) -> "TokenizationService":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def encode(self, text: str) -> List[int]:
+        return await self.batchers["encode"].submit(text)
+
+    async def tokenize(self, text: str) -> List[str]:
+        return await self.batchers["tokenize"].submit(text)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {name: batcher.stats() for name, batcher in self.batchers.items()}
@@ -0,0 +1,205 @@
+import heapq
+import os
+import struct
+import tempfile
+from collections import Counter, deque
+from operator import itemgetter
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .corpus_pipeline import CHUNK_BYTES, CHUNK_DOCUMENTS, DEFAULT_TEXT_FIELD, _read_chunks, detect_format, document_text
+from .parallel import imap_chunks
+from .vocab_file import write_vocab
+
+# Distinct tokens held in memory before the counts are spilled to a sorted run
+# on disk; at the end the runs are merged, so counts stay exact
+SPILL_ENTRIES = 1 << 20
+_RECORD = struct.Struct("<IQ")
+
+
+class ChunkCounter:
+    # Runs in the worker processes: counts the subwords of a chunk of raw input
+    # lines. Words are counted first and each distinct word is split once, so
+    # the tokenizer sees every word of the chunk a single time.
+
+    def __init__(self, tokenizer, text_format: str = "jsonl", text_field: str = DEFAULT_TEXT_FIELD):
+        if text_format not in ("jsonl", "text"):
+            raise ValueError(f"text_format must be 'jsonl' or 'text', got {text_format!r}.")
+        self.tokenizer = tokenizer
+        self.text_format = text_format
+        self.text_field = text_field
+
+    def count_chunk(self, lines: List[bytes]) -> Dict[str, int]:
+        words = Counter()
+        for line in lines:
+            text = document_text(line, self.text_format, self.text_field)
+            if text:
+                words.update(text.split())
+        counts: Dict[str, int] = {}
+        subwords = self.tokenizer.subwords
+        for word, count in words.items():
+            for subword in subwords(word):
+                counts[subword] = counts.get(subword, 0) + count
+        return counts
+
+
+class SpillingCounter:
+    # Token -> count accumulator with bounded memory. Once more than
+    # max_entries distinct tokens are held, they are written to a temporary
+    # file sorted by token and the in-memory table starts over; items() merges
+    # the runs back into one sorted stream with exact totals.
+
+    def __init__(self, max_entries: int = SPILL_ENTRIES, tmpdir: Optional[str] = None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be a positive integer.")
+        self.max_entries = max_entries
+        self.tmpdir = tmpdir
+        self.counts: Dict[str, int] = {}
+        self._runs: List[BinaryIO] = []
+
+    @property
+    def num_spills(self) -> int:
+        return len(self._runs)
+
+    def update(self, counts: Mapping[str, int]) -> None:
+        table = self.counts
+        for token, count in counts.items():
+            table[token] = table.get(token, 0) + count
+        if len(table) > self.max_entries:
+            self._spill()
+
+    def _spill(self) -> None:
+        run = tempfile.TemporaryFile(dir=self.tmpdir)
+        pack = _RECORD.pack
+        for token in sorted(self.counts):
+            data = token.encode("utf-8")
+            run.write(pack(len(data), self.counts[token]))
+            run.write(data)
+        run.flush()
+        self._runs.append(run)
+        self.counts = {}
+
+    @staticmethod
+    def _read_run(run: BinaryIO) -> Iterator[Tuple[str, int]]:
+        run.seek(0)
+        size = _RECORD.size
+        while True:
+            header = run.read(size)
+            if not header:
+                return
+            length, count = _RECORD.unpack(header)
+            yield run.read(length).decode("utf-8"), count
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        # (token, total count) in token order
+        memory = sorted(self.counts.items())
+        if not self._runs:
+            yield from memory
+            return
+        streams = [self._read_run(run) for run in self._runs] + [iter(memory)]
+        token, total = None, 0
+        for next_token, count in heapq.merge(*streams, key=itemgetter(0)):
+            if next_token != token:
+                if token is not None:
+                    yield token, total
+                token, total = next_token, 0
+            total += count
+        if token is not None:
+            yield token, total
+
+    def close(self) -> None:
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self.counts = {}
+
+    def __enter__(self) -> "SpillingCounter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def count_corpus(
+    tokenizer,
+    input_path: str,
+    *,
+    text_format: str = "auto",
+    text_field: str = DEFAULT_TEXT_FIELD,
+    num_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    chunk_documents: int = CHUNK_DOCUMENTS,
+    chunk_bytes: int = CHUNK_BYTES,
+    max_entries: int = SPILL_ENTRIES,
+    tmpdir: Optional[str] = None,
+) -> SpillingCounter:
+    # Subword frequencies of a JSONL or plain-text corpus, as split by
+    # tokenizer.subwords(word). The input is streamed and counted in worker
+    # processes; the caller closes the returned counter.
+    if text_format == "auto":
+        text_format = detect_format(input_path)
+    if chunk_documents <= 0 or chunk_bytes <= 0:
+        raise ValueError("chunk_documents and chunk_bytes must be positive integers.")
+    counter = SpillingCounter(max_entries, tmpdir)
+    chunks = _read_chunks(input_path, 0, chunk_documents, chunk_bytes, deque(maxlen=1))
+    for counts in imap_chunks(ChunkCounter(tokenizer, text_format, text_field), "count_chunk", chunks,
+                              num_workers, max_in_flight):
+        counter.update(counts)
+    return counter
+
+
+def top_k(counts: Iterable[Tuple[str, int]], k: int) -> List[Tuple[str, int]]:
+    # The k most frequent (token, count) pairs, most frequent first; equal
+    # counts keep their input order. A heap of k entries, so O(n log k).
+    return heapq.nlargest(k, counts, key=itemgetter(1))
+
+
+def assign_ids(reserved: Sequence[str], tokens: Iterable[str]) -> Dict[str, int]:
+    # Dense ids: reserved tokens first, then tokens in order, duplicates skipped
+    vocab: Dict[str, int] = {}
+    for token in reserved:
+        vocab.setdefault(token, len(vocab))
+    for token in tokens:
+        vocab.setdefault(token, len(vocab))
+    return vocab
+
+
+def select_vocab(counts: Iterable[Tuple[str, int]], target_size: int, reserved: Sequence[str] = ()) -> Dict[str, int]:
+    reserved_set = set(reserved)
+    if target_size < len(reserved_set):
+        raise ValueError(f"target_size {target_size} is smaller than the {len(reserved_set)} reserved tokens.")
+    candidates = ((token, count) for token, count in counts if token not in reserved_set)
+    return assign_ids(reserved, map(itemgetter(0), top_k(candidates, target_size - len(reserved_set))))
+
+
+def combine_vocabularies(vocabs: Sequence[Mapping[str, int]], target_size: int,
+                         reserved: Sequence[str] = ()) -> Dict[str, int]:
+    # Combine vocabularies without corpus frequencies. BPE and WordPiece
+    # vocabularies list frequent tokens first, so a token's id in the vocabulary
+    # ranking it highest stands in for its frequency. Equal ranks go to the
+    # earlier vocabulary, then the lower id, whatever order the mappings iterate
+    # in (a Rust backend's get_vocab() order changes between loads).
+    ranks: Dict[str, int] = {}
+    for vocab in vocabs:
+        for token, token_id in sorted(vocab.items(), key=itemgetter(1)):
+            rank = ranks.get(token)
+            if rank is None or token_id < rank:
+                ranks[token] = token_id
+    return select_vocab(((token, -rank) for token, rank in ranks.items()), target_size, reserved)
+
+
+def build_vocab(tokenizer, input_path: str, target_size: int, reserved: Sequence[str] = (), **kwargs) -> Dict[str, int]:
+    # The target_size most frequent subwords of the corpus with dense ids,
+    # reserved tokens first. kwargs are passed on to count_corpus.
+    with count_corpus(tokenizer, input_path, **kwargs) as counter:
+        return select_vocab(counter.items(), target_size, reserved)
+
+
+def build_vocab_file(tokenizer, input_path: str, output_path: str, target_size: int,
+                     reserved: Sequence[str] = (), **kwargs) -> Dict[str, int]:
+    # build_vocab, written in the binary format of models/vocab_file.py
+    vocab = build_vocab(tokenizer, input_path, target_size, reserved, **kwargs)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    write_vocab(output_path, vocab)
+    return vocab
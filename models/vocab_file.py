@@ -0,0 +1,216 @@
+import argparse
+import mmap
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Mapping as MappingType, Optional, Union
+
+# Binary vocabulary layout (little-endian):
+#   header   MAGIC, version, id_space, num_tokens, table_size
+#   offsets  (id_space + 1) x uint32, token i is blob[offsets[i]:offsets[i + 1]]
+#   table    table_size x uint32 open-addressing hash of crc32(token) -> id + 1
+#   blob     concatenated token bytes
+# Ids without a token have an empty span. The table size is a power of two at
+# least twice the number of tokens, so probes stay short.
+MAGIC = b"ATCV"
+VERSION = 1
+_HEADER = struct.Struct("<4sIIII")
+
+Token = Union[str, bytes]
+
+
+def _as_bytes(token: Token) -> Optional[bytes]:
+    if isinstance(token, bytes):
+        return token
+    if isinstance(token, str):
+        return token.encode("utf-8")
+    return None
+
+
+def _uint32_array(values) -> array:
+    arr = array("I", values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+def write_vocab(path: str, vocab: MappingType[Token, int]) -> None:
+    # Write a token -> id mapping in the binary format. Each id holds one token
+    # and each token one id; str and bytes tokens are compared as UTF-8 bytes.
+    tokens: Dict[int, bytes] = {}
+    seen = set()
+    for token, token_id in vocab.items():
+        token_bytes = _as_bytes(token)
+        if token_id in tokens:
+            raise ValueError(f"Duplicate token id {token_id}: {tokens[token_id]!r} and {token_bytes!r}.")
+        if token_bytes in seen:
+            raise ValueError(f"Duplicate token {token_bytes!r}.")
+        tokens[token_id] = token_bytes
+        seen.add(token_bytes)
+    id_space = max(tokens) + 1 if tokens else 0
+
+    offsets = [0] * (id_space + 1)
+    blob = bytearray()
+    for token_id in range(id_space):
+        blob += tokens.get(token_id, b"")
+        offsets[token_id + 1] = len(blob)
+
+    table_size = 1
+    while table_size < 2 * len(tokens):
+        table_size *= 2
+    mask = table_size - 1
+    table = [0] * table_size
+    for token_id in sorted(tokens):
+        token = tokens[token_id]
+        slot = zlib.crc32(token) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = token_id + 1
+
+    with open(path, "wb") as file:
+        file.write(_HEADER.pack(MAGIC, VERSION, id_space, len(tokens), table_size))
+        file.write(_uint32_array(offsets).tobytes())
+        file.write(_uint32_array(table).tobytes())
+        file.write(blob)
+
+
+def is_vocab_file(path: str) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+class MmapVocab(Mapping):
+    # Read-only bytes -> id mapping over a memory-mapped binary vocabulary.
+    # Opening it costs a header read, and every process mapping the same file
+    # shares one physical copy through the page cache. Lookups accept str
+    # (UTF-8 encoded) or bytes keys.
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, id_space, num_tokens, table_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an AdvancedTokenCraft vocabulary file.")
+        self.id_space = id_space
+        self.num_tokens = num_tokens
+        self._mask = table_size - 1
+
+        view = memoryview(self._mmap)
+        start = _HEADER.size
+        table_start = start + 4 * (id_space + 1)
+        blob_start = table_start + 4 * table_size
+        if sys.byteorder == "little":
+            self._offsets = view[start:table_start].cast("I")
+            self._table = view[table_start:blob_start].cast("I")
+        else:
+            self._offsets = _uint32_array(view[start:table_start])
+            self._table = _uint32_array(view[table_start:blob_start])
+        self._blob = view[blob_start:]
+        self.decoder = _IdToBytes(self)
+
+    def id_to_bytes(self, token_id: int) -> bytes:
+        offsets = self._offsets
+        return bytes(self._blob[offsets[token_id]:offsets[token_id + 1]])
+
+    def id_to_token(self, token_id: int) -> str:
+        return self.id_to_bytes(token_id).decode("utf-8", errors="replace")
+
+    def _lookup(self, token: bytes) -> int:
+        offsets, table, blob, mask = self._offsets, self._table, self._blob, self._mask
+        slot = zlib.crc32(token) & mask
+        while True:
+            entry = table[slot]
+            if not entry:
+                return -1
+            token_id = entry - 1
+            if blob[offsets[token_id]:offsets[token_id + 1]] == token:
+                return token_id
+            slot = (slot + 1) & mask
+
+    def __getitem__(self, token: Token) -> int:
+        token_bytes = _as_bytes(token)
+        token_id = self._lookup(token_bytes) if token_bytes is not None else -1
+        if token_id < 0:
+            raise KeyError(token)
+        return token_id
+
+    def __iter__(self) -> Iterator[bytes]:
+        offsets = self._offsets
+        for token_id in range(self.id_space):
+            if offsets[token_id] != offsets[token_id + 1]:
+                yield self.id_to_bytes(token_id)
+
+    def __len__(self) -> int:
+        return self.num_tokens
+
+    def __reduce__(self):
+        # Other processes re-open the file instead of receiving a pickled copy
+        return (MmapVocab, (self.path,))
+
+    def close(self) -> None:
+        # Release the views before the map, otherwise mmap refuses to close
+        self._offsets = self._table = self._blob = None
+        self._mmap.close()
+
+
+class _IdToBytes(Mapping):
+    # id -> token bytes view of an MmapVocab
+    def __init__(self, vocab: MmapVocab):
+        self._vocab = vocab
+
+    def __getitem__(self, token_id: int) -> bytes:
+        vocab = self._vocab
+        if not isinstance(token_id, int) or not 0 <= token_id < vocab.id_space:
+            raise KeyError(token_id)
+        token = vocab.id_to_bytes(token_id)
+        if not token:
+            raise KeyError(token_id)
+        return token
+
+    def __iter__(self) -> Iterator[int]:
+        offsets = self._vocab._offsets
+        return (i for i in range(self._vocab.id_space) if offsets[i] != offsets[i + 1])
+
+    def __len__(self) -> int:
+        return self._vocab.num_tokens
+
+
+def convert_gpt2_vocab(tokenizer, path: str) -> None:
+    # GPT-2 vocab entries are printable stand-ins for raw bytes; store the real
+    # bytes so the file doubles as a byte-level BPE rank table
+    byte_decoder = tokenizer.byte_decoder
+    write_vocab(path, {
+        bytes(byte_decoder[char] for char in token): token_id
+        for token, token_id in tokenizer.get_vocab().items()
+    })
+
+
+def convert_hf_vocab(tokenizer, path: str) -> None:
+    if hasattr(tokenizer, "byte_decoder"):
+        convert_gpt2_vocab(tokenizer, path)
+    else:
+        write_vocab(path, tokenizer.get_vocab())
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Convert a tokenizer vocabulary to the binary mmap format.")
+    parser.add_argument("source", choices=["gpt2", "bert", "hybrid"])
+    parser.add_argument("output")
+    parser.add_argument("--model-name", help="Hugging Face model name for gpt2/bert sources")
+    args = parser.parse_args(argv)
+
+    if args.source == "gpt2":
+        from transformers import GPT2Tokenizer
+        convert_hf_vocab(GPT2Tokenizer.from_pretrained(args.model_name or "gpt2"), args.output)
+    elif args.source == "bert":
+        from transformers import BertTokenizer
+        convert_hf_vocab(BertTokenizer.from_pretrained(args.model_name or "bert-base-uncased"), args.output)
+    else:
+        from prototype_tokenization_model import HybridTokenizer
+        write_vocab(args.output, HybridTokenizer().vocab)
+
+if __name__ == "__main__":
+    main()
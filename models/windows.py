@@ -0,0 +1,104 @@
+from typing import Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+class TokenWindow:
+    # One window of a DocumentWindows: ids, starts and ends are views into the
+    # document's buffers. prefix/suffix are the special token ids the window
+    # is framed with; input_ids() materialises the framed window.
+
+    __slots__ = ("text", "start", "end", "ids", "starts", "ends", "prefix", "suffix")
+
+    def __init__(self, text: str, start: int, end: int, ids: np.ndarray, starts: np.ndarray, ends: np.ndarray,
+                 prefix: Tuple[int, ...], suffix: Tuple[int, ...]):
+        self.text = text
+        # Token range [start, end) of the document
+        self.start = start
+        self.end = end
+        self.ids = ids
+        self.starts = starts
+        self.ends = ends
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def __len__(self) -> int:
+        # Tokens including the special ones
+        return len(self.prefix) + len(self.ids) + len(self.suffix)
+
+    @property
+    def char_start(self) -> int:
+        return int(self.starts.min()) if len(self.ids) else 0
+
+    @property
+    def char_end(self) -> int:
+        return int(self.ends.max()) if len(self.ids) else 0
+
+    @property
+    def window_text(self) -> str:
+        return self.text[self.char_start:self.char_end]
+
+    def input_ids(self) -> List[int]:
+        return [*self.prefix, *self.ids.tolist(), *self.suffix]
+
+    def offset_mapping(self) -> List[Tuple[int, int]]:
+        # Hugging Face style, one pair per input id; special tokens get (0, 0)
+        return ([(0, 0)] * len(self.prefix) + list(zip(self.starts.tolist(), self.ends.tolist()))
+                + [(0, 0)] * len(self.suffix))
+
+    def __repr__(self) -> str:
+        return f"TokenWindow(tokens {self.start}:{self.end}, chars {self.char_start}:{self.char_end})"
+
+
+class DocumentWindows:
+    # Overlapping windows over a document encoded once. Consecutive windows
+    # share stride tokens, as with Hugging Face's return_overflowing_tokens;
+    # every window holds at most window tokens, the special ones included.
+
+    __slots__ = ("text", "ids", "starts", "ends", "bounds", "prefix", "suffix")
+
+    def __init__(self, text: str, ids: np.ndarray, starts: np.ndarray, ends: np.ndarray, window: int, stride: int,
+                 prefix: Sequence[int] = (), suffix: Sequence[int] = ()):
+        self.prefix = tuple(prefix)
+        self.suffix = tuple(suffix)
+        content = window - len(self.prefix) - len(self.suffix)
+        if content <= 0:
+            raise ValueError(f"window of {window} tokens leaves no room next to {len(self.prefix) + len(self.suffix)} special tokens.")
+        if not 0 <= stride < content:
+            raise ValueError(f"stride must be in [0, {content}), got {stride}.")
+        self.text = text
+        self.ids = ids
+        self.starts = starts
+        self.ends = ends
+        step = content - stride
+        self.bounds: List[Tuple[int, int]] = []
+        start = 0
+        while True:
+            end = min(start + content, len(ids))
+            self.bounds.append((start, end))
+            if end == len(ids):
+                break
+            start += step
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def window(self, i: int) -> TokenWindow:
+        start, end = self.bounds[i]
+        return TokenWindow(self.text, start, end, self.ids[start:end], self.starts[start:end], self.ends[start:end],
+                           self.prefix, self.suffix)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[TokenWindow, List[TokenWindow]]:
+        if isinstance(index, slice):
+            return [self.window(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("window index out of range")
+        return self.window(index)
+
+    def __iter__(self) -> Iterator[TokenWindow]:
+        return map(self.window, range(len(self)))
+
+    def __repr__(self) -> str:
+        return f"DocumentWindows({len(self)} windows over {len(self.ids)} tokens)"
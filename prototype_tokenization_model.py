@@ -1,77 +1,195 @@
-from transformers import GPT2Tokenizer, BertTokenizer
+from transformers import GPT2TokenizerFast, BertTokenizerFast
+
+if __package__:
+    from .models.batching import batch_tokenize, prepare_batch
+    from .models.lru_cache import LRUCache
+    from .models.parallel import map_batch
+    from .models.profiling import profiler
+    from .models.streaming_decoder import TextStreamingDecoder
+    from .models.vocab_builder import combine_vocabularies
+    from .models.vocab_file import MmapVocab
+else:
+    # Imported from the repository root rather than as part of the package
+    from models.batching import batch_tokenize, prepare_batch
+    from models.lru_cache import LRUCache
+    from models.parallel import map_batch
+    from models.profiling import profiler
+    from models.streaming_decoder import TextStreamingDecoder
+    from models.vocab_builder import combine_vocabularies
+    from models.vocab_file import MmapVocab
+
+# Values of HybridTokenizer.id_owner
+NO_OWNER, GPT2_OWNER, BERT_OWNER = 0, 1, 2
 
 class HybridTokenizer:
-    def __init__(self, gpt2_model_name='gpt2', bert_model_name='bert-base-uncased'):
-        # Initialize GPT-2 and BERT tokenizers
-        self.gpt2_tokenizer = GPT2Tokenizer.from_pretrained(gpt2_model_name)
-        self.bert_tokenizer = BertTokenizer.from_pretrained(bert_model_name)
-
-        # Combine vocabularies and limit to 40,000 tokens
-        self.vocab = self.combine_vocabularies(self.gpt2_tokenizer.get_vocab(), self.bert_tokenizer.get_vocab(), 40000)
+    def __init__(self, gpt2_model_name='gpt2', bert_model_name='bert-base-uncased', cache_size=65536, vocab_file=None):
+        # Initialize GPT-2 and BERT tokenizers; the fast ones let batch_tokenize
+        # send every missing word through the Rust backend in one call
+        self.gpt2_tokenizer = GPT2TokenizerFast.from_pretrained(gpt2_model_name)
+        self.bert_tokenizer = BertTokenizerFast.from_pretrained(bert_model_name)
+
+        if vocab_file is not None:
+            # Prebuilt combined vocabulary (see models/vocab_file.py and
+            # models/vocab_builder.py), memory-mapped
+            self.vocab = MmapVocab(vocab_file)
+        else:
+            # Combine vocabularies and limit to 40,000 tokens
+            self.vocab = self.combine_vocabularies(self.gpt2_tokenizer.get_vocab(), self.bert_tokenizer.get_vocab(), 40000)
         self.vocab_size = len(self.vocab)
 
-        # Define special tokens from both GPT-2 and BERT
+        # Define special tokens from both GPT-2 and BERT, as ids of the combined vocabulary
         self.special_tokens = {
-            'cls_token': self.bert_tokenizer.cls_token_id,
-            'sep_token': self.bert_tokenizer.sep_token_id,
-            'pad_token': self.bert_tokenizer.pad_token_id,
-            'unk_token': self.bert_tokenizer.unk_token_id,
-            'mask_token': self.bert_tokenizer.mask_token_id,
-            'gpt2_cls_token': self.gpt2_tokenizer.cls_token_id,
-            'gpt2_sep_token': self.gpt2_tokenizer.sep_token_id,
-            'gpt2_pad_token': self.gpt2_tokenizer.pad_token_id,
-            'gpt2_unk_token': self.gpt2_tokenizer.unk_token_id,
-            'gpt2_mask_token': self.gpt2_tokenizer.mask_token_id
+            'cls_token': self._vocab_id(self.bert_tokenizer.cls_token),
+            'sep_token': self._vocab_id(self.bert_tokenizer.sep_token),
+            'pad_token': self._vocab_id(self.bert_tokenizer.pad_token),
+            'unk_token': self._vocab_id(self.bert_tokenizer.unk_token),
+            'mask_token': self._vocab_id(self.bert_tokenizer.mask_token),
+            'gpt2_cls_token': self._vocab_id(self.gpt2_tokenizer.cls_token),
+            'gpt2_sep_token': self._vocab_id(self.gpt2_tokenizer.sep_token),
+            'gpt2_pad_token': self._vocab_id(self.gpt2_tokenizer.pad_token),
+            'gpt2_unk_token': self._vocab_id(self.gpt2_tokenizer.unk_token),
+            'gpt2_mask_token': self._vocab_id(self.gpt2_tokenizer.mask_token)
         }
 
+        # Word -> (tokens produced by tokenize(), their ids); the choice only depends on the word
+        self.word_cache = LRUCache(cache_size)
+
+        self._build_decode_tables()
+
+    def _vocab_id(self, token):
+        return self.vocab.get(token) if token is not None else None
+
+    def _build_decode_tables(self):
+        # id -> decoded text and id -> owning tokenizer for the combined
+        # vocabulary, computed once so that decode is a table lookup. A token
+        # both tokenizers know is decoded by GPT-2, which took precedence in the
+        # original lookup.
+        gpt2_vocab = self.gpt2_tokenizer.get_vocab()
+        bert_vocab = self.bert_tokenizer.get_vocab()
+        owned = {GPT2_OWNER: ([], []), BERT_OWNER: ([], [])}
+        size = 0
+        for token, token_id in self.vocab.items():
+            if isinstance(token, bytes):
+                token = token.decode('utf-8')
+            size = max(size, token_id + 1)
+            if token in gpt2_vocab:
+                ids, backend_ids = owned[GPT2_OWNER]
+                backend_ids.append(gpt2_vocab[token])
+            elif token in bert_vocab:
+                ids, backend_ids = owned[BERT_OWNER]
+                backend_ids.append(bert_vocab[token])
+            else:
+                continue
+            ids.append(token_id)
+        self.id_to_text = [self.bert_tokenizer.unk_token] * size
+        self.id_owner = bytearray(size)
+        for tokenizer, owner in ((self.gpt2_tokenizer, GPT2_OWNER), (self.bert_tokenizer, BERT_OWNER)):
+            ids, backend_ids = owned[owner]
+            texts = tokenizer.batch_decode([[token_id] for token_id in backend_ids], skip_special_tokens=True)
+            for token_id, text in zip(ids, texts):
+                self.id_to_text[token_id] = text
+                self.id_owner[token_id] = owner
+
+    def reserved_tokens(self):
+        # Special tokens of both tokenizers; the combined vocabulary always keeps them
+        return list(dict.fromkeys(self.bert_tokenizer.all_special_tokens + self.gpt2_tokenizer.all_special_tokens))
+
     def combine_vocabularies(self, gpt2_vocab, bert_vocab, target_size):
-        # Combine vocabularies and limit to target size based on frequency
-        combined_vocab = {**gpt2_vocab, **bert_vocab}
-        if len(combined_vocab) > target_size:
-            # Sort tokens by frequency and select the top tokens
-            sorted_vocab = sorted(combined_vocab.items(), key=lambda item: item[1], reverse=True)
-            combined_vocab = dict(sorted_vocab[:target_size])
-        return combined_vocab
+        # Combine vocabularies and limit to target size, with dense ids so that no
+        # two tokens share one. Without corpus frequencies (see
+        # models/vocab_builder.py for building the vocabulary from a corpus),
+        # tokens ranked earliest by either tokenizer are kept.
+        return combine_vocabularies([gpt2_vocab, bert_vocab], target_size, self.reserved_tokens())
 
     def tokenize(self, text):
         # Tokenize using the combined vocabulary with subword tokenization
         tokens = []
-        for word in text.split():
-            gpt2_subwords = self.gpt2_tokenizer.tokenize(word)
-            bert_subwords = self.bert_tokenizer.tokenize(word)
-            subwords = gpt2_subwords if len(gpt2_subwords) > len(bert_subwords) else bert_subwords
-            for subword in subwords:
-                if subword in self.vocab:
-                    tokens.append(subword)
-                else:
-                    tokens.append(self.special_tokens['unk_token'])
+        for word_tokens, _ in self._word_entries(text.split()):
+            tokens.extend(word_tokens)
         return tokens
 
+    def _word_entries(self, words):
+        # (tokens, ids) for each word. Words missing from the cache are
+        # deduplicated and sent through each backend tokenizer in one batch.
+        cache = self.word_cache
+        entries = [cache.get(word) for word in words]
+        missing = list(dict.fromkeys(word for word, entry in zip(words, entries) if entry is None))
+        if missing:
+            computed = dict(zip(missing, self._tokenize_words(missing)))
+            for word, entry in computed.items():
+                cache.put(word, entry)
+            entries = [computed[word] if entry is None else entry for word, entry in zip(words, entries)]
+        return entries
+
+    def subwords(self, word):
+        # The subwords tokenize() uses for a word, before the vocabulary lookup
+        gpt2_subwords = self.gpt2_tokenizer.tokenize(word)
+        bert_subwords = self.bert_tokenizer.tokenize(word)
+        return gpt2_subwords if len(gpt2_subwords) > len(bert_subwords) else bert_subwords
+
+    def _tokenize_words(self, words):
+        vocab = self.vocab
+        unk_id = self.special_tokens['unk_token']
+        entries = []
+        with profiler.stage('hybrid.backend', texts=words):
+            gpt2_batch = batch_tokenize(self.gpt2_tokenizer, words)
+            bert_batch = batch_tokenize(self.bert_tokenizer, words)
+        for gpt2_subwords, bert_subwords in zip(gpt2_batch, bert_batch):
+            subwords = gpt2_subwords if len(gpt2_subwords) > len(bert_subwords) else bert_subwords
+            found = [vocab.get(subword) for subword in subwords]
+            tokens = tuple(unk_id if token_id is None else subword for subword, token_id in zip(subwords, found))
+            ids = tuple(unk_id if token_id is None else token_id for token_id in found)
+            entries.append((tokens, ids))
+        return entries
+
+    def cache_info(self):
+        return self.word_cache.info()
+
     def encode(self, text):
         # Encode text using the combined vocabulary
-        tokens = self.tokenize(text)
-        token_ids = [self.vocab.get(token, self.special_tokens['unk_token']) for token in tokens]
+        token_ids = []
+        with profiler.stage('hybrid.encode', text=text, cache=self.word_cache):
+            for _, word_ids in self._word_entries(text.split()):
+                token_ids.extend(word_ids)
         token_ids = self.add_special_tokens(token_ids)
         return token_ids
 
     def decode(self, token_ids):
-        # Decode tokens using the combined vocabulary
-        tokens = []
-        for token_id in token_ids:
-            if token_id in self.gpt2_tokenizer.get_vocab().values():
-                tokens.append(self.gpt2_tokenizer.decode([token_id], skip_special_tokens=True))
-            elif token_id in self.bert_tokenizer.get_vocab().values():
-                tokens.append(self.bert_tokenizer.decode([token_id], skip_special_tokens=True))
-            else:
-                tokens.append(self.special_tokens['unk_token'])
-        decoded_text = ' '.join(tokens)
-        return decoded_text
+        # Decode tokens using the precomputed id -> text table; ids owned by
+        # neither tokenizer decode to the unknown token
+        id_to_text = self.id_to_text
+        if token_ids and (min(token_ids) < 0 or max(token_ids) >= len(id_to_text)):
+            unk_text = self.bert_tokenizer.unk_token
+            return ' '.join([id_to_text[token_id] if 0 <= token_id < len(id_to_text) else unk_text for token_id in token_ids])
+        return ' '.join(map(id_to_text.__getitem__, token_ids))
+
+    def streaming_decoder(self):
+        # Incremental decode of generated ids: each push returns the text decode()
+        # would add for that id
+        id_to_text = self.id_to_text
+        unk_text = self.bert_tokenizer.unk_token
+        return TextStreamingDecoder(lambda token_id: id_to_text[token_id] if 0 <= token_id < len(id_to_text) else unk_text)
+
+    def token_owner(self, token_id):
+        # GPT2_OWNER, BERT_OWNER or NO_OWNER for the given id
+        return self.id_owner[token_id] if 0 <= token_id < len(self.id_owner) else NO_OWNER
+
+    def encode_batch(self, texts, num_workers=None):
+        # Encode many texts, sharded across worker processes for large batches
+        return map_batch(self, 'encode', texts, num_workers)
+
+    def decode_batch(self, ids_list, num_workers=None):
+        return map_batch(self, 'decode', ids_list, num_workers)
 
     def add_special_tokens(self, token_ids):
         # Add special tokens to the token list
         token_ids = [self.special_tokens['cls_token']] + token_ids + [self.special_tokens['sep_token']]
         return token_ids
 
+    def prepare_batch(self, ids_list, max_length=None, padding='longest', truncation=False):
+        # Padded int32 input_ids, attention_mask and token_type_ids for a batch of encodings
+        return prepare_batch(ids_list, max_length, padding, truncation, pad_token_id=self.special_tokens['pad_token'], sep_token_id=self.special_tokens['sep_token'])
+
     def create_attention_mask(self, tokens):
         # Create attention mask for the tokens
         attention_mask = [1 if token != self.special_tokens['pad_token'] else 0 for token in tokens]
@@ -0,0 +1,171 @@
+import random
+import tempfile
+import unittest
+import numpy as np
+from transformers import BertTokenizerFast, GPT2TokenizerFast
+from benchmarks.stubs import HashingEmbedder, write_stub_vocabularies
+from custom_tokenizer_prototype import CustomTokenizer as PrototypeTokenizer
+from models.embedding_service import EmbeddingService
+from models.alignment import align_offsets, is_shared, segment_pairs, select_segments
+from models.tokenization_model import CustomTokenizer
+from models.profiling import profiler
+
+TEXTS = ["Hello,  world! This is a test.", "the internationalization tokenizer", "héllo 你好 naïve café", "", "one more sentence here"]
+
+
+def random_offsets(rng, text_length):
+    # A tokenization of text_length characters with gaps and zero-width tokens
+    offsets, pos = [], 0
+    while pos < text_length:
+        if rng.random() < 0.1:
+            offsets.append((pos, pos))
+        length = rng.randint(1, 4)
+        if rng.random() < 0.8:
+            offsets.append((pos, min(pos + length, text_length)))
+        pos += length
+    return offsets
+
+
+class TestAlignOffsets(unittest.TestCase):
+
+    def test_segments(self):
+        # [CLS] hello , world ! [SEP] against Hello , Ġ Ġworld !
+        bert = [(0, 0), (0, 5), (5, 6), (8, 13), (13, 14), (0, 0)]
+        gpt2 = [(0, 5), (5, 6), (6, 7), (7, 13), (13, 14)]
+        self.assertEqual(align_offsets(gpt2, bert), [
+            (0, 0, 0, 1), (0, 1, 1, 2), (1, 2, 2, 3), (2, 3, 3, 3), (3, 4, 3, 4), (4, 5, 4, 5), (5, 5, 5, 6),
+        ])
+        # Different segmentations of one word join into one segment
+        self.assertEqual(align_offsets([(0, 3), (3, 8)], [(0, 5), (5, 6), (6, 8)]), [(0, 2, 0, 3)])
+        self.assertEqual(align_offsets([], [(0, 1)]), [(0, 0, 0, 1)])
+
+    def test_segments_partition_both_streams(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            left = random_offsets(rng, 40)
+            right = random_offsets(rng, 40)
+            segments = align_offsets(left, right)
+            with self.subTest(left=left, right=right):
+                self.assertEqual([index for segment in segments for index in range(segment[0], segment[1])], list(range(len(left))))
+                self.assertEqual([index for segment in segments for index in range(segment[2], segment[3])], list(range(len(right))))
+                for i, j in ((i, j) for i in range(len(left)) for j in range(len(right))):
+                    (left_start, left_end), (right_start, right_end) = left[i], right[j]
+                    if left_start < right_end and right_start < left_end:
+                        # Overlapping tokens always share a segment
+                        self.assertTrue(any(s[0] <= i < s[1] and s[2] <= j < s[3] for s in segments))
+
+    def test_pairs_and_selection(self):
+        segments = [(0, 0, 0, 1), (0, 2, 1, 2), (2, 3, 2, 2), (3, 4, 2, 4)]
+        left, right = ["a", "b", "c", "d"], ["[CLS]", "ab", "x", "y"]
+        self.assertEqual(segment_pairs(segments, left, right), (["ab", "d"], ["ab", "xy"]))
+        self.assertEqual([is_shared(segment) for segment in segments], [False, True, False, True])
+        self.assertEqual(select_segments(segments, left, right, [0.9, 0.1]), ["[CLS]", "a", "b", "c", "x", "y"])
+
+
+class TestTokenizationModelAlignment(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.vocabularies = write_stub_vocabularies(cls.tmpdir.name, TEXTS * 4, num_merges=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        self.tokenizer = CustomTokenizer(self.vocabularies["gpt2"], self.vocabularies["bert"])
+        self.tokenizer.embedding_model = HashingEmbedder()
+
+    def test_only_overlapping_spans_are_compared(self):
+        text = TEXTS[0]
+        gpt2 = self.tokenizer.gpt2_tokenizer.backend_tokenizer.encode(text, add_special_tokens=False)
+        bert = self.tokenizer.bert_tokenizer.backend_tokenizer.encode(text, add_special_tokens=False)
+        segments = align_offsets(gpt2.offsets, bert.offsets)
+        shared = [segment for segment in segments if is_shared(segment)]
+        was_enabled = profiler.enabled
+        profiler.reset()
+        profiler.enable()
+        try:
+            tokens = self.tokenizer.tokenize(text)
+            pairs = profiler.stats()["counters"]["model.embedding.pairs"]
+        finally:
+            if not was_enabled:
+                profiler.disable()
+            profiler.reset()
+        self.assertEqual(pairs, len(shared))
+        self.assertLessEqual(pairs, min(len(gpt2.tokens), len(bert.tokens)))
+        similarities = self.tokenizer._aligned_similarities(*segment_pairs(segments, gpt2.tokens, bert.tokens))
+        self.assertEqual(tokens, select_segments(segments, gpt2.tokens, bert.tokens, similarities))
+        # The stray space token only GPT-2 has is kept
+        self.assertIn("Ġ", tokens)
+
+    def test_encode_keeps_unshared_special_tokens(self):
+        bert_tokenizer = self.tokenizer.bert_tokenizer
+        ids = self.tokenizer.encode("Hello, world!")
+        self.assertEqual(ids[0], bert_tokenizer.cls_token_id)
+        self.assertEqual(ids[-1], bert_tokenizer.sep_token_id)
+        self.assertEqual(self.tokenizer.encode(""), [bert_tokenizer.cls_token_id, bert_tokenizer.sep_token_id])
+
+    def test_fast_tokenizers(self):
+        self.assertTrue(self.tokenizer.gpt2_tokenizer.is_fast)
+        self.assertTrue(self.tokenizer.bert_tokenizer.is_fast)
+
+
+class ConstantEmbeddingService(EmbeddingService):
+    # Every token embeds to the same vector, so every shared span is similar
+    def __init__(self):
+        super().__init__(model=None, tokenizer=None)
+
+    def _forward(self, tokens):
+        return np.ones((len(tokens), 3), dtype=np.float32)
+
+
+class TestPrototypeLayout(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.vocabularies = write_stub_vocabularies(cls.tmpdir.name, TEXTS * 4, num_merges=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def setUp(self):
+        # The prototype loads the hub models in __init__; build it around the stubs instead
+        tokenizer = PrototypeTokenizer.__new__(PrototypeTokenizer)
+        tokenizer.gpt2_tokenizer = GPT2TokenizerFast.from_pretrained(self.vocabularies["gpt2"])
+        tokenizer.bert_tokenizer = BertTokenizerFast.from_pretrained(self.vocabularies["bert"])
+        tokenizer.embedding_service = ConstantEmbeddingService()
+        tokenizer.special_tokens = {'pad_token': '[PAD]', 'cls_token': '[CLS]', 'sep_token': '[SEP]', 'mask_token': '[MASK]'}
+        tokenizer._add_special_tokens()
+        self.tokenizer = tokenizer
+
+    def test_encode_keeps_strict_pairs(self):
+        gpt2_tokenizer, bert_tokenizer = self.tokenizer.gpt2_tokenizer, self.tokenizer.bert_tokenizer
+        for text in TEXTS:
+            with self.subTest(text=text):
+                ids = self.tokenizer.encode(text)
+                self.assertEqual(len(ids) % 2, 0)
+                self.assertEqual(ids[1], bert_tokenizer.cls_token_id)
+                self.assertEqual(ids[-1], bert_tokenizer.sep_token_id)
+                gpt2_ids = [token for token in ids[::2] if token != gpt2_tokenizer.pad_token_id]
+                bert_ids = [token for token in ids[1::2] if token != bert_tokenizer.pad_token_id]
+                self.assertEqual(gpt2_ids, gpt2_tokenizer.encode(text, add_special_tokens=True))
+                self.assertEqual(bert_ids, bert_tokenizer.encode(text, add_special_tokens=True))
+                # Round trip: each half decodes with its own tokenizer
+                self.assertEqual(self.tokenizer.decode(ids), gpt2_tokenizer.decode(gpt2_ids) + bert_tokenizer.decode(bert_ids))
+                attention_mask = self.tokenizer.create_attention_mask(ids)
+                self.assertEqual(sum(attention_mask), len(gpt2_ids) + len(bert_ids))
+                self.assertEqual(len(self.tokenizer.create_token_type_ids(ids)), len(ids))
+
+    def test_tokenize_pairs_tokens(self):
+        tokens = self.tokenizer.tokenize("Hello,  world!")
+        self.assertEqual(len(tokens) % 2, 0)
+        self.assertEqual([token for token in tokens[::2] if token != "[PAD]"], self.tokenizer.gpt2_tokenizer.tokenize("Hello,  world!"))
+        self.assertEqual([token for token in tokens[1::2] if token != "[PAD]"], self.tokenizer.bert_tokenizer.tokenize("Hello,  world!"))
+
+
+if __name__ == '__main__':
+    unittest.main()
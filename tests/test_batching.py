@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from models.batching import prepare_batch
+
+SEP = 102
+
+
+def reference_token_type_ids(token_ids):
+    # Per-sequence loop used by create_token_type_ids
+    token_type_ids = []
+    current_type = 0
+    for token in token_ids:
+        token_type_ids.append(current_type)
+        if token == SEP:
+            current_type = 1 - current_type
+    return token_type_ids
+
+
+class TestPrepareBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.ids_list = [[101, 7, 8, SEP, 9, SEP], [101, 5, SEP], [4]]
+
+    def test_longest_padding(self):
+        batch = prepare_batch(self.ids_list, pad_token_id=0, sep_token_id=SEP)
+        for name in ("input_ids", "attention_mask", "token_type_ids"):
+            self.assertEqual(batch[name].dtype, np.int32)
+            self.assertEqual(batch[name].shape, (3, 6))
+            self.assertTrue(batch[name].flags['C_CONTIGUOUS'])
+        self.assertEqual(batch["input_ids"][1].tolist(), [101, 5, SEP, 0, 0, 0])
+        self.assertEqual(batch["attention_mask"].sum(axis=1).tolist(), [6, 3, 1])
+        for row, ids in zip(batch["token_type_ids"], self.ids_list):
+            self.assertEqual(row[:len(ids)].tolist(), reference_token_type_ids(ids))
+            self.assertFalse(row[len(ids):].any())
+
+    def test_max_length_padding_and_truncation(self):
+        batch = prepare_batch(self.ids_list, max_length=4, padding="max_length", truncation=True, pad_token_id=-1, sep_token_id=SEP)
+        self.assertEqual(batch["input_ids"].tolist(), [[101, 7, 8, SEP], [101, 5, SEP, -1], [4, -1, -1, -1]])
+        self.assertEqual(batch["attention_mask"].tolist(), [[1, 1, 1, 1], [1, 1, 1, 0], [1, 0, 0, 0]])
+
+        batch = prepare_batch(self.ids_list, max_length=8, padding="max_length")
+        self.assertEqual(batch["input_ids"].shape, (3, 8))
+        self.assertFalse(batch["token_type_ids"].any())
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            prepare_batch(self.ids_list, max_length=4, padding="max_length")
+        with self.assertRaises(ValueError):
+            prepare_batch(self.ids_list, padding="max_length")
+        with self.assertRaises(ValueError):
+            prepare_batch(self.ids_list, padding="do_not_pad")
+
+    def test_empty_batch(self):
+        batch = prepare_batch([])
+        self.assertEqual(batch["input_ids"].shape, (0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
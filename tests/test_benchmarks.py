@@ -0,0 +1,46 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from benchmarks import compare, tokenizer_suite
+
+
+class TestTokenizerSuite(unittest.TestCase):
+
+    def run_suite(self, *args):
+        with redirect_stdout(io.StringIO()) as stdout, redirect_stderr(io.StringIO()):
+            tokenizer_suite.main(['--docs', '8', '--repeat', '1', '--warmup', '2', '--vocab', 'stub', *args])
+        return json.loads(stdout.getvalue())
+
+    def test_offline_results(self):
+        report = self.run_suite('--targets', 'split', 'bpe', 'hybrid', '--corpora', 'cjk', 'long_words')
+        self.assertEqual(report['meta']['vocab'], 'stub')
+        self.assertEqual(len(report['results']), (len(tokenizer_suite.SPLIT_REVISIONS) + 3) * 2)
+        for name, result in report['results'].items():
+            with self.subTest(name=name):
+                self.assertEqual(result['documents'], 8)
+                self.assertGreater(result['tokens'], 0)
+                self.assertGreater(result['tokens_per_s'], 0)
+                self.assertLessEqual(result['latency_p50_us'], result['latency_p99_us'])
+                self.assertGreater(result['peak_rss_bytes'], 0)
+
+    def test_corpus_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'instruction.jsonl')
+            with open(path, 'w') as file:
+                for text in ['First document.', 'Second   one', '']:
+                    file.write(json.dumps({'synthesized text': text}) + '\n')
+            report = self.run_suite('--targets', 'split', '--corpora', 'code', '--corpus-file', path)
+        self.assertEqual(report['results']['split.custom_tokenizer/instruction']['documents'], 3)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'meta': {}, 'results': {'a/x': {'tokens_per_s': 100.0, 'latency_p99_us': 10.0}}}
+        current = {'meta': {}, 'results': {'a/x': {'tokens_per_s': 80.0, 'latency_p99_us': 10.5}}}
+        regressed = {(name, metric) for name, metric, *_, flag in compare.compare(baseline, current, 0.1) if flag}
+        self.assertEqual(regressed, {('a/x', 'tokens_per_s')})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import base64
+import os
+import random
+import tempfile
+import unittest
+from models.bpe import byte_pair_encode
+from models.custom_tokenizer import CustomTokenizer
+
+MERGES = [b"th", b"he", b"the", b"in", b"ng", b"ing", b"aa", b"aaa", b"is", b" t"]
+
+
+def write_vocab_file(path, merges=MERGES):
+    with open(path, "wb") as file:
+        tokens = [bytes([i]) for i in range(256)] + list(merges)
+        for rank, token in enumerate(tokens):
+            file.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+
+def reference_byte_pair_encode(piece, ranks):
+    # Repeatedly merge the lowest-ranked adjacent pair, leftmost first
+    parts = [piece[i:i + 1] for i in range(len(piece))]
+    while True:
+        best = None
+        for i in range(len(parts) - 1):
+            rank = ranks.get(parts[i] + parts[i + 1])
+            if rank is not None and (best is None or rank < best[0]):
+                best = (rank, i)
+        if best is None:
+            return [ranks[part] for part in parts]
+        i = best[1]
+        parts[i:i + 2] = [parts[i] + parts[i + 1]]
+
+
+class TestBytePairEncode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(self.vocab_file)
+        self.tokenizer = CustomTokenizer(self.vocab_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_merges_match_reference(self):
+        self.tokenizer._ensure_vocab()
+        ranks = self.tokenizer.mergeable_ranks
+        rng = random.Random(0)
+        for _ in range(2000):
+            piece = "".join(rng.choice("thengias é") for _ in range(rng.randint(1, 20))).encode("utf-8")
+            with self.subTest(piece=piece):
+                self.assertEqual(byte_pair_encode(piece, ranks), reference_byte_pair_encode(piece, ranks))
+
+    def test_lowest_rank_merges_first(self):
+        self.tokenizer._ensure_vocab()
+        ranks = self.tokenizer.mergeable_ranks
+        # "aa" outranks "aaa", so the pairs are merged before any triple forms
+        self.assertEqual(byte_pair_encode(b"aaaa", ranks), [ranks[b"aa"], ranks[b"aa"]])
+        self.assertEqual(byte_pair_encode(b"aaa", ranks), [ranks[b"aaa"]])
+
+    def test_encode_decode_roundtrip(self):
+        text = "the thing is   singing"
+        tokens = self.tokenizer.encode(text, bos=True, eos=True)
+        self.assertEqual(tokens[0], self.tokenizer.bos_id)
+        self.assertEqual(tokens[-1], self.tokenizer.eos_id)
+        self.assertIn(self.tokenizer.mergeable_ranks[b"the"], tokens)
+        self.assertEqual(tokens.count(self.tokenizer.space_id), 3)
+        self.assertEqual(self.tokenizer.decode(tokens[1:-1]), "the thing is singing")
+
+    def test_encode_cache(self):
+        first = self.tokenizer.encode("the thing the thing", bos=False, eos=False)
+        info = self.tokenizer.cache_info()
+        self.assertEqual((info.hits, info.misses), (2, 2))
+        self.assertEqual(self.tokenizer.encode("the thing the thing", bos=False, eos=False), first)
+        self.assertEqual(self.tokenizer.cache_info().hits, 6)
+
+        uncached = CustomTokenizer(self.vocab_file, cache_size=0)
+        self.assertEqual(uncached.encode("the thing the thing", bos=False, eos=False), first)
+        self.assertEqual(uncached.cache_info().currsize, 0)
+
+    def test_batch_matches_sequential(self):
+        rng = random.Random(7)
+        texts = ["".join(rng.choice("the thing is é") for _ in range(rng.randint(0, 40))) for _ in range(300)]
+        expected = [self.tokenizer.encode(text, bos=True, eos=False) for text in texts]
+        for num_workers in (1, 2):
+            with self.subTest(num_workers=num_workers):
+                encoded = self.tokenizer.encode_batch(texts, bos=True, eos=False, num_workers=num_workers)
+                self.assertEqual(encoded, expected)
+                self.assertEqual(
+                    self.tokenizer.decode_batch(encoded, num_workers=num_workers),
+                    [self.tokenizer.decode(ids) for ids in expected],
+                )
+
+    def test_special_tokens(self):
+        text = "hi<|eot_id|>there"
+        self.tokenizer._ensure_vocab()
+        eot_id = self.tokenizer.special_tokens["<|eot_id|>"]
+        self.assertEqual(len(self.tokenizer.special_tokens), CustomTokenizer.num_reserved_special_tokens)
+
+        plain = self.tokenizer.encode(text, bos=False, eos=False)
+        self.assertNotIn(eot_id, plain)
+        self.assertEqual(self.tokenizer.decode(plain), text)
+
+        allowed = self.tokenizer.encode(text, bos=False, eos=False, allowed_special={"<|eot_id|>"})
+        self.assertEqual(allowed.count(eot_id), 1)
+        self.assertEqual(allowed, self.tokenizer.encode(text, bos=False, eos=False, allowed_special="all"))
+
+        with self.assertRaises(ValueError):
+            self.tokenizer.encode(text, bos=False, eos=False, disallowed_special="all")
+        with self.assertRaises(ValueError):
+            self.tokenizer.encode(text, bos=False, eos=False, disallowed_special={"<|eot_id|>"})
+
+if __name__ == '__main__':
+    unittest.main()
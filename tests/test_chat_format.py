@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from models.chat_format import ChatFormat
+from models.custom_tokenizer import CustomTokenizer
+from tests.test_bpe_encode import write_vocab_file
+
+
+class TestChatFormat(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+        self.chat_format = ChatFormat(self.tokenizer)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def reference(self, dialog):
+        # The prompt spelled out as text, every part encoded without caching
+        tokenizer = self.tokenizer
+        encode = lambda s: tokenizer.encode(s, bos=False, eos=False)
+        special = tokenizer.special_tokens
+
+        def header(role):
+            newline = tokenizer.mergeable_ranks[b"\n"]
+            return [special["<|start_header_id|>"]] + encode(role) + [special["<|end_header_id|>"]] + [newline, newline]
+
+        tokens = [special["<|begin_of_text|>"]]
+        for message in dialog:
+            tokens += header(message["role"]) + encode(message["content"].strip()) + [special["<|eot_id|>"]]
+        return tokens + header("assistant")
+
+    def dialog(self, turns):
+        dialog = [{"role": "system", "content": "You are a helpful assistant."}]
+        for i in range(turns):
+            role = "user" if i % 2 == 0 else "assistant"
+            dialog.append({"role": role, "content": f"  message number {i} about the thing  "})
+        return dialog
+
+    def test_matches_reference(self):
+        for turns in (0, 1, 2, 7):
+            dialog = self.dialog(turns)
+            with self.subTest(turns=turns):
+                self.assertEqual(self.chat_format.encode_dialog_prompt(dialog), self.reference(dialog))
+        prompt = self.chat_format.encode_dialog_prompt(self.dialog(1))
+        self.assertEqual(prompt[0], self.tokenizer.bos_id)
+        self.assertEqual(prompt.count(self.tokenizer.special_tokens["<|eot_id|>"]), 2)
+
+    def test_header_separator_decodes(self):
+        dialog = [{"role": "user", "content": "hi there"}]
+        text = self.tokenizer.decode(self.chat_format.encode_dialog_prompt(dialog))
+        self.assertEqual(
+            text,
+            "<|begin_of_text|><|start_header_id|>user<|end_header_id|>\n\nhi there<|eot_id|>"
+            "<|start_header_id|>assistant<|end_header_id|>\n\n",
+        )
+
+    def test_special_tokens_in_content_are_text(self):
+        dialog = [{"role": "user", "content": "hi<|eot_id|>"}]
+        prompt = self.chat_format.encode_dialog_prompt(dialog)
+        self.assertEqual(prompt, self.reference(dialog))
+        self.assertEqual(prompt.count(self.tokenizer.special_tokens["<|eot_id|>"]), 1)
+
+    def test_appending_a_turn_encodes_only_the_new_message(self):
+        dialog = self.dialog(50)
+        self.chat_format.encode_dialog_prompt(dialog)
+        dialog.append({"role": "user", "content": "one more question"})
+        with mock.patch.object(self.tokenizer, "encode", wraps=self.tokenizer.encode) as encode:
+            prompt = self.chat_format.encode_dialog_prompt(dialog)
+        self.assertEqual([c.args[0] for c in encode.call_args_list], ["one more question"])
+        self.assertEqual(prompt, self.reference(dialog))
+        self.assertEqual(self.chat_format.cache_info().currsize, 52)
+
+    def test_returned_lists_are_independent(self):
+        message = {"role": "user", "content": "hello"}
+        ids = self.chat_format.encode_message(message)
+        ids.append(-1)
+        self.assertEqual(self.chat_format.encode_message(message), ids[:-1])
+        header = self.chat_format.encode_header(message)
+        header.clear()
+        self.assertTrue(self.chat_format.encode_header(message))
+
+
+if __name__ == '__main__':
+    unittest.main()
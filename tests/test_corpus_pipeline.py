@@ -0,0 +1,126 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from models.cli import main
+from models.corpus_pipeline import iter_documents, read_shard, tokenize_corpus
+from models.custom_tokenizer import CustomTokenizer
+from tests.test_bpe_encode import write_vocab_file
+
+
+class FailingTokenizer(CustomTokenizer):
+    # Simulates a crash part way through the corpus
+    def __init__(self, vocab_file, fail_after):
+        super().__init__(vocab_file)
+        self.remaining = fail_after
+
+    def encode(self, s, **kwargs):
+        self.remaining -= 1
+        if self.remaining < 0:
+            raise RuntimeError("interrupted")
+        return super().encode(s, **kwargs)
+
+
+class TestCorpusPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(self.vocab_file)
+        self.tokenizer = CustomTokenizer(self.vocab_file)
+        rng = random.Random(0)
+        words = ["the", "thing", "is", "aaa", "héllo", "世界", "x" * 25, "", "  "]
+        self.texts = [" ".join(rng.choice(words) for _ in range(rng.randint(0, 30))) for _ in range(300)]
+        self.jsonl = os.path.join(self.tmpdir.name, "corpus.jsonl")
+        with open(self.jsonl, "w") as file:
+            for i, text in enumerate(self.texts):
+                file.write(json.dumps({"id": i, "synthesized text": text}) + "\n")
+                if i % 50 == 0:
+                    file.write("\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def output_dir(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def expected(self, texts=None, **kwargs):
+        return [self.tokenizer.encode(text, bos=kwargs.get("bos", False), eos=kwargs.get("eos", False))
+                for text in (self.texts if texts is None else texts)]
+
+    def run_pipeline(self, out, tokenizer=None, **kwargs):
+        kwargs.setdefault("chunk_documents", 16)
+        kwargs.setdefault("shard_tokens", 500)
+        kwargs.setdefault("num_workers", 1)
+        kwargs.setdefault("report_interval", None)
+        return tokenize_corpus(tokenizer or self.tokenizer, self.jsonl, out, **kwargs)
+
+    def assertDocuments(self, out, expected):
+        self.assertEqual([document.tolist() for document in iter_documents(out)], expected)
+
+    def test_roundtrip_sharded(self):
+        out = self.output_dir("out")
+        summary = self.run_pipeline(out, bos=True, eos=True)
+        expected = self.expected(bos=True, eos=True)
+        self.assertDocuments(out, expected)
+        self.assertEqual(summary["documents"], len(self.texts))
+        self.assertEqual(summary["tokens"], sum(map(len, expected)))
+        self.assertEqual(summary["dtype"], "uint16")
+        self.assertGreater(summary["num_shards"], 2)
+        tokens, offsets = read_shard(out, 0)
+        self.assertEqual(len(tokens), offsets[-1])
+
+    def test_parallel_matches_sequential(self):
+        out = self.output_dir("parallel")
+        self.run_pipeline(out, num_workers=2, max_in_flight=3)
+        self.assertDocuments(out, self.expected())
+
+    def test_resume_after_interruption(self):
+        out = self.output_dir("resumed")
+        with self.assertRaises(RuntimeError):
+            self.run_pipeline(out, FailingTokenizer(self.vocab_file, 170), checkpoint_interval=2)
+        with open(os.path.join(out, "checkpoint.json")) as file:
+            checkpoint = json.load(file)
+        self.assertFalse(checkpoint["complete"])
+        self.assertGreater(checkpoint["documents"], 0)
+        self.assertLess(checkpoint["documents"], len(self.texts))
+
+        # A second interruption, then a clean finish
+        with self.assertRaises(RuntimeError):
+            self.run_pipeline(out, FailingTokenizer(self.vocab_file, 70), checkpoint_interval=3, resume=True)
+        summary = self.run_pipeline(out, resume=True)
+        self.assertEqual(summary["documents"], len(self.texts))
+        self.assertDocuments(out, self.expected())
+
+        # Resuming a finished run does nothing
+        self.assertEqual(self.run_pipeline(out, FailingTokenizer(self.vocab_file, 0), resume=True), summary)
+
+    def test_plain_text(self):
+        path = os.path.join(self.tmpdir.name, "corpus.txt")
+        texts = [text for text in self.texts if text]
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("\n".join(texts) + "\n")
+        out = self.output_dir("text")
+        tokenize_corpus(self.tokenizer, path, out, chunk_bytes=256, report_interval=None, num_workers=1)
+        self.assertDocuments(out, self.expected(texts))
+
+    def test_progress_report(self):
+        stream = io.StringIO()
+        self.run_pipeline(self.output_dir("progress"), report_interval=0, stream=stream)
+        self.assertIn("tokens/s", stream.getvalue())
+        self.assertIn("MB/s", stream.getvalue())
+
+    def test_cli(self):
+        out = self.output_dir("cli")
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            main(["tokenize", self.jsonl, out, "--vocab", self.vocab_file, "--workers", "1", "--eos", "--quiet"])
+        self.assertEqual(json.loads(stdout.getvalue())["documents"], len(self.texts))
+        self.assertDocuments(out, self.expected(eos=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from models.decode_selection import CoherenceSelector, CoverageSelector, DecodeSelector, coverage_score, get_decode_selector
+
+
+class StubTokenizer:
+    def __init__(self, size, unk_token):
+        self.size = size
+        self.unk_token = unk_token
+
+    def __len__(self):
+        return self.size
+
+
+class StubOwner:
+    # Stands in for tokenization_model.CustomTokenizer, which needs the HF models
+    def __init__(self):
+        self.gpt2_tokenizer = StubTokenizer(50, None)
+        self.bert_tokenizer = StubTokenizer(30, '[UNK]')
+        self.scored = []
+
+    def _evaluate_texts(self, texts, batch_size=32):
+        self.scored.append(list(texts))
+        return [len(text) for text in texts]
+
+
+class TestDecodeSelection(unittest.TestCase):
+
+    def test_coverage_prefers_side_that_knows_the_ids(self):
+        owner = StubOwner()
+        selector = CoverageSelector()
+        self.assertEqual(selector.select(owner, [1, 40, 45], 'gpt2 text', 'bert [UNK] [UNK]'), 'gpt2 text')
+        self.assertEqual(selector.select(owner, [1, 2], 'br�ken', 'fine'), 'fine')
+        self.assertEqual(selector.select(owner, [1, 2], 'same', 'same'), 'same')
+        self.assertEqual(coverage_score(owner.bert_tokenizer, [], ''), 1.0)
+
+    def test_coherence_scores_batch_in_one_call(self):
+        owner = StubOwner()
+        selector = CoherenceSelector()
+        selected = selector.select_batch(owner, [[1], [2], [3]], [('a', 'bb'), ('same', 'same'), ('ccc', 'c')])
+        self.assertEqual(selected, ['bb', 'same', 'ccc'])
+        self.assertEqual(owner.scored, [['a', 'bb', 'ccc', 'c']])
+
+    def test_strategy_lookup(self):
+        self.assertIsInstance(get_decode_selector('coverage'), CoverageSelector)
+        custom = CoherenceSelector(batch_size=4)
+        self.assertIs(get_decode_selector(custom), custom)
+        with self.assertRaises(ValueError):
+            get_decode_selector('sentiment')
+        with self.assertRaises(TypeError):
+            DecodeSelector()
+
+        class Incomplete(DecodeSelector):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from benchmarks.stubs import HashingEmbedder
+from models.embedding_service import EmbeddingService
+from models.tokenization_model import CustomTokenizer
+from models.similarity import paired_cosine_similarity
+
+
+class CountingEmbeddingService(EmbeddingService):
+    # Deterministic stand-in for the transformer forward pass
+    def __init__(self, **kwargs):
+        super().__init__(model=None, tokenizer=None, **kwargs)
+        self.embedded = []
+
+    def _forward(self, tokens):
+        self.forward_calls += 1
+        self.embedded.extend(tokens)
+        return np.array([[len(token), sum(map(ord, token)) % 7, 1.0] for token in tokens], dtype=np.float32)
+
+
+class TestEmbeddingService(unittest.TestCase):
+
+    def test_deduplicates_and_batches(self):
+        service = CountingEmbeddingService(batch_size=2)
+        embeddings = service.embed(["a", "bb", "a", "ccc", "bb"])
+        self.assertEqual(embeddings.shape, (5, 3))
+        np.testing.assert_array_equal(embeddings[0], embeddings[2])
+        self.assertEqual(service.embedded, ["a", "bb", "ccc"])
+        self.assertEqual(service.forward_calls, 2)
+
+        service.embed(["ccc", "a"])
+        self.assertEqual(service.forward_calls, 2)
+
+    def test_paired_cosine(self):
+        service = CountingEmbeddingService()
+        similarities = service.paired_cosine(["a", "abc"], ["a", "b"])
+        self.assertAlmostEqual(float(similarities[0]), 1.0, places=6)
+        self.assertLess(float(similarities[1]), 1.0)
+        self.assertEqual(service.forward_calls, 1)
+        with self.assertRaises(ValueError):
+            service.paired_cosine(["a"], [])
+
+    def test_chunked_diagonal_matches_full_matrix(self):
+        rng = np.random.default_rng(0)
+        left = rng.standard_normal((37, 8)).astype(np.float32)
+        right = rng.standard_normal((41, 8)).astype(np.float32)
+        left[3] = 0
+        with np.errstate(invalid='ignore'):
+            full = np.dot(left, right[:37].T) / (np.linalg.norm(left, axis=1)[:, None] * np.linalg.norm(right[:37], axis=1))
+        expected = np.nan_to_num(np.diagonal(full))
+        np.testing.assert_allclose(paired_cosine_similarity(left, right), expected, atol=1e-6)
+        np.testing.assert_allclose(paired_cosine_similarity(left, right, chunk_size=5), expected, atol=1e-6)
+
+    def test_model_similarities_use_the_diagonal_helper(self):
+        gpt2_texts = [f"Ġword{i}" for i in range(23)]
+        bert_texts = [f"word{i}" for i in range(20)] + ["x"]
+        embedder = HashingEmbedder(64)
+        expected = paired_cosine_similarity(embedder.encode(gpt2_texts[:21]), embedder.encode(bert_texts))
+        for chunk_size in (None, 4):
+            tokenizer = CustomTokenizer(similarity_chunk_size=chunk_size)
+            tokenizer.embedding_model = embedder
+            np.testing.assert_allclose(tokenizer._aligned_similarities(gpt2_texts, bert_texts), expected, atol=1e-6)
+
+    def test_save_and_load_float16(self):
+        service = CountingEmbeddingService(max_entries=2)
+        service.embed(["a", "bb", "ccc"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "embeddings.npy")
+            service.save(path)
+            self.assertEqual(np.load(path).dtype, np.float16)
+            restored = CountingEmbeddingService()
+            restored.load(path)
+        np.testing.assert_allclose(restored.embed(["bb", "ccc"]), service.embed(["bb", "ccc"]))
+        self.assertEqual(restored.forward_calls, 0)
+
+if __name__ == '__main__':
+    unittest.main()
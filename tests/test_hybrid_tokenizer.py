@@ -0,0 +1,128 @@
+import random
+import tempfile
+import unittest
+from unittest import mock
+from benchmarks.stubs import write_stub_vocabularies
+from models import parallel
+from prototype_tokenization_model import BERT_OWNER, GPT2_OWNER, NO_OWNER, HybridTokenizer
+
+WORDS = ["the", "thing", "Tokenizer", "héllo", "你好", "don't", "naïve", "WORLD!", "[CLS]", "x²", "unseenword"]
+TEXTS = ["the thing Tokenizer héllo 你好 don't naïve WORLD!"] * 4
+
+
+class TestHybridTokenizer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.vocabularies = write_stub_vocabularies(cls.tmpdir.name, TEXTS, num_merges=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def make_tokenizer(self, cache_size=65536):
+        return HybridTokenizer(self.vocabularies["gpt2"], self.vocabularies["bert"], cache_size=cache_size)
+
+    def reference_encode(self, tokenizer, text):
+        # One word at a time through both backends, no cache
+        unk_id = tokenizer.special_tokens['unk_token']
+        ids = [tokenizer.vocab.get(subword, unk_id) for word in text.split() for subword in tokenizer.subwords(word)]
+        return tokenizer.add_special_tokens(ids)
+
+    def test_matches_per_word_tokenization(self):
+        rng = random.Random(0)
+        for cache_size in (65536, 4, 0):
+            tokenizer = self.make_tokenizer(cache_size)
+            for _ in range(50):
+                text = "  ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 15)))
+                with self.subTest(cache_size=cache_size, text=text):
+                    self.assertEqual(tokenizer.encode(text), self.reference_encode(tokenizer, text))
+                    unk_id = tokenizer.special_tokens['unk_token']
+                    expected = [subword if subword in tokenizer.vocab else unk_id for word in text.split() for subword in tokenizer.subwords(word)]
+                    self.assertEqual(tokenizer.tokenize(text), expected)
+
+    def test_unique_words_are_split_once(self):
+        tokenizer = self.make_tokenizer()
+        with mock.patch.object(tokenizer, '_tokenize_words', wraps=tokenizer._tokenize_words) as tokenize_words:
+            tokenizer.encode("the thing the thing héllo the")
+            tokenizer.encode("the héllo 你好")
+        self.assertEqual([call.args[0] for call in tokenize_words.call_args_list], [["the", "thing", "héllo"], ["你好"]])
+        self.assertEqual(tokenizer.cache_info().currsize, 4)
+
+    def test_words_go_through_the_backend_batch(self):
+        tokenizer = self.make_tokenizer()
+        self.assertTrue(tokenizer.gpt2_tokenizer.is_fast)
+        self.assertTrue(tokenizer.bert_tokenizer.is_fast)
+        expected = self.make_tokenizer().encode("the thing héllo 你好")
+        # A per-word tokenize() call would mean the slow fallback was taken
+        with mock.patch.object(tokenizer.gpt2_tokenizer, 'tokenize', side_effect=AssertionError), \
+                mock.patch.object(tokenizer.bert_tokenizer, 'tokenize', side_effect=AssertionError):
+            self.assertEqual(tokenizer.encode("the thing héllo 你好"), expected)
+
+    def test_batches_fork_after_backend_use(self):
+        tokenizer = self.make_tokenizer()
+        rng = random.Random(1)
+        texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 8))) for _ in range(300)]
+        # The Rust backends have run (and may have started their thread pools) before the fork
+        expected = [tokenizer.encode(text) for text in texts]
+        try:
+            self.assertEqual(tokenizer.encode_batch(texts, num_workers=2), expected)
+            pool = parallel._pool
+            self.assertIsNotNone(pool)
+            # A second batch reuses the workers
+            self.assertEqual(tokenizer.decode_batch(expected, num_workers=2), [tokenizer.decode(ids) for ids in expected])
+            self.assertIs(parallel._pool, pool)
+        finally:
+            parallel.close_pool()
+        self.assertIsNone(parallel._pool)
+
+    def scan_decode(self, tokenizer, token_ids):
+        # The scan-based decode the tables replaced: look each id's token up in
+        # the backend vocabularies, GPT-2 first, and decode it there
+        gpt2_vocab = tokenizer.gpt2_tokenizer.get_vocab()
+        bert_vocab = tokenizer.bert_tokenizer.get_vocab()
+        texts = []
+        for token_id in token_ids:
+            token = next((token for token, vocab_id in tokenizer.vocab.items() if vocab_id == token_id), None)
+            if token in gpt2_vocab:
+                texts.append(tokenizer.gpt2_tokenizer.decode([gpt2_vocab[token]], skip_special_tokens=True))
+            elif token in bert_vocab:
+                texts.append(tokenizer.bert_tokenizer.decode([bert_vocab[token]], skip_special_tokens=True))
+            else:
+                texts.append(tokenizer.bert_tokenizer.unk_token)
+        return ' '.join(texts)
+
+    def test_table_decode_matches_scan(self):
+        tokenizer = self.make_tokenizer()
+        all_ids = list(range(tokenizer.vocab_size))
+        self.assertEqual(tokenizer.decode(all_ids), self.scan_decode(tokenizer, all_ids))
+        ids = tokenizer.encode(TEXTS[0])
+        self.assertEqual(tokenizer.decode(ids), self.scan_decode(tokenizer, ids))
+        self.assertEqual(tokenizer.decode([]), '')
+
+    def test_gpt2_takes_precedence(self):
+        tokenizer = self.make_tokenizer()
+        gpt2_vocab = tokenizer.gpt2_tokenizer.get_vocab()
+        bert_vocab = tokenizer.bert_tokenizer.get_vocab()
+        # GPT-2 decodes the lone byte-level token to a replacement character, BERT to the letter
+        token_id = tokenizer.vocab['é']
+        self.assertIn('é', gpt2_vocab)
+        self.assertIn('é', bert_vocab)
+        self.assertEqual(tokenizer.token_owner(token_id), GPT2_OWNER)
+        self.assertEqual(tokenizer.decode([token_id]), tokenizer.gpt2_tokenizer.decode([gpt2_vocab['é']], skip_special_tokens=True))
+        self.assertNotEqual(tokenizer.decode([token_id]), 'é')
+        bert_only = next(token for token in tokenizer.vocab if token not in gpt2_vocab and token in bert_vocab)
+        self.assertEqual(tokenizer.token_owner(tokenizer.vocab[bert_only]), BERT_OWNER)
+
+    def test_out_of_range_ids(self):
+        tokenizer = self.make_tokenizer()
+        unk_text = tokenizer.bert_tokenizer.unk_token
+        the_id = tokenizer.vocab['the']
+        self.assertEqual(tokenizer.decode([-1, the_id, tokenizer.vocab_size, 10**9]), ' '.join([unk_text, 'the', unk_text, unk_text]))
+        for token_id in (-1, tokenizer.vocab_size, 10**9):
+            self.assertEqual(tokenizer.token_owner(token_id), NO_OWNER)
+
+
+if __name__ == '__main__':
+    unittest.main()
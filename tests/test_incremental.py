@@ -0,0 +1,117 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from models.custom_tokenizer import CustomTokenizer
+from models.custom_tokenizer_revision_v3 import CustomTokenizer as CustomTokenizerV3
+from models.incremental import IncrementalEncoding
+from models.pre_tokenizer import PreTokenizer
+from tests.test_bpe_encode import write_vocab_file
+from tests.test_pre_tokenizer import random_text
+
+
+def random_edit(rng, text):
+    offset = rng.randint(0, len(text))
+    deleted = rng.randint(0, min(len(text) - offset, 12))
+    return offset, deleted, random_text(rng, 8)
+
+
+def state(spans):
+    return spans.tolist(), spans.offset_mapping(), list(spans.kinds), spans.segments
+
+
+class TestIncrementalRetokenize(unittest.TestCase):
+
+    def test_edits_match_full_retokenization(self):
+        # Property: any sequence of edits leaves the spans equal to tokenizing
+        # the final text from scratch
+        rng = random.Random(2024)
+        for cls, strip in ((CustomTokenizer, False), (CustomTokenizerV3, True)):
+            pre_tokenizer = PreTokenizer(cls.pat_str, strip_trailing_space=strip)
+            for _ in range(1500):
+                max_len = rng.randint(1, 12)
+                spans = pre_tokenizer.spans(random_text(rng), max_len)
+                for _ in range(4):
+                    text = spans.text
+                    offset, deleted, inserted = random_edit(rng, text)
+                    pre_tokenizer.retokenize(spans, offset, deleted, inserted, max_len)
+                    expected = pre_tokenizer.spans(text[:offset] + inserted + text[offset + deleted:], max_len)
+                    with self.subTest(cls=cls.__module__, text=text, edit=(offset, deleted, inserted), max_len=max_len):
+                        self.assertEqual(state(spans), state(expected))
+
+    def test_gap_merging_edits(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        for text, edit in (("a b c", (2, 1, "")), ("foo bar", (3, 1, "")), ("ab  cd", (2, 2, "x")), ("  ab", (2, 2, " "))):
+            spans = pre_tokenizer.spans(text, 10)
+            pre_tokenizer.retokenize(spans, *edit, 10)
+            offset, deleted, inserted = edit
+            with self.subTest(text=text, edit=edit):
+                self.assertEqual(state(spans), state(pre_tokenizer.spans(text[:offset] + inserted + text[offset + deleted:], 10)))
+
+    def test_window_on_stable_boundaries(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        spans = pre_tokenizer.spans("one two three four", 10)
+        first, last, window, delta = pre_tokenizer.edit_window(spans, 5, 1, "W", 10)
+        # Only the gap before "two" and the run itself (plus its gap) are redone
+        self.assertEqual((first, last, delta), (1, 4, 0))
+        self.assertEqual(window.tolist(), ['<|space|>', 'tWo', '<|space|>'])
+
+    def test_edit_out_of_range(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        spans = pre_tokenizer.spans("text", 10)
+        for edit in ((-1, 0, "x"), (2, 3, ""), (5, 0, "x")):
+            with self.assertRaises(ValueError):
+                pre_tokenizer.retokenize(spans, *edit, 10)
+
+    def test_edit_after_numpy_views(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        spans = pre_tokenizer.spans("hello world", 10)
+        arrays = spans.as_numpy()
+        before = arrays['starts'].tolist()
+        pre_tokenizer.retokenize(spans, 0, 5, "abcdefghijklmnopqrstuvwxyz zz", 10)
+        self.assertEqual(state(spans), state(pre_tokenizer.spans(spans.text, 10)))
+        # The views still show the spans they were taken from
+        self.assertEqual(arrays['starts'].tolist(), before)
+        pre_tokenizer.retokenize(spans, 0, 1, "", 10)
+        self.assertEqual(state(spans), state(pre_tokenizer.spans(spans.text, 10)))
+
+    def test_large_document_edit_is_local(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        text = "the quick brown fox, " * 50_000
+        spans = pre_tokenizer.spans(text, 10)
+        start = time.perf_counter()
+        full = pre_tokenizer.spans(text, 10)
+        full_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(20):
+            pre_tokenizer.retokenize(spans, 500_000 + i, 1, "xy", 10)
+        self.assertLess((time.perf_counter() - start) / 20, full_time / 10)
+        self.assertEqual(state(spans), state(pre_tokenizer.spans(spans.text, 10)))
+
+
+class TestIncrementalEncoding(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_ids_match_full_encode(self):
+        rng = random.Random(7)
+        for _ in range(500):
+            max_len = rng.randint(1, 12)
+            document = IncrementalEncoding(self.tokenizer, random_text(rng), max_len)
+            for _ in range(4):
+                document.edit(*random_edit(rng, document.text))
+                with self.subTest(text=document.text, max_len=max_len):
+                    self.assertEqual(document.tolist(), self.tokenizer.encode(document.text, bos=False, eos=False, max_len=max_len))
+                    self.assertEqual(sum(document.counts), len(document.ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from models.lazy import is_loaded, lazy_component, lazy_components
+
+
+class Service:
+    def __init__(self):
+        self.calls = 0
+
+    @lazy_component
+    def model(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return object()
+
+    @lazy_component
+    def other(self):
+        return self.model
+
+
+class TestLazyComponent(unittest.TestCase):
+
+    def test_loads_once_across_threads(self):
+        service = Service()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(service.model)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(service.calls, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_loads_on_first_use_only(self):
+        service = Service()
+        self.assertFalse(is_loaded(service, 'model'))
+        self.assertIs(service.other, service.model)
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(lazy_components(Service), ['model', 'other'])
+
+    def test_tokenization_model_import_is_cheap(self):
+        code = (
+            "import sys\n"
+            "from models.tokenization_model import CustomTokenizer\n"
+            "CustomTokenizer()\n"
+            "assert 'transformers' not in sys.modules\n"
+            "assert 'sentence_transformers' not in sys.modules\n"
+        )
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=repo_root)
+
+if __name__ == '__main__':
+    unittest.main()
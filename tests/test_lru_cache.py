@@ -0,0 +1,37 @@
+import unittest
+from models.lru_cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put("a", (1,))
+        cache.put("b", (2,))
+        self.assertEqual(cache.get("a"), (1,))
+        cache.put("c", (3,))
+        self.assertNotIn("b", cache)
+        self.assertIn("a", cache)
+        self.assertEqual(cache.info(), (1, 0, 1, 2, 2))
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache(4)
+        self.assertIsNone(cache.get("x"))
+        cache.put("x", (7, 8))
+        cache.get("x")
+        cache.get("x")
+        info = cache.info()
+        self.assertEqual((info.hits, info.misses), (2, 1))
+
+    def test_zero_size_disables_cache(self):
+        cache = LRUCache(0)
+        cache.put("x", (1,))
+        self.assertIsNone(cache.get("x"))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            LRUCache(-1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+import unittest
+from models.pre_tokenizer import PreTokenizer
+from models.custom_tokenizer import CustomTokenizer
+from models.custom_tokenizer_revision_v3 import CustomTokenizer as CustomTokenizerV3
+
+
+def reference_split(pat_str, s, max_len, strip_trailing_space):
+    # The original two-pass implementation, kept as the oracle for the single-pass engine
+    tokens = []
+    current_token = ''
+    space_encountered = False
+    for match in re.finditer(pat_str, s):
+        token = match.group()
+        if token.isspace():
+            if not space_encountered:
+                if current_token:
+                    tokens.append(current_token)
+                    current_token = ''
+                tokens.append('<|space|>')
+            space_encountered = True
+        else:
+            space_encountered = False
+            if len(token) > max_len:
+                start = 0
+                while start < len(token):
+                    end = min(start + max_len, len(token))
+                    tokens.append(token[start:end])
+                    start = end
+            elif current_token:
+                if len(current_token) + len(token) > max_len:
+                    tokens.append(current_token)
+                    current_token = token
+                else:
+                    current_token += token
+            else:
+                current_token = token
+    if current_token:
+        tokens.append(current_token)
+
+    merged_tokens = []
+    current_token = ''
+    for token in tokens:
+        if token == '<|space|>':
+            if current_token:
+                merged_tokens.append(current_token)
+                current_token = ''
+            if not merged_tokens or merged_tokens[-1] != '<|space|>':
+                merged_tokens.append(token)
+        elif len(current_token) + len(token) > max_len:
+            if current_token:
+                merged_tokens.append(current_token)
+            current_token = token
+        else:
+            current_token += token
+    if current_token:
+        merged_tokens.append(current_token)
+    while merged_tokens and merged_tokens[0] == '<|space|>':
+        merged_tokens.pop(0)
+    if strip_trailing_space:
+        while merged_tokens and merged_tokens[-1] == '<|space|>':
+            merged_tokens.pop()
+    return merged_tokens
+
+
+ALPHABET = "ab Z9_'s\t\n.,!<|>こ你  -"
+
+
+def random_text(rng, max_size=60):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_size)))
+
+
+# The ASCII inputs of robustness_test.py
+ROBUSTNESS_CASES = [
+    "This is a test string.",
+    "Hello, world! This is a test.",
+    "Multiple     spaces.",
+    "Special characters: @#&*()!",
+    "Newline\ncharacters.",
+    "Tabs\tcharacters.",
+    "Mixed: spaces, tabs\t, and\nnewlines.",
+    "Edge case: !@#$%^&*()_+{}|:\"<>?",
+]
+ASCII_ALPHABET = "aZ9_'sStTrReEvVlLmMdD <|space|>.,!-\t\n\x1c\x1f\x00\x7f"
+
+
+def random_ascii_text(rng, max_size=60):
+    # Mostly characters the pattern treats specially, plus any ASCII character
+    return ''.join(
+        rng.choice(ASCII_ALPHABET) if rng.random() < 0.8 else chr(rng.randrange(128))
+        for _ in range(rng.randint(0, max_size))
+    )
+
+
+class TestPreTokenizer(unittest.TestCase):
+
+    def test_matches_two_pass_reference(self):
+        rng = random.Random(1234)
+        for cls, strip in ((CustomTokenizer, False), (CustomTokenizerV3, True)):
+            pre_tokenizer = PreTokenizer(cls.pat_str, strip_trailing_space=strip)
+            for _ in range(3000):
+                s = random_text(rng)
+                max_len = rng.randint(1, 12)
+                with self.subTest(cls=cls.__module__, s=s, max_len=max_len):
+                    self.assertEqual(pre_tokenizer.split(s, max_len), reference_split(cls.pat_str, s, max_len, strip))
+
+    def test_long_word_emitted_before_pending_token(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        s = "x:Averylongword!"
+        self.assertEqual(pre_tokenizer.split(s, 10), reference_split(CustomTokenizer.pat_str, s, 10, False))
+
+    def test_invalid_max_len(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        for max_len in (0, -1, 1.5, None):
+            with self.assertRaises(ValueError):
+                pre_tokenizer.split("text", max_len)
+
+    def test_adversarial_inputs_are_linear(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizerV3.pat_str, strip_trailing_space=True)
+        start = time.perf_counter()
+        self.assertEqual(pre_tokenizer.split(" " * 2_000_000, 10), [])
+        pieces = pre_tokenizer.split("a" * 1_000_000, 10)
+        self.assertEqual(len(pieces), 100_000)
+        self.assertLess(time.perf_counter() - start, 10.0)
+
+    def test_dataset_script_imports_from_models_directory(self):
+        # models/dataset_tokenizer_test.py is run as a plain script from models/
+        models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+        code = "import dataset_tokenizer_test as script\nassert script.CustomTokenizer()._split_whitespaces_or_nonwhitespaces('a  b', 10) == ['a', '<|space|>', 'b']\n"
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=models_dir)
+
+
+class TestAsciiFastPath(unittest.TestCase):
+
+    def pre_tokenizers(self):
+        for cls, strip in ((CustomTokenizer, False), (CustomTokenizerV3, True)):
+            fast = PreTokenizer(cls.pat_str, strip_trailing_space=strip)
+            general = PreTokenizer(cls.pat_str, strip_trailing_space=strip)
+            general.ascii_fast_path = False
+            self.assertTrue(fast.ascii_fast_path)
+            yield cls.pat_str, strip, fast, general
+
+    def assert_same(self, pat_str, strip, fast, general, s, max_len):
+        with self.subTest(s=s, max_len=max_len, strip=strip):
+            self.assertEqual(fast.pieces(s, max_len), general.pieces(s, max_len))
+            self.assertEqual(fast.split(s, max_len), reference_split(pat_str, s, max_len, strip))
+            fast_spans, general_spans = fast.spans(s, max_len), general.spans(s, max_len)
+            self.assertEqual(
+                (fast_spans.starts, fast_spans.ends, fast_spans.kinds, fast_spans.segments),
+                (general_spans.starts, general_spans.ends, general_spans.kinds, general_spans.segments),
+            )
+
+    def test_robustness_cases(self):
+        for pat_str, strip, fast, general in self.pre_tokenizers():
+            for s in ROBUSTNESS_CASES:
+                for max_len in (1, 2, 3, 5, 10, 100):
+                    self.assert_same(pat_str, strip, fast, general, s, max_len)
+
+    def test_fuzz(self):
+        rng = random.Random(2024)
+        for pat_str, strip, fast, general in self.pre_tokenizers():
+            for _ in range(3000):
+                self.assert_same(pat_str, strip, fast, general, random_ascii_text(rng), rng.randint(1, 12))
+            # Every ASCII character next to word characters, contractions and itself
+            for c in map(chr, range(128)):
+                s = f"ab{c}{c}'s{c}'LL{c}9_{c}"
+                self.assert_same(pat_str, strip, fast, general, s, rng.randint(1, 6))
+
+    def test_non_ascii_and_unknown_patterns_take_the_general_path(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        self.assertEqual(pre_tokenizer._run_splitter("plain ascii"), pre_tokenizer._split_ascii_run)
+        self.assertEqual(pre_tokenizer._run_splitter("こんにちは, world"), pre_tokenizer._split_run)
+        self.assertFalse(PreTokenizer(r"\w+|\s+|[^\w\s]+").ascii_fast_path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+from models.custom_tokenizer import CustomTokenizer
+from models.lru_cache import LRUCache
+from models.profiling import Profiler, profiler
+from tests.test_bpe_encode import write_vocab_file
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_disabled_records_nothing(self):
+        local = Profiler()
+        self.assertIs(local.stage("a"), local.stage("b", text="text"))
+        with local.stage("a"):
+            pass
+        local.count("events")
+        self.assertEqual(local.stats(), {"enabled": False, "stages": {}, "counters": {}, "samples": 0})
+
+    def test_stages_counters_and_cache_deltas(self):
+        local = Profiler().enable()
+        cache = LRUCache(4)
+        cache.put("x", 1)
+        for _ in range(3):
+            with local.stage("outer", text="héllo"):
+                with local.stage("inner", cache=cache):
+                    cache.get("x")
+                    cache.get("y")
+        local.count("events", 5)
+        stats = local.stats()
+        self.assertEqual(stats["stages"]["outer"]["calls"], 3)
+        self.assertEqual(stats["stages"]["outer"]["bytes"], 3 * len("héllo".encode("utf-8")))
+        self.assertEqual((stats["stages"]["inner"]["cache_hits"], stats["stages"]["inner"]["cache_misses"]), (3, 3))
+        self.assertGreaterEqual(stats["stages"]["outer"]["seconds"], stats["stages"]["inner"]["seconds"])
+        self.assertEqual(stats["counters"], {"events": 5})
+        self.assertEqual(json.loads(local.to_json()), stats)
+
+        text = local.to_prometheus()
+        self.assertIn("# TYPE advancedtokencraft_stage_seconds_total counter", text)
+        self.assertIn('advancedtokencraft_stage_calls_total{stage="inner"} 3', text)
+        self.assertIn('advancedtokencraft_events_total{name="events"} 5', text)
+        local.reset()
+        self.assertEqual(local.stats()["stages"], {})
+
+    def test_errors_are_still_recorded(self):
+        local = Profiler().enable()
+        with self.assertRaises(KeyError):
+            with local.stage("failing"):
+                raise KeyError("x")
+        self.assertEqual(local.stats()["stages"]["failing"]["calls"], 1)
+        with local.stage("after"):
+            pass
+        self.assertEqual(local._local.depth, 0)
+
+    def test_sampling_writes_pstats(self):
+        local = Profiler().enable(sample_rate=1.0)
+        for _ in range(2):
+            with local.stage("outer"):
+                with local.stage("inner"):
+                    sorted(range(1000), key=lambda i: -i)
+        self.assertEqual(local.samples, 2)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "encode.prof")
+            local.dump_profile(path)
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+        with self.assertRaises(ValueError):
+            Profiler().enable().profile_stats()
+        with self.assertRaises(ValueError):
+            Profiler().enable(sample_rate=2)
+
+
+class TestPipelineStages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+        self.was_enabled = profiler.enabled
+        profiler.reset()
+        profiler.enable()
+
+    def tearDown(self):
+        if not self.was_enabled:
+            profiler.disable()
+        profiler.reset()
+        self.tmpdir.cleanup()
+
+    def test_encode_stages(self):
+        text = "the internationalization of the thing"
+        self.tokenizer.encode(text, bos=True, eos=False)
+        self.tokenizer.encode(text, bos=True, eos=False)
+        stages = profiler.stats()["stages"]
+        self.assertEqual(stages["custom.encode"]["calls"], 2)
+        self.assertEqual(stages["custom.encode"]["bytes"], 2 * len(text))
+        self.assertEqual(stages["custom.pre_tokenize"]["calls"], 2)
+        # One over-long run per call goes through the merge loop
+        self.assertEqual(stages["pre_tokenize.merge"]["calls"], 2)
+        self.assertEqual(stages["pre_tokenize.merge"]["bytes"], 2 * len("internationalization"))
+        cache_info = self.tokenizer.cache_info()
+        self.assertEqual(stages["custom.bpe"]["cache_misses"], cache_info.misses)
+        self.assertEqual(stages["custom.bpe"]["cache_hits"], cache_info.hits)
+        self.assertGreater(cache_info.hits, cache_info.misses)
+
+    def test_merge_stage_counts_utf8_bytes(self):
+        run = "naïveté" * 3 + "你好"
+        self.tokenizer.encode("the " + run, bos=False, eos=False)
+        stages = profiler.stats()["stages"]
+        self.assertEqual(stages["pre_tokenize.merge"]["calls"], 1)
+        self.assertEqual(stages["pre_tokenize.merge"]["bytes"], len(run.encode("utf-8")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import random
+import re
+import tempfile
+import unittest
+from models.custom_tokenizer import CustomTokenizer
+from models.special_tokens import SpecialTokenScanner
+from tests.test_bpe_encode import write_vocab_file
+
+
+def reference_finditer(tokens, s):
+    # The regex alternation encode used before, longest token first
+    pattern = re.compile("|".join(re.escape(token) for token in sorted(tokens, key=len, reverse=True)))
+    return [(match.start(), match.group()) for match in pattern.finditer(s)]
+
+
+class TestSpecialTokenScanner(unittest.TestCase):
+
+    def check_against_reference(self, tokens, alphabet, seed):
+        scanner = SpecialTokenScanner(frozenset(tokens))
+        rng = random.Random(seed)
+        for _ in range(2000):
+            s = "".join(rng.choice(tokens) if rng.random() < 0.2 else rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            with self.subTest(s=s):
+                self.assertEqual(list(scanner.finditer(s)), reference_finditer(tokens, s))
+
+    def test_delimited_tokens(self):
+        tokens = ["<|eot_id|>", "<|space|>", "<|reserved_special_token_1|>", "<|reserved_special_token_10|>", "<||>"]
+        self.check_against_reference(tokens, ["<", "|", ">", "<|", "|>", "e", "o", "t", "_", " "], 0)
+
+    def test_arbitrary_tokens(self):
+        # Overlapping prefixes and no shared delimiters exercise the trie walk
+        tokens = ["ab", "abc", "abcd", "bc", "c", "[SEP]", "[S"]
+        scanner = SpecialTokenScanner(frozenset(tokens))
+        self.assertEqual(scanner._suffix, "")
+        self.check_against_reference(tokens, ["a", "b", "c", "d", "[", "S", "]", "x"], 1)
+
+    def test_disallowed_raises(self):
+        scanner = SpecialTokenScanner(frozenset({"<|eot_id|>"}), frozenset({"<|begin_of_text|>"}))
+        self.assertEqual(scanner.split("a<|eot_id|>b"), [("a", "<|eot_id|>"), ("b", None)])
+        with self.assertRaises(ValueError):
+            scanner.split("a<|eot_id|>b<|begin_of_text|>")
+
+    def test_empty(self):
+        scanner = SpecialTokenScanner(frozenset())
+        self.assertEqual(scanner.split("<|eot_id|>"), [("<|eot_id|>", None)])
+        with self.assertRaises(ValueError):
+            SpecialTokenScanner(frozenset({""}))
+
+
+class TestEncodeSpecialTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_scanner_cached_per_configuration(self):
+        text = "<|start_header_id|>user<|end_header_id|>hi<|eot_id|>"
+        ids = self.tokenizer.encode(text, bos=False, eos=False, allowed_special="all")
+        self.assertEqual(ids, self.tokenizer.encode(text, bos=False, eos=False, allowed_special="all"))
+        self.assertEqual(self.tokenizer.special_scanners.info().currsize, 1)
+        self.assertEqual(self.tokenizer.special_scanners.info().hits, 1)
+        self.assertEqual(ids.count(self.tokenizer.special_tokens["<|eot_id|>"]), 1)
+
+        self.tokenizer.encode(text, bos=False, eos=False, allowed_special={"<|eot_id|>"})
+        self.assertEqual(self.tokenizer.special_scanners.info().currsize, 2)
+        with self.assertRaises(ValueError):
+            self.tokenizer.encode(text, bos=False, eos=False, allowed_special={"<|eot_id|>"}, disallowed_special="all")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import random
+import tempfile
+import unittest
+from models.custom_tokenizer import CustomTokenizer
+from models.streaming_decoder import TextStreamingDecoder
+from tests.test_bpe_encode import write_vocab_file
+
+
+class TestStreamingDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def stream(self, decoder, ids):
+        return [decoder.push(token_id) for token_id in ids] + [decoder.flush()]
+
+    def test_split_characters_are_buffered(self):
+        text = "héllo 你好 こんにちは thing"
+        ids = self.tokenizer.encode(text, bos=True, eos=True)
+        chunks = self.stream(self.tokenizer.streaming_decoder(skip_special_tokens=True), ids)
+        self.assertEqual("".join(chunks), text)
+        self.assertFalse(any("�" in chunk for chunk in chunks))
+        # The three bytes of "你" arrive as three ids; only the last one emits it
+        decoder = self.tokenizer.streaming_decoder()
+        nihao = self.tokenizer.encode("你", bos=False, eos=False)
+        self.assertEqual([decoder.push(token_id) for token_id in nihao], ["", "", "你"])
+
+    def test_matches_decode(self):
+        rng = random.Random(3)
+        self.tokenizer._ensure_vocab()
+        vocab_ids = list(range(self.tokenizer.n_words))
+        for _ in range(500):
+            # Arbitrary ids, so invalid and truncated UTF-8 included
+            ids = [rng.choice(vocab_ids) for _ in range(rng.randint(0, 30))]
+            for skip in (False, True):
+                with self.subTest(ids=ids, skip=skip):
+                    decoder = self.tokenizer.streaming_decoder(skip_special_tokens=skip)
+                    self.assertEqual("".join(self.stream(decoder, ids)), self.tokenizer.decode(ids, skip_special_tokens=skip))
+                    decoder.reset()
+                    split = rng.randint(0, len(ids))
+                    streamed = decoder.push_many(ids[:split]) + decoder.push_many(ids[split:]) + decoder.flush()
+                    self.assertEqual(streamed, self.tokenizer.decode(ids, skip_special_tokens=skip))
+
+    def test_space_marker_and_special_tokens(self):
+        self.tokenizer._ensure_vocab()
+        ids = self.tokenizer.encode("the   thing<|eot_id|>", bos=True, eos=False, allowed_special={"<|eot_id|>"})
+        self.assertIn(self.tokenizer.space_id, ids)
+        self.assertEqual("".join(self.stream(self.tokenizer.streaming_decoder(), ids)), "<|begin_of_text|>the thing<|eot_id|>")
+        self.assertEqual("".join(self.stream(self.tokenizer.streaming_decoder(skip_special_tokens=True), ids)), "the thing")
+
+    def test_pending_bytes(self):
+        decoder = self.tokenizer.streaming_decoder()
+        first = self.tokenizer.encode("é", bos=False, eos=False)[0]
+        self.assertEqual(decoder.push(first), "")
+        self.assertEqual(decoder.pending_bytes, "é".encode("utf-8")[:1])
+        self.assertEqual(decoder.flush(), "�")
+
+    def test_text_streaming_decoder(self):
+        id_to_text = ["", "hello", "world", "!"]
+        decoder = TextStreamingDecoder(lambda token_id: id_to_text[token_id] if token_id < len(id_to_text) else "[UNK]")
+        ids = [0, 1, 2, 9, 3, 0]
+        self.assertEqual("".join(self.stream(decoder, ids)), " ".join(id_to_text[i] if i < 4 else "[UNK]" for i in ids))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import random
+import tracemalloc
+import unittest
+import numpy as np
+from models.custom_tokenizer import CustomTokenizer
+from models.custom_tokenizer_revision_v3 import CustomTokenizer as CustomTokenizerV3
+from models.pre_tokenizer import PreTokenizer
+from models.token_spans import KIND_SPACE, KIND_SPLIT, KIND_TEXT
+from tests.test_pre_tokenizer import random_text
+
+
+class TestTokenSpans(unittest.TestCase):
+
+    def test_matches_split(self):
+        rng = random.Random(99)
+        for cls, strip in ((CustomTokenizer, False), (CustomTokenizerV3, True)):
+            pre_tokenizer = PreTokenizer(cls.pat_str, strip_trailing_space=strip)
+            for _ in range(2000):
+                s = random_text(rng)
+                max_len = rng.randint(1, 12)
+                with self.subTest(cls=cls.__module__, s=s, max_len=max_len):
+                    spans = pre_tokenizer.spans(s, max_len)
+                    self.assertEqual(spans.tolist(), pre_tokenizer.split(s, max_len))
+                    for i, (start, end) in enumerate(spans.offset_mapping()):
+                        if spans.kinds[i] == KIND_SPACE:
+                            self.assertTrue(s[start:end].isspace())
+                        elif spans.kinds[i] == KIND_TEXT:
+                            self.assertEqual(s[start:end], spans[i])
+
+    def test_space_offsets(self):
+        spans = CustomTokenizer("unused").split_spans("Multiple     spaces.\n", 10)
+        self.assertEqual(spans.tolist(), ['Multiple', '<|space|>', 'spaces.', '<|space|>'])
+        self.assertEqual(spans.offset_mapping(), [(0, 8), (8, 13), (13, 20), (20, 21)])
+        self.assertEqual(list(spans.kinds), [KIND_TEXT, KIND_SPACE, KIND_TEXT, KIND_SPACE])
+        self.assertEqual(spans[-2], 'spaces.')
+        self.assertEqual(spans[1:3], ['<|space|>', 'spaces.'])
+
+    def test_split_token(self):
+        # The pending "x:" is emitted after the chunks of the long word, and the
+        # last chunk merges with it into one non-contiguous token
+        s = "x:Averylongword!"
+        spans = PreTokenizer(CustomTokenizer.pat_str).spans(s, 10)
+        self.assertEqual(spans.tolist(), PreTokenizer(CustomTokenizer.pat_str).split(s, 10))
+        self.assertIn(KIND_SPLIT, spans.kinds)
+        for i in range(len(spans)):
+            if spans.kinds[i] == KIND_SPLIT:
+                segments = spans.segments[i]
+                self.assertEqual(spans[i], ''.join(s[a:b] for a, b in zip(segments[::2], segments[1::2])))
+                self.assertEqual(spans.span(i), (min(segments[::2]), max(segments[1::2]), KIND_SPLIT))
+
+    def test_numpy_views(self):
+        spans = CustomTokenizerV3().split_spans("This is a test string.", 10)
+        arrays = spans.as_numpy()
+        self.assertEqual(arrays['starts'].dtype, np.uint32)
+        self.assertEqual(arrays['starts'].tolist(), list(spans.starts))
+        self.assertEqual(arrays['kinds'].tolist(), list(spans.kinds))
+
+    def test_fewer_allocations_than_split(self):
+        pre_tokenizer = PreTokenizer(CustomTokenizer.pat_str)
+        s = "word " * 200_000
+        tracemalloc.start()
+        split = pre_tokenizer.split(s, 10)
+        split_peak = tracemalloc.get_traced_memory()[1]
+        del split
+        tracemalloc.reset_peak()
+        spans = pre_tokenizer.spans(s, 10)
+        spans_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertEqual(len(spans), 400_000)
+        self.assertLess(spans_peak * 4, split_peak)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from benchmarks.stubs import HashingEmbedder, write_stub_vocabularies
+from models.tokenization_model import CustomTokenizer
+from models.tokenization_service import MicroBatcher, TokenizationService
+
+TEXTS = ["Hello, world! This is a test.", "the thing tokenizer", "héllo 你好 naïve café", "", "one more sentence here"]
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.calls += 1
+        return super().encode(texts, normalize_embeddings, **kwargs)
+
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_share_batches(self):
+        batches = []
+
+        def handler(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        async def main():
+            async with MicroBatcher(handler, max_batch_size=8, max_wait=0.05) as batcher:
+                results = await asyncio.gather(*(batcher.submit(i) for i in range(20)))
+                return results, batcher.stats()
+
+        results, stats = asyncio.run(main())
+        self.assertEqual(results, [i * 2 for i in range(20)])
+        self.assertEqual([len(batch) for batch in batches], [8, 8, 4])
+        self.assertEqual(stats["batches"], 3)
+        self.assertEqual(stats["items"], 20)
+
+    def test_max_wait_zero_dispatches_without_waiting(self):
+        async def main():
+            async with MicroBatcher(lambda items: items, max_batch_size=64, max_wait=0) as batcher:
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                await batcher.submit("a")
+                return loop.time() - start
+
+        self.assertLess(asyncio.run(main()), 0.5)
+
+    def test_errors_reach_every_caller_in_the_batch(self):
+        def handler(items):
+            raise KeyError("boom")
+
+        async def main():
+            async with MicroBatcher(handler, max_batch_size=4, max_wait=0.05) as batcher:
+                return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+        results = asyncio.run(main())
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(isinstance(result, KeyError) for result in results))
+
+        async def wrong_length():
+            async with MicroBatcher(lambda items: items[:-1], max_wait=0) as batcher:
+                await batcher.submit(1)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(wrong_length())
+
+    def test_backpressure(self):
+        release = threading.Event()
+
+        def handler(items):
+            release.wait(5)
+            return items
+
+        async def main():
+            async with MicroBatcher(handler, max_batch_size=1, max_wait=0, max_pending=2) as batcher:
+                first = asyncio.ensure_future(batcher.submit(0))
+                await asyncio.sleep(0.05)
+                # The first item is running and the next one waits for a batch
+                # slot; two more fill the queue
+                queued = [asyncio.ensure_future(batcher.submit(i)) for i in (1, 2, 3)]
+                await asyncio.sleep(0.05)
+                self.assertEqual(batcher.pending, 2)
+                with self.assertRaises(asyncio.QueueFull):
+                    await batcher.try_submit(4)
+                blocked = asyncio.ensure_future(batcher.submit(5))
+                await asyncio.sleep(0.05)
+                self.assertFalse(blocked.done())
+                release.set()
+                return await asyncio.gather(first, *queued, blocked)
+
+        self.assertEqual(asyncio.run(main()), [0, 1, 2, 3, 5])
+
+    def test_requires_start(self):
+        batcher = MicroBatcher(lambda items: items)
+        with self.assertRaises(RuntimeError):
+            asyncio.run(batcher.submit(1))
+        with self.assertRaises(ValueError):
+            MicroBatcher(lambda items: items, max_batch_size=0)
+
+
+class TestTokenizationService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.vocabularies = write_stub_vocabularies(cls.tmpdir.name, TEXTS * 4, num_merges=64)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def make_tokenizer(self):
+        tokenizer = CustomTokenizer(self.vocabularies["gpt2"], self.vocabularies["bert"])
+        tokenizer.embedding_model = CountingEmbedder()
+        return tokenizer
+
+    def test_batched_methods_match_single_calls(self):
+        tokenizer = self.make_tokenizer()
+        self.assertEqual(tokenizer.encode_many(TEXTS), [tokenizer.encode(text) for text in TEXTS])
+        self.assertEqual(tokenizer.tokenize_many(TEXTS), [tokenizer.tokenize(text) for text in TEXTS])
+        self.assertEqual(tokenizer.encode_many([]), [])
+
+    def test_in_process_client(self):
+        tokenizer = self.make_tokenizer()
+        expected_ids = [tokenizer.encode(text) for text in TEXTS]
+        expected_tokens = [tokenizer.tokenize(text) for text in TEXTS]
+        tokenizer.embedding_model.calls = 0
+
+        async def client():
+            async with TokenizationService(tokenizer, max_batch_size=16, max_wait=0.05) as service:
+                ids = await asyncio.gather(*(service.encode(text) for text in TEXTS * 3))
+                tokens = await asyncio.gather(*(service.tokenize(text) for text in TEXTS))
+                return ids, tokens, service.stats()
+
+        ids, tokens, stats = asyncio.run(client())
+        self.assertEqual(ids, expected_ids * 3)
+        self.assertEqual(tokens, expected_tokens)
+        self.assertEqual(stats["encode"]["batches"], 1)
+        self.assertEqual(stats["tokenize"]["batches"], 1)
+        # One embedding pass per side for each batch, instead of two per text
+        self.assertEqual(tokenizer.embedding_model.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from contextlib import redirect_stdout
+from benchmarks.stubs import write_stub_vocabularies
+from models.cli import main
+from models.vocab_builder import SpillingCounter, build_vocab, build_vocab_file, combine_vocabularies, select_vocab, top_k
+from models.vocab_file import MmapVocab
+from prototype_tokenization_model import HybridTokenizer
+
+WORDS = ["the", "thing", "tokenizer", "a", "vocabulary", "merge", "frequency", "héllo", "你好"]
+
+
+class CharTokenizer:
+    # Splits words into characters, so expected counts are easy to compute
+    def subwords(self, word):
+        return list(word)
+
+
+def write_corpus(path, rng, documents=300):
+    texts = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 12))) for _ in range(documents)]
+    with open(path, "w") as file:
+        for text in texts:
+            file.write(json.dumps({"synthesized text": text}) + "\n")
+    return texts
+
+
+class TestVocabBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.corpus = os.path.join(self.tmpdir.name, "corpus.jsonl")
+        self.texts = write_corpus(self.corpus, random.Random(0))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_spilling_counter_is_exact(self):
+        rng = random.Random(1)
+        expected = Counter()
+        with SpillingCounter(max_entries=8, tmpdir=self.tmpdir.name) as counter:
+            for _ in range(50):
+                counts = {rng.choice("abcdefghijklmnopqrstuvwxyz") * rng.randint(1, 3): rng.randint(1, 5) for _ in range(6)}
+                expected.update(counts)
+                counter.update(counts)
+            self.assertGreater(counter.num_spills, 0)
+            self.assertEqual(list(counter.items()), sorted(expected.items()))
+
+    def test_top_k_and_dense_ids(self):
+        counts = [("a", 3), ("b", 5), ("c", 3), ("d", 1), ("[CLS]", 9)]
+        self.assertEqual(top_k(counts, 3), [("[CLS]", 9), ("b", 5), ("a", 3)])
+        vocab = select_vocab(counts, 4, reserved=["[UNK]", "[CLS]"])
+        self.assertEqual(vocab, {"[UNK]": 0, "[CLS]": 1, "b": 2, "a": 3})
+        with self.assertRaises(ValueError):
+            select_vocab(counts, 1, reserved=["[UNK]", "[CLS]"])
+
+    def test_combined_ranks_ignore_mapping_order(self):
+        left = {"a": 0, "b": 1, "c": 2, "d": 3}
+        right = {"x": 0, "b": 0, "y": 1, "z": 2}
+        expected = {"[UNK]": 0, "a": 1, "b": 2, "x": 3, "y": 4}
+        self.assertEqual(combine_vocabularies([left, right], 5, ["[UNK]"]), expected)
+        shuffled = [dict(reversed(list(left.items()))), dict(reversed(list(right.items())))]
+        self.assertEqual(combine_vocabularies(shuffled, 5, ["[UNK]"]), expected)
+
+    def test_counts_match_in_process_count(self):
+        expected = Counter(char for text in self.texts for word in text.split() for char in word)
+        ranked = sorted(expected, key=lambda char: (-expected[char], char))
+        for num_workers in (1, 2):
+            with self.subTest(num_workers=num_workers):
+                vocab = build_vocab(CharTokenizer(), self.corpus, 10, ["<pad>"], num_workers=num_workers,
+                                    chunk_documents=16, max_entries=4, tmpdir=self.tmpdir.name)
+                self.assertEqual(list(vocab), ["<pad>"] + ranked[:9])
+                self.assertEqual(sorted(vocab.values()), list(range(10)))
+
+
+class TestHybridVocabulary(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.corpus = os.path.join(cls.tmpdir.name, "corpus.jsonl")
+        texts = write_corpus(cls.corpus, random.Random(2))
+        vocabularies = write_stub_vocabularies(cls.tmpdir.name, texts, num_merges=64)
+        cls.tokenizer = HybridTokenizer(vocabularies["gpt2"], vocabularies["bert"])
+        cls.vocabularies = vocabularies
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def test_combined_vocabulary_is_dense(self):
+        vocab = self.tokenizer.combine_vocabularies(
+            self.tokenizer.gpt2_tokenizer.get_vocab(), self.tokenizer.bert_tokenizer.get_vocab(), 100)
+        self.assertEqual(len(vocab), 100)
+        self.assertEqual(sorted(vocab.values()), list(range(100)))
+        for token in self.tokenizer.reserved_tokens():
+            self.assertIn(token, vocab)
+
+    def test_vocab_file_round_trip(self):
+        path = os.path.join(self.tmpdir.name, "hybrid.vocab")
+        vocab = build_vocab_file(self.tokenizer, self.corpus, path, 60, self.tokenizer.reserved_tokens(), num_workers=2)
+        self.assertEqual(sorted(vocab.values()), list(range(len(vocab))))
+        loaded = HybridTokenizer(self.vocabularies["gpt2"], self.vocabularies["bert"], vocab_file=path)
+        self.assertIsInstance(loaded.vocab, MmapVocab)
+        self.assertEqual(loaded.vocab_size, len(vocab))
+        self.assertEqual(loaded.special_tokens["cls_token"], vocab["[CLS]"])
+
+        text = "the thing tokenizer"
+        ids = loaded.encode(text)
+        self.assertEqual(ids[0], vocab["[CLS]"])
+        self.assertEqual(ids[-1], vocab["[SEP]"])
+        self.assertTrue(all(0 <= token_id < len(vocab) for token_id in ids))
+        self.assertEqual(loaded.decode(ids[1:-1]).replace(" ", ""), text.replace(" ", ""))
+
+    def build_vocab_args(self, output):
+        return ["build-vocab", self.corpus, output, "--size", "60", "--workers", "1",
+                "--gpt2-model", self.vocabularies["gpt2"], "--bert-model", self.vocabularies["bert"]]
+
+    def expected_vocab(self):
+        path = os.path.join(self.tmpdir.name, "expected.vocab")
+        return build_vocab_file(self.tokenizer, self.corpus, path, 60, self.tokenizer.reserved_tokens(), num_workers=1)
+
+    def assertVocabFile(self, path, expected):
+        loaded = MmapVocab(path)
+        self.assertEqual(len(loaded), len(expected))
+        self.assertEqual({token: loaded.get(token) for token in expected}, dict(expected))
+
+    def test_cli(self):
+        output = os.path.join(self.tmpdir.name, "cli.vocab")
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            main(self.build_vocab_args(output))
+        expected = self.expected_vocab()
+        self.assertEqual(json.loads(stdout.getvalue()), {"output": output, "vocab_size": len(expected)})
+        self.assertVocabFile(output, expected)
+
+    def test_cli_run_as_package(self):
+        # python -m <package> from the directory holding the repository, with
+        # neither the repository root nor models/ on sys.path
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = os.path.join(self.tmpdir.name, "package.vocab")
+        env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+        subprocess.run([sys.executable, "-m", os.path.basename(repo_root)] + self.build_vocab_args(output),
+                       check=True, cwd=os.path.dirname(repo_root), env=env, stdout=subprocess.DEVNULL)
+        self.assertVocabFile(output, self.expected_vocab())
+
+
+if __name__ == '__main__':
+    unittest.main()
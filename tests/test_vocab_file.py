@@ -0,0 +1,61 @@
+import os
+import pickle
+import tempfile
+import unittest
+from models.custom_tokenizer import CustomTokenizer
+from models.vocab_file import MmapVocab, is_vocab_file, write_vocab
+from tests.test_bpe_encode import MERGES, write_vocab_file
+
+
+class TestVocabFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "vocab.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip_with_sparse_ids(self):
+        vocab = {"hello": 0, "Ġworld": 5, "##ing": 7, "你好": 3, b"\xff\xfe": 9}
+        write_vocab(self.path, vocab)
+        self.assertTrue(is_vocab_file(self.path))
+        mmap_vocab = MmapVocab(self.path)
+        self.assertEqual(len(mmap_vocab), len(vocab))
+        for token, token_id in vocab.items():
+            self.assertEqual(mmap_vocab[token], token_id)
+            self.assertIn(token, mmap_vocab)
+        self.assertEqual(mmap_vocab.id_to_token(3), "你好")
+        self.assertEqual(mmap_vocab.decoder[9], b"\xff\xfe")
+        self.assertNotIn("missing", mmap_vocab)
+        self.assertNotIn(3, mmap_vocab)
+        self.assertIsNone(mmap_vocab.get("missing"))
+        with self.assertRaises(KeyError):
+            mmap_vocab.decoder[1]
+        self.assertEqual(sorted(mmap_vocab.values()), sorted(vocab.values()))
+        self.assertEqual(dict(pickle.loads(pickle.dumps(mmap_vocab))), dict(mmap_vocab))
+        mmap_vocab.close()
+
+    def test_duplicates_are_rejected(self):
+        for vocab in ({"a": 1, "b": 1, "c": 2}, {"a": 1, b"a": 2}):
+            with self.subTest(vocab=vocab):
+                with self.assertRaises(ValueError):
+                    write_vocab(self.path, vocab)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_tokenizer_matches_text_vocab(self):
+        text_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(text_file)
+        text_tokenizer = CustomTokenizer(text_file)
+        text_tokenizer._ensure_vocab()
+        write_vocab(self.path, text_tokenizer.mergeable_ranks)
+
+        mmap_tokenizer = CustomTokenizer(self.path)
+        text = "the thing is singing, 你好 " + "".join(token.decode("latin-1") for token in MERGES)
+        ids = mmap_tokenizer.encode(text, bos=True, eos=True)
+        self.assertIsInstance(mmap_tokenizer.mergeable_ranks, MmapVocab)
+        self.assertEqual(ids, text_tokenizer.encode(text, bos=True, eos=True))
+        self.assertEqual(mmap_tokenizer.decode(ids), text_tokenizer.decode(ids))
+
+if __name__ == '__main__':
+    unittest.main()
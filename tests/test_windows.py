@@ -0,0 +1,74 @@
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+from models.custom_tokenizer import CustomTokenizer
+from tests.test_bpe_encode import write_vocab_file
+from tests.test_pre_tokenizer import random_text
+
+
+class TestEncodeWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        vocab_file = os.path.join(self.tmpdir.name, "tokenizer.model")
+        write_vocab_file(vocab_file)
+        self.tokenizer = CustomTokenizer(vocab_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_offsets_match_encode(self):
+        rng = random.Random(0)
+        for _ in range(300):
+            text = random_text(rng) + rng.choice(["", "<|eot_id|>"]) + random_text(rng)
+            for allowed in (set(), {"<|eot_id|>"}):
+                with self.subTest(text=text, allowed=allowed):
+                    ids, starts, ends = self.tokenizer.encode_with_offsets(text, allowed_special=allowed)
+                    self.assertEqual(ids.tolist(), self.tokenizer.encode(text, bos=False, eos=False, allowed_special=allowed))
+                    self.assertEqual(len(starts), len(ids))
+                    self.assertTrue(np.all(starts < ends))
+                    self.assertTrue(np.all(ends <= len(text)))
+                    for token_id, start, end in zip(ids.tolist(), starts.tolist(), ends.tolist()):
+                        if token_id == self.tokenizer.special_tokens["<|eot_id|>"]:
+                            self.assertEqual(text[start:end], "<|eot_id|>")
+
+    def test_windows_are_views_with_overlap(self):
+        text = " ".join(f"word{i} thing" for i in range(200))
+        full = self.tokenizer.encode(text, bos=False, eos=False)
+        windows = self.tokenizer.encode_windows(text, window=32, stride=8)
+        self.assertEqual(windows[0].start, 0)
+        self.assertEqual(windows[-1].end, len(full))
+        for previous, current in zip(windows, windows[1:]):
+            self.assertEqual(previous.end - current.start, 8)
+        for window in windows:
+            with self.subTest(window=window):
+                self.assertLessEqual(len(window), 32)
+                self.assertTrue(np.shares_memory(window.ids, windows.ids))
+                self.assertEqual(window.ids.tolist(), full[window.start:window.end])
+                input_ids = window.input_ids()
+                self.assertEqual(input_ids[0], self.tokenizer.bos_id)
+                self.assertEqual(input_ids[-1], self.tokenizer.eos_id)
+                self.assertEqual(window.offset_mapping()[0], (0, 0))
+                self.assertIn(window.window_text.strip(), text)
+                decoded = self.tokenizer.decode(window.ids.tolist())
+                self.assertIn(decoded.strip(), window.window_text)
+
+    def test_short_and_empty_documents(self):
+        windows = self.tokenizer.encode_windows("a short one", window=16, stride=4, bos=False, eos=False)
+        self.assertEqual(len(windows), 1)
+        self.assertEqual(windows[0].input_ids(), self.tokenizer.encode("a short one", bos=False, eos=False))
+        self.assertEqual((windows[0].char_start, windows[0].char_end), (0, len("a short one")))
+        empty = self.tokenizer.encode_windows("", window=16, stride=4)
+        self.assertEqual([window.input_ids() for window in empty], [[self.tokenizer.bos_id, self.tokenizer.eos_id]])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            self.tokenizer.encode_windows("text", window=2, stride=0)
+        with self.assertRaises(ValueError):
+            self.tokenizer.encode_windows("text", window=10, stride=8)
+
+
+if __name__ == '__main__':
+    unittest.main()